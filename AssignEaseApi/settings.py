@@ -174,7 +174,15 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Sandbox execution results (see EXECUTION_CACHE_* below); LRU-evicted past MAX_ENTRIES
+    'execution': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'execution-results',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
 }
 
 # Alternative: Use Redis for production (requires Redis server running)
@@ -188,3 +196,125 @@ CACHES = {
 #         }
 #     }
 # }
+
+
+# Code execution
+# Global cap on concurrent sandbox calls per process, and per submission
+EXECUTION_MAX_IN_FLIGHT = 32
+EXECUTION_MAX_PER_SUBMISSION = 8
+
+# Pack the test cases of a run into few Piston executions where a harness exists
+# (C, C++, Python). The Piston server's output limit must fit all cases' output.
+PISTON_BATCH_EXECUTION = True
+# The Piston server's max run_timeout (its PISTON_RUN_TIMEOUT, 3000 ms by default).
+# It bounds a whole batch; cases it cuts off go into the next execution. Time
+# limits longer than this run one case per execution.
+PISTON_MAX_RUN_TIMEOUT_MS = 3000
+# Most test cases packed into one batch execution (cases run one after another)
+PISTON_BATCH_MAX_CASES = 32
+
+# Outbound HTTP (Piston, Judge0, Ollama): pooled keep-alive sessions per host
+HTTP_POOL_SIZE = 32
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.3
+HTTP_RETRY_JITTER = 0.3
+
+# Background grading (evaluate-submission with "async": true)
+GRADING_WORKERS = 4
+GRADING_PROGRESS_CHUNK = 8
+# Queued/running jobs without progress this long are assumed lost (e.g. by a restart)
+# and re-queued by the job status view or `manage.py recover_grading_jobs`
+GRADING_JOB_STALE_SECONDS = 15 * 60
+GRADING_JOB_MAX_ATTEMPTS = 2  # re-queues before a lost job is marked as failed
+
+# Content-addressed cache of (code, language, version, stdin, limits) executions
+EXECUTION_CACHE_ENABLED = True
+EXECUTION_CACHE_ALIAS = 'execution'
+EXECUTION_CACHE_TTL = 60 * 60
+
+# Where code runs: 'piston' (remote Piston API) or 'local' (subprocess sandbox
+# on this host, Python/C/C++ only, POSIX only)
+EXECUTION_BACKEND = 'piston'
+PISTON_EXECUTE_URL = 'https://execute.assignease.io/api/v2/execute'
+
+# Local sandbox limits (EXECUTION_BACKEND = 'local')
+LOCAL_SANDBOX_ROOT = None  # defaults to <tmp>/assignease-sandbox
+# Isolation: the backend will not start without at least one of these.
+# LOCAL_SANDBOX_WRAPPER is a command prefix such as ['bwrap', ...] or
+# ['nsjail', ...]; it must expose LOCAL_SANDBOX_ROOT at the same path, and
+# prlimit, which applies the rlimits below inside it.
+# LOCAL_SANDBOX_UID/GID is an unprivileged account the API may switch to.
+LOCAL_SANDBOX_WRAPPER = []
+LOCAL_SANDBOX_UID = None
+LOCAL_SANDBOX_GID = None  # defaults to the uid
+LOCAL_SANDBOX_ALLOW_UNISOLATED = False  # local development only
+LOCAL_SANDBOX_MEMORY_MB = 256
+LOCAL_SANDBOX_COMPILE_MEMORY_MB = 1024
+LOCAL_SANDBOX_MAX_PROCESSES = 64  # RLIMIT_NPROC counts every process of the uid
+LOCAL_SANDBOX_CPU_SECONDS = 10
+LOCAL_SANDBOX_RUN_TIMEOUT = 3
+LOCAL_SANDBOX_COMPILE_TIMEOUT = 15
+LOCAL_SANDBOX_START_TIMEOUT = 5  # seconds to get a live pre-started Python interpreter
+LOCAL_SANDBOX_PRLIMIT = 'prlimit'
+LOCAL_SANDBOX_MAX_OUTPUT_BYTES = 1024 * 1024
+LOCAL_SANDBOX_WARM_PROCESSES = 4
+LOCAL_SANDBOX_BUILD_CACHE = 64
+
+# Backend used to grade test cases: 'piston' (see EXECUTION_BACKEND), 'judge0',
+# or 'auto' to spread runs over both with failover (see AssignEaseApp/execution_router.py)
+GRADING_BACKEND = 'piston'
+EXECUTION_ROUTER_EWMA_ALPHA = 0.3
+EXECUTION_ROUTER_INITIAL_LATENCY = 1.0  # assumed seconds per test case before any backend was observed
+EXECUTION_ROUTER_MIN_SHARE = 0.1  # smallest share of runs each available backend receives
+JUDGE0_BATCH_SIZE = 20
+JUDGE0_POLL_INITIAL_DELAY = 0.2
+JUDGE0_POLL_MAX_DELAY = 2.0
+JUDGE0_POLL_TIMEOUT = 60
+
+# Sandbox admission control: token buckets counting executions (one per test case)
+EXECUTION_RATE_LIMIT_ENABLED = True
+EXECUTION_RATE_LIMIT_CACHE = 'default'  # use a shared cache (Redis) to limit across workers
+EXECUTION_USER_RATE = 1.0  # executions refilled per second, per user
+EXECUTION_USER_BURST = 60
+EXECUTION_GLOBAL_RATE = 50.0
+EXECUTION_GLOBAL_BURST = 500
+EXECUTION_MAX_QUEUED = 256  # shed load once this many executions are outstanding at the backends
+
+# Circuit breakers around Piston, Judge0 and Ollama (see AssignEaseApp/circuit_breaker.py)
+CIRCUIT_BREAKER_ENABLED = True
+CIRCUIT_BREAKER_WINDOW = 60  # seconds of calls the error rate is computed over
+CIRCUIT_BREAKER_MIN_CALLS = 10
+CIRCUIT_BREAKER_FAILURE_RATE = 0.5
+CIRCUIT_BREAKER_OPEN_SECONDS = 30  # fail fast this long before a half-open probe
+CIRCUIT_BREAKER_SLOW_CALL_SECONDS = {'piston': 20, 'judge0': 20, 'ollama': 150}  # slower calls count as failures
+
+# Seconds a process keeps its ProgrammingLanguage index before reloading (saves/deletes invalidate it at once)
+LANGUAGE_REGISTRY_TTL = 300
+
+# Program output beyond this many characters fails the test case and is stored truncated
+TESTCASE_MAX_OUTPUT_CHARS = 1024 * 1024
+
+# Test case inputs/expected outputs above this many bytes live in content-addressed
+# blob storage (default storage, under TESTCASE_BLOB_PREFIX); rows keep a preview
+TESTCASE_BLOB_THRESHOLD = 64 * 1024
+TESTCASE_BLOB_PREVIEW_CHARS = 1000
+TESTCASE_BLOB_PREFIX = 'testcase-blobs'
+TESTCASE_BLOB_CACHE_SIZE = 16  # blobs kept in memory per process
+
+# Built SQL assignment databases kept as serialized images (keyed by a hash of the schema
+# and sample data SQL) and cloned per query; 0 rebuilds the schema every time
+DATABASE_SNAPSHOT_CACHE_SIZE = 32
+DATABASE_SNAPSHOT_MAX_BYTES = 16 * 1024 * 1024  # larger databases are rebuilt instead of cached
+
+# Warm pool of seeded in-memory connections for read-only SQL queries (see AssignEaseApp/schema_pool.py)
+DATABASE_POOL_SIZE = 4  # idle connections kept per schema; 0 disables the pool
+DATABASE_POOL_IDLE_SECONDS = 300  # schemas unused this long are dropped
+DATABASE_POOL_MAX_BYTES = 64 * 1024 * 1024  # database images held by idle connections, all schemas
+
+# Limits on SQL assignment queries (see QueryBudget in AssignEaseApp/database_service.py)
+DATABASE_QUERY_TIMEOUT = 1.0  # seconds a statement may run before it is interrupted
+DATABASE_QUERY_MAX_INSTRUCTIONS = 20_000_000  # SQLite VM instructions per statement
+DATABASE_SCHEMA_TIMEOUT = 10.0  # seconds for a whole schema + sample data script
+DATABASE_SCHEMA_MAX_INSTRUCTIONS = 500_000_000  # SQLite VM instructions for that script
+DATABASE_SQLITE_HEAP_LIMIT_MB = 256  # PRAGMA hard_heap_limit for all SQLite connections in the process
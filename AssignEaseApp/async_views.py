@@ -0,0 +1,224 @@
+"""
+Async versions of the endpoints that mostly wait on Piston, Judge0 or Ollama.
+
+Under ASGI (AssignEaseApi/asgi.py) these views await non-blocking HTTP
+calls instead of holding a worker thread per request, so one process can
+keep many executions in flight. DRF's APIView is sync-only, so
+AsyncAPIView reuses DRF's configured authentication and parsers (run in a
+thread, since they touch the database) and handlers return JsonResponse.
+"""
+import logging
+import math
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .grading_service import GradingService, GradingError
+from .grading_worker import enqueue_grading
+from .http_client import AsyncHttpClient
+from .llm import agenerate_database_assignment
+from .models import AssignmentQuestion, Profile, Submission, TestCase
+from .rate_limit import ExecutionRateLimiter
+from .serializers import GradingJobSerializer
+
+logger = logging.getLogger(__name__)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """Authenticated async view taking a DRF Request (request.user, request.data)"""
+    http_method_names = ['post', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(
+            request,
+            parsers=[JSONParser(), FormParser(), MultiPartParser()],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+
+        def authenticate():
+            # Evaluating user/data runs the authenticators and parsers
+            return request.user, request.data
+
+        try:
+            user, _ = await sync_to_async(authenticate)()
+        except APIException as e:
+            # Same body DRF's exception handler would send
+            data = e.detail if isinstance(e.detail, (dict, list)) else {"detail": e.detail}
+            return JsonResponse(data, status=e.status_code, safe=False)
+
+        if not user or not user.is_authenticated:
+            return JsonResponse({"detail": "Authentication credentials were not provided."},
+                                status=status.HTTP_401_UNAUTHORIZED)
+
+        async with AsyncHttpClient.scope():
+            return await super().dispatch(request, *args, **kwargs)
+
+
+async def execution_throttled(user, executions):
+    """429 response if ``user`` may not start ``executions`` sandbox runs now, else None"""
+    retry_after = await sync_to_async(ExecutionRateLimiter.check)(user, executions)
+    if retry_after is None:
+        return None
+    retry_after = max(1, math.ceil(retry_after))
+    response = JsonResponse(
+        {"error": "Too many code executions, please retry later", "retry_after": retry_after},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+    )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+class AsyncRunTestCasesView(AsyncAPIView):
+    """
+    Async version of run-testcases
+    POST /api/async/run-testcases/
+    """
+
+    async def post(self, request):
+        question_id = request.data.get('question_id')
+        source_code = request.data.get('source_code')
+        language_name = request.data.get('language_name')
+        version = request.data.get('language_version')
+
+        if not all([question_id, source_code, language_name, version]):
+            return JsonResponse(
+                {"error": "question_id, source_code, language_name, language_version are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            question = await AssignmentQuestion.objects.aget(id=question_id)
+        except AssignmentQuestion.DoesNotExist:
+            return JsonResponse({"error": "Question not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        testcases = [tc async for tc in TestCase.objects.filter(question=question, visibility='public')]
+
+        if not testcases:
+            return JsonResponse({
+                "message": "No public test cases for this question",
+                "results": [],
+                "total": 0,
+                "passed": 0
+            })
+
+        throttled = await execution_throttled(request.user, len(testcases))
+        if throttled:
+            return throttled
+
+        results = []
+
+        for r in await GradingService.arun_testcases(source_code, language_name, version, testcases):
+            tc = r["testcase"]
+            results.append({
+                "testcase_id": tc.id,
+                "input": tc.input,
+                "expected_output": tc.expected_output,
+                "data_truncated": tc.data_truncated,
+                "actual_output": r["stdout"],
+                "error_message": r["stderr"],
+                "passed": r["passed"]
+            })
+
+        return JsonResponse({
+            "results": results,
+            "total": len(results),
+            "passed": sum(r["passed"] for r in results)
+        })
+
+
+class AsyncEvaluateSubmissionView(AsyncAPIView):
+    """
+    Async version of evaluate-submission
+    POST /api/async/evaluate-submission/
+    Body: {"submission_id": 1, "async": false}
+    """
+
+    async def post(self, request):
+        submission_id = request.data.get("submission_id")
+
+        if not submission_id:
+            return JsonResponse({"error": "submission_id is required"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            submission = await Submission.objects.select_related(
+                'question__assignment', 'assignment'
+            ).aget(id=submission_id)
+        except Submission.DoesNotExist:
+            return JsonResponse({"error": "Submission not found"},
+                                status=status.HTTP_404_NOT_FOUND)
+
+        testcase_count = await TestCase.objects.filter(question=submission.question).acount()
+        if not testcase_count:
+            return JsonResponse({
+                "message": "No test cases for this question",
+                "auto_marks": 0,
+                "passed_testcases": 0,
+                "total_testcases": 0
+            })
+
+        throttled = await execution_throttled(request.user, testcase_count)
+        if throttled:
+            return throttled
+
+        if str(request.data.get("async", "")).lower() in ("true", "1"):
+            job = await sync_to_async(enqueue_grading)(submission, requested_by=request.user)
+            return JsonResponse(GradingJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            summary = await GradingService.aevaluate_submission(submission)
+        except GradingError as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        return JsonResponse(summary)
+
+
+class AsyncGenerateDatabaseAssignmentWithAIView(AsyncAPIView):
+    """
+    Async version of generate-database-assignment-ai
+    POST /api/async/generate-database-assignment-ai/
+    """
+
+    async def post(self, request):
+        profile = await Profile.objects.filter(user=request.user).afirst()
+        if profile is None:
+            return JsonResponse({"error": "User profile not found"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        if profile.role != 'teacher':
+            return JsonResponse({"error": "Only teachers can generate assignments with AI"},
+                                status=status.HTTP_403_FORBIDDEN)
+
+        questions = request.data.get('questions', [])
+
+        if not questions or not isinstance(questions, list):
+            return JsonResponse({"error": "questions must be a non-empty list"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        if len(questions) > 20:
+            return JsonResponse({"error": "Maximum 20 questions allowed"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            logger.info(f"AI generation requested for {len(questions)} questions")
+            result = await agenerate_database_assignment(questions)
+
+            if not result.get('schema_sql'):
+                raise ValueError("No schema generated")
+            if not result.get('questions'):
+                raise ValueError("No questions generated")
+
+            logger.info(f"Generated {len(result.get('questions', []))} questions with schema")
+            return JsonResponse(result)
+
+        except Exception as e:
+            logger.exception(f"AI generation error: {str(e)}")
+            return JsonResponse({"error": f"AI generation failed: {str(e)}"},
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
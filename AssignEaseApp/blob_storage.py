@@ -0,0 +1,69 @@
+"""
+Content-addressed storage for large test case data.
+
+Test case inputs and expected outputs larger than TESTCASE_BLOB_THRESHOLD
+bytes are written once to Django's default storage (MEDIA_ROOT unless
+configured otherwise) under TESTCASE_BLOB_PREFIX/<sha256[:2]>/<sha256>. Rows
+keep only the digest, the size and a short preview (see TestDataBlobs in
+models.py), and identical data shared by many test cases is stored once.
+Blobs are immutable, so recently read ones are kept in a small in-process
+LRU cache.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+class BlobStore:
+    _lock = threading.Lock()
+    _cache = OrderedDict()  # digest -> text
+
+    @staticmethod
+    def threshold() -> int:
+        return getattr(settings, 'TESTCASE_BLOB_THRESHOLD', 64 * 1024)
+
+    @staticmethod
+    def path(digest: str) -> str:
+        prefix = getattr(settings, 'TESTCASE_BLOB_PREFIX', 'testcase-blobs')
+        return f"{prefix}/{digest[:2]}/{digest}"
+
+    @classmethod
+    def put(cls, text: str) -> str:
+        """Store ``text`` (if not stored yet) and return its sha256 digest"""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = cls.path(digest)
+        if not default_storage.exists(path):
+            saved = default_storage.save(path, ContentFile(data))
+            if saved != path:
+                # Lost a race with another writer of the same content; keep one copy
+                default_storage.delete(saved)
+        cls._remember(digest, text)
+        return digest
+
+    @classmethod
+    def get(cls, digest: str) -> str:
+        with cls._lock:
+            text = cls._cache.get(digest)
+            if text is not None:
+                cls._cache.move_to_end(digest)
+                return text
+
+        with default_storage.open(cls.path(digest), 'rb') as blob:
+            text = blob.read().decode('utf-8')
+        cls._remember(digest, text)
+        return text
+
+    @classmethod
+    def _remember(cls, digest: str, text: str):
+        size = getattr(settings, 'TESTCASE_BLOB_CACHE_SIZE', 16)
+        if not size:
+            return
+        with cls._lock:
+            cls._cache[digest] = text
+            cls._cache.move_to_end(digest)
+            while len(cls._cache) > size:
+                cls._cache.popitem(last=False)
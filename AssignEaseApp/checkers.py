@@ -0,0 +1,172 @@
+"""
+Output checkers deciding whether a program's stdout matches a test case.
+
+Each TestCase selects a checker:
+
+    exact      identical after trimming leading/trailing whitespace (the default)
+    whitespace same lines once runs of spaces/tabs are collapsed; trailing
+               spaces and trailing blank lines are ignored
+    tokens     same sequence of whitespace-separated tokens, line breaks ignored
+    float      like tokens, but numeric tokens may differ by float_tolerance
+               (absolute, or relative to the expected value when that is larger)
+    unordered  same multiset of non-blank lines, in any order
+
+Checkers walk both strings with offsets and lazy iterators (str.find,
+re.finditer) rather than strip()/split() copies, so multi-MB outputs are
+compared in a single pass without materialising the token or line lists.
+Output longer than TESTCASE_MAX_OUTPUT_CHARS is never compared at all.
+"""
+import math
+import re
+from collections import Counter
+from itertools import zip_longest
+from django.conf import settings
+
+CHECKER_CHOICES = (
+    ("exact", "Exact match"),
+    ("whitespace", "Ignore whitespace differences"),
+    ("tokens", "Token by token"),
+    ("float", "Numbers within tolerance"),
+    ("unordered", "Lines in any order"),
+)
+
+_NON_SPACE = re.compile(r"\S")
+_TOKEN = re.compile(r"\S+")
+_BLANKS = re.compile(r"[ \t\r\f\v]+")
+_CHUNK = 64 * 1024
+
+
+def max_output_chars() -> int:
+    return getattr(settings, 'TESTCASE_MAX_OUTPUT_CHARS', 1024 * 1024)
+
+
+def cap_output(text: str):
+    """
+    Truncate program output to TESTCASE_MAX_OUTPUT_CHARS.
+
+    Returns:
+        Tuple of (text, truncated)
+    """
+    text = text or ""
+    limit = max_output_chars()
+    if limit and len(text) > limit:
+        return text[:limit], True
+    return text, False
+
+
+def _bounds(text: str):
+    """(start, end) of ``text`` without leading/trailing whitespace"""
+    match = _NON_SPACE.search(text)
+    if not match:
+        return 0, 0
+    end = len(text)
+    while end > match.start() and text[end - 1].isspace():
+        end -= 1
+    return match.start(), end
+
+
+def _lines(text: str):
+    """Lazily yield the lines of ``text`` (without the newline)"""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find("\n", start)
+        if end == -1:
+            end = length
+        yield text[start:end]
+        start = end + 1
+
+
+def _normalised_lines(text: str):
+    """Lines with blank runs collapsed and trailing blanks removed; trailing empty lines dropped"""
+    pending_blank = 0
+    for line in _lines(text):
+        line = _BLANKS.sub(" ", line).strip(" ")
+        if not line:
+            pending_blank += 1
+            continue
+        for _ in range(pending_blank):
+            yield ""
+        pending_blank = 0
+        yield line
+
+
+def _tokens(text: str):
+    return (match.group() for match in _TOKEN.finditer(text))
+
+
+def check_exact(actual: str, expected: str, tolerance=None) -> bool:
+    a_start, a_end = _bounds(actual)
+    e_start, e_end = _bounds(expected)
+    if a_end - a_start != e_end - e_start:
+        return False
+    # Compare in slices so no full-size copy of either string is made
+    for offset in range(0, a_end - a_start, _CHUNK):
+        size = min(_CHUNK, a_end - a_start - offset)
+        if actual[a_start + offset:a_start + offset + size] != expected[e_start + offset:e_start + offset + size]:
+            return False
+    return True
+
+
+def check_whitespace(actual: str, expected: str, tolerance=None) -> bool:
+    missing = object()
+    for a, e in zip_longest(_normalised_lines(actual), _normalised_lines(expected), fillvalue=missing):
+        if a != e:
+            return False
+    return True
+
+
+def check_tokens(actual: str, expected: str, tolerance=None) -> bool:
+    missing = object()
+    for a, e in zip_longest(_tokens(actual), _tokens(expected), fillvalue=missing):
+        if a != e:
+            return False
+    return True
+
+
+def _float_equal(a: str, e: str, tolerance: float) -> bool:
+    if a == e:
+        return True
+    try:
+        x, y = float(a), float(e)
+    except ValueError:
+        return False
+    if math.isnan(x) or math.isnan(y):
+        return math.isnan(x) and math.isnan(y)
+    return abs(x - y) <= tolerance * max(1.0, abs(y))
+
+
+def check_float(actual: str, expected: str, tolerance=None) -> bool:
+    tolerance = 1e-6 if tolerance is None else tolerance
+    missing = object()
+    for a, e in zip_longest(_tokens(actual), _tokens(expected), fillvalue=missing):
+        if a is missing or e is missing or not _float_equal(a, e, tolerance):
+            return False
+    return True
+
+
+def check_unordered(actual: str, expected: str, tolerance=None) -> bool:
+    counts = Counter(line.strip() for line in _lines(expected) if line.strip())
+    for line in _lines(actual):
+        line = line.strip()
+        if not line:
+            continue
+        if not counts[line]:
+            return False
+        counts[line] -= 1
+    return not any(counts.values())
+
+
+CHECKERS = {
+    "exact": check_exact,
+    "whitespace": check_whitespace,
+    "tokens": check_tokens,
+    "float": check_float,
+    "unordered": check_unordered,
+}
+
+
+def outputs_match(testcase, actual: str) -> bool:
+    """Compare ``actual`` with the expected output (blob-backed if large) using the test case's checker"""
+    checker = CHECKERS.get(getattr(testcase, "checker", None) or "exact", check_exact)
+    return checker(actual or "", testcase.expected_output_text or "", getattr(testcase, "float_tolerance", None))
@@ -0,0 +1,165 @@
+"""
+Circuit breakers for the external execution and LLM services.
+
+Each named breaker ('piston', 'judge0', 'ollama') keeps the outcome and
+latency of the calls made in the last CIRCUIT_BREAKER_WINDOW seconds. Once
+at least CIRCUIT_BREAKER_MIN_CALLS calls were made and the share of failed
+or slow calls reaches CIRCUIT_BREAKER_FAILURE_RATE, the circuit opens and
+calls fail immediately. After CIRCUIT_BREAKER_OPEN_SECONDS one probe call is
+let through (half-open): success closes the circuit, failure re-opens it.
+
+allow() hands out a ticket naming the state the call was let through in, and
+record() ignores results from an earlier state. So in half-open only the
+probe decides, and calls still running when the circuit opened or closed do
+not count against the new state.
+
+Breakers are per process; HttpClient and AsyncHttpClient enforce them for
+calls made with ``breaker=<name>``.
+"""
+import os
+import threading
+import time
+from collections import deque
+from django.conf import settings
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._calls = deque()  # (finished_at, failed, duration)
+        self._opened_at = 0.0
+        self._generation = 1  # bumped on every state change; tickets carry it
+        self._probe = None  # ticket of the half-open probe, once handed out
+        self._times_opened = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, 'CIRCUIT_BREAKER_ENABLED', True)
+
+    def _slow_call_seconds(self):
+        return getattr(settings, 'CIRCUIT_BREAKER_SLOW_CALL_SECONDS', {}).get(self.name)
+
+    def _trim(self, now):
+        window = getattr(settings, 'CIRCUIT_BREAKER_WINDOW', 60)
+        while self._calls and self._calls[0][0] < now - window:
+            self._calls.popleft()
+
+    def _set_state(self, state):
+        self.state = state
+        self._generation += 1
+        self._probe = None
+
+    def _open(self, now):
+        self._set_state(self.OPEN)
+        self._opened_at = now
+        self._times_opened += 1
+
+    def allow(self):
+        """
+        Ticket for a call that may go out now, or None if the circuit refuses it.
+        In half-open state only one probe is let through.
+
+        Pass the ticket to record() with the call's outcome.
+        """
+        with self._lock:
+            if not self.enabled():
+                return self._generation
+
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < getattr(settings, 'CIRCUIT_BREAKER_OPEN_SECONDS', 30):
+                    return None
+                self._set_state(self.HALF_OPEN)
+
+            if self.state == self.HALF_OPEN:
+                if self._probe is not None:
+                    return None
+                self._probe = self._generation
+
+            return self._generation
+
+    def available(self) -> bool:
+        """False while the circuit is open and not yet due for a probe; does not change state"""
+        if not self.enabled() or self.state != self.OPEN:
+            return True
+        return time.monotonic() - self._opened_at >= getattr(settings, 'CIRCUIT_BREAKER_OPEN_SECONDS', 30)
+
+    def record(self, ticket, failed: bool, duration: float):
+        """Record the outcome of a call let through by allow() with ``ticket``"""
+        slow_after = self._slow_call_seconds()
+        failed = failed or bool(slow_after and duration >= slow_after)
+
+        with self._lock:
+            if ticket != self._generation:
+                return  # let through before the last state change
+
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN:
+                # Only the probe holds a ticket for this half-open period
+                if failed:
+                    self._open(now)
+                else:
+                    self._set_state(self.CLOSED)
+                    self._calls.clear()
+                return
+
+            self._calls.append((now, failed, duration))
+            self._trim(now)
+
+            if self.state == self.CLOSED and len(self._calls) >= getattr(settings, 'CIRCUIT_BREAKER_MIN_CALLS', 10):
+                failures = sum(1 for _, f, _ in self._calls if f)
+                if failures / len(self._calls) >= getattr(settings, 'CIRCUIT_BREAKER_FAILURE_RATE', 0.5):
+                    self._open(now)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            calls = len(self._calls)
+            durations = sorted(d for _, _, d in self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, getattr(settings, 'CIRCUIT_BREAKER_OPEN_SECONDS', 30) - (now - self._opened_at))
+
+            return {
+                "state": self.state,
+                "calls": calls,
+                "error_rate": (failures / calls) if calls else 0.0,
+                "avg_latency": (sum(durations) / calls) if calls else None,
+                "p95_latency": durations[min(calls - 1, int(calls * 0.95))] if calls else None,
+                "times_opened": self._times_opened,
+                "retry_in": retry_in,
+            }
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker called ``name``"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_states() -> dict:
+    return {name: breaker.snapshot() for name, breaker in sorted(_breakers.items())}
+
+
+def _reset_after_fork():
+    global _lock
+    _breakers.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -3,6 +3,10 @@ import json
 import time
 from contextlib import contextmanager
 from typing import Dict, List, Any, Tuple
+from django.conf import settings
+from . import result_compare
+from .schema_pool import SchemaConnectionPool
+from .schema_snapshots import SchemaSnapshotCache, split_statements
 
 
 class DatabaseExecutionError(Exception):
@@ -10,10 +14,88 @@ class DatabaseExecutionError(Exception):
     pass
 
 
+class QueryBudget:
+    """
+    SQLite progress handler aborting a statement that runs too long
+    
+    SQLite calls the handler every PROGRESS_INTERVAL virtual machine
+    instructions; returning True interrupts the running statement. The
+    budget is spent once either the wall-clock limit
+    (DATABASE_QUERY_TIMEOUT seconds) or the instruction limit
+    (DATABASE_QUERY_MAX_INSTRUCTIONS) is reached.
+    
+    Teacher-written schema and seed scripts get their own, larger budget
+    (QueryBudget.for_schema) covering the whole script.
+    """
+    PROGRESS_INTERVAL = 10000
+    
+    def __init__(self, timeout=None, max_instructions=None, label="Query"):
+        if timeout is None:
+            timeout = getattr(settings, 'DATABASE_QUERY_TIMEOUT', 1.0)
+        if max_instructions is None:
+            max_instructions = getattr(settings, 'DATABASE_QUERY_MAX_INSTRUCTIONS', 20_000_000)
+        self.timeout = timeout
+        self.max_instructions = max_instructions
+        self.label = label
+        self.deadline = time.monotonic() + self.timeout if self.timeout else None
+        self.instructions = 0
+        self.exceeded = None
+    
+    @classmethod
+    def for_schema(cls):
+        """Budget for building a schema (DATABASE_SCHEMA_TIMEOUT / DATABASE_SCHEMA_MAX_INSTRUCTIONS)"""
+        return cls(
+            timeout=getattr(settings, 'DATABASE_SCHEMA_TIMEOUT', 10.0),
+            max_instructions=getattr(settings, 'DATABASE_SCHEMA_MAX_INSTRUCTIONS', 500_000_000),
+            label="Schema script",
+        )
+    
+    def __call__(self):
+        self.instructions += self.PROGRESS_INTERVAL
+        if self.max_instructions and self.instructions > self.max_instructions:
+            self.exceeded = f"{self.label} exceeded the execution budget of {self.max_instructions:,} SQLite instructions"
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            self.exceeded = f"{self.label} exceeded the time limit of {self.timeout:g} seconds"
+        return self.exceeded is not None
+    
+    @contextmanager
+    def attach(self, conn):
+        conn.set_progress_handler(self, self.PROGRESS_INTERVAL)
+        try:
+            yield self
+        finally:
+            conn.set_progress_handler(None, 0)
+
+
+_heap_limit_applied = False
+
+
+def apply_heap_limit():
+    """
+    Cap SQLite's heap at DATABASE_SQLITE_HEAP_LIMIT_MB (once per process)
+    
+    hard_heap_limit is process-wide: it bounds every SQLite connection in
+    this process (sandboxes and pooled seeded databases together), so a query
+    building a huge sort or string fails with "out of memory" instead of
+    growing the worker. Django's own database is not SQLite and is unaffected.
+    """
+    global _heap_limit_applied
+    if _heap_limit_applied:
+        return
+    limit_mb = getattr(settings, 'DATABASE_SQLITE_HEAP_LIMIT_MB', 256)
+    if limit_mb:
+        conn = sqlite3.connect(':memory:')
+        try:
+            conn.execute(f"PRAGMA hard_heap_limit = {int(limit_mb) * 1024 * 1024}")
+        finally:
+            conn.close()
+    _heap_limit_applied = True
+
+
 class DatabaseService:
     """Service for executing SQL queries in isolated database environments"""
     
-    TIMEOUT_SECONDS = 10
+    TIMEOUT_SECONDS = 10  # sqlite3 lock-wait timeout; query run time is bounded by QueryBudget
     MAX_ROWS = 1000
     
     @staticmethod
@@ -27,6 +109,7 @@ class DatabaseService:
         try:
             if db_type == 'sqlite':
                 # Use in-memory SQLite for complete isolation
+                apply_heap_limit()
                 conn = sqlite3.connect(':memory:', timeout=DatabaseService.TIMEOUT_SECONDS)
                 conn.row_factory = sqlite3.Row
                 
@@ -51,36 +134,80 @@ class DatabaseService:
                 except Exception:
                     pass
     
+    @staticmethod
+    def _run_schema_script(conn, schema_sql: str, sample_data_sql: str = ""):
+        """Execute the CREATE and INSERT statements one by one and commit"""
+        cursor = conn.cursor()
+        budget = QueryBudget.for_schema()
+        try:
+            with budget.attach(conn):
+                # Execute schema creation (split by semicolon for multiple statements)
+                for statement in split_statements(schema_sql):
+                    cursor.execute(statement)
+                
+                # Execute sample data insertion
+                for statement in split_statements(sample_data_sql):
+                    cursor.execute(statement)
+            
+            conn.commit()
+        except sqlite3.OperationalError:
+            if budget.exceeded:
+                raise DatabaseExecutionError(budget.exceeded)
+            raise
+        finally:
+            cursor.close()
+    
     @staticmethod
     def setup_schema(conn, schema_sql: str, sample_data_sql: str = ""):
         """
         Setup database schema and sample data
         
+        The schema is built once per distinct (schema_sql, sample_data_sql)
+        and later connections are seeded from its cached image
+        (see schema_snapshots.py).
+        
         Args:
             conn: Database connection
             schema_sql: CREATE TABLE statements
             sample_data_sql: INSERT statements for sample data
         """
-        cursor = conn.cursor()
         try:
-            # Execute schema creation (split by semicolon for multiple statements)
-            statements = [s.strip() for s in schema_sql.split(';') if s.strip()]
-            for statement in statements:
-                cursor.execute(statement)
-            
-            # Execute sample data insertion
-            if sample_data_sql:
-                data_statements = [s.strip() for s in sample_data_sql.split(';') if s.strip()]
-                for statement in data_statements:
-                    cursor.execute(statement)
-            
-            conn.commit()
+            if SchemaSnapshotCache.enabled() and isinstance(conn, sqlite3.Connection):
+                SchemaSnapshotCache.restore(
+                    conn, schema_sql, sample_data_sql, DatabaseService._run_schema_script
+                )
+            else:
+                DatabaseService._run_schema_script(conn, schema_sql, sample_data_sql)
             
         except Exception as e:
             conn.rollback()
             raise DatabaseExecutionError(f"Schema setup failed: {str(e)}")
-        finally:
-            cursor.close()
+    
+    @staticmethod
+    def _build_schema(conn, schema_sql: str, sample_data_sql: str = ""):
+        try:
+            DatabaseService._run_schema_script(conn, schema_sql, sample_data_sql)
+        except Exception as e:
+            raise DatabaseExecutionError(f"Schema setup failed: {str(e)}")
+    
+    @staticmethod
+    @contextmanager
+    def seeded_connection(db_type: str, schema_sql: str, sample_data_sql: str = "", read_only: bool = False):
+        """
+        Context manager for a connection with the schema and sample data set up
+        
+        Read-only SQLite work leases an already seeded connection from
+        SchemaConnectionPool (rolled back on return); everything else gets a
+        fresh connection from get_db_connection.
+        """
+        if read_only and db_type == 'sqlite' and SchemaConnectionPool.enabled():
+            apply_heap_limit()
+            with SchemaConnectionPool.lease(schema_sql, sample_data_sql, DatabaseService._build_schema) as conn:
+                yield conn
+        else:
+            with DatabaseService.get_db_connection(db_type) as conn:
+                DatabaseService.setup_schema(conn, schema_sql, sample_data_sql)
+                yield conn
     
     @staticmethod
     def execute_query(conn, query: str, db_type: str, allow_write_operations: bool = False) -> Tuple[List[Dict], float]:
@@ -97,6 +224,7 @@ class DatabaseService:
             Tuple of (results as list of dicts, execution_time in ms)
         """
         cursor = conn.cursor()
+        budget = QueryBudget()
         start_time = time.time()
         
         try:
@@ -120,32 +248,28 @@ class DatabaseService:
                             f"Operation '{keyword}' is not allowed for security reasons."
                         )
             
-            # Execute the query
-            cursor.execute(query)
-            
-            # Fetch results if query returns data
-            if cursor.description:  # Query returns results (SELECT)
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchmany(DatabaseService.MAX_ROWS + 1)
-                
-                if len(rows) > DatabaseService.MAX_ROWS:
-                    raise DatabaseExecutionError(
-                        f"Query returned too many rows. Maximum allowed: {DatabaseService.MAX_ROWS}"
-                    )
+            with budget.attach(conn):
+                # Execute the query
+                cursor.execute(query)
                 
-                # Convert to list of dictionaries
-                results = []
-                for row in rows:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        row_dict[col] = row[i]
-                    results.append(row_dict)
-            else:
-                # For non-SELECT queries (INSERT, UPDATE, DELETE, CREATE, etc.)
-                # Return affected rows count or success message
-                results = []
-                if cursor.rowcount >= 0:
-                    results = [{'affected_rows': cursor.rowcount, 'status': 'success'}]
+                # Fetch results if query returns data
+                if cursor.description:  # Query returns results (SELECT)
+                    columns = [desc[0] for desc in cursor.description]
+                    
+                    # Stream rows into dictionaries, stopping at the first row over the limit
+                    results = []
+                    for row in cursor:
+                        if len(results) == DatabaseService.MAX_ROWS:
+                            raise DatabaseExecutionError(
+                                f"Query returned too many rows. Maximum allowed: {DatabaseService.MAX_ROWS}"
+                            )
+                        results.append(dict(zip(columns, row)))
+                else:
+                    # For non-SELECT queries (INSERT, UPDATE, DELETE, CREATE, etc.)
+                    # Return affected rows count or success message
+                    results = []
+                    if cursor.rowcount >= 0:
+                        results = [{'affected_rows': cursor.rowcount, 'status': 'success'}]
             
             # Commit changes if write operations are allowed
             if allow_write_operations:
@@ -158,6 +282,14 @@ class DatabaseService:
         except DatabaseExecutionError:
             raise
         except sqlite3.Error as e:
+            if budget.exceeded:
+                raise DatabaseExecutionError(budget.exceeded)
+            if isinstance(e, sqlite3.DatabaseError) and str(e) == "not authorized":
+                # Denied by the read-only authorizer of a pooled connection (schema_pool.py)
+                raise DatabaseExecutionError(
+                    "Statement not allowed in read-only questions. Only SELECT queries "
+                    "and schema pragmas such as PRAGMA table_info are permitted."
+                )
             raise DatabaseExecutionError(f"SQL Error: {str(e)}")
         except Exception as e:
             raise DatabaseExecutionError(f"Query execution failed: {str(e)}")
@@ -165,83 +297,48 @@ class DatabaseService:
             cursor.close()
     
     @staticmethod
-    def normalize_result(result: List[Dict]) -> List[Dict]:
+    def prepare_expected(expected: List[Dict], order_sensitive: bool = False) -> Tuple[Dict, str]:
         """
-        Normalize query results for comparison
-        - Converts all values to strings
-        - Handles None/NULL values
-        - Sorts rows for consistent ordering
-        """
-        if not result:
-            return []
+        Canonicalize and hash an expected result once so comparisons can reuse it
         
-        # Convert all values to strings for comparison
-        normalized = []
-        for row in result:
-            normalized_row = {}
-            for key, value in row.items():
-                if value is None:
-                    normalized_row[key] = None
-                else:
-                    # Convert to string and strip whitespace
-                    normalized_row[key] = str(value).strip()
-            normalized.append(normalized_row)
-        
-        # Sort rows by all columns for consistent ordering
-        try:
-            normalized.sort(key=lambda x: tuple(str(v) if v is not None else '' for v in x.values()))
-        except Exception:
-            # If sorting fails, keep original order
-            pass
-        
-        return normalized
+        Returns:
+            Tuple of (canonical result, hash) - see result_compare.py
+        """
+        canon = result_compare.canonical(expected)
+        return canon, result_compare.result_hash(canon, order_sensitive)
     
     @staticmethod
-    def compare_results(expected: List[Dict], actual: List[Dict]) -> Tuple[bool, str]:
+    def compare_results(
+        expected: List[Dict],
+        actual: List[Dict],
+        expected_normalized: Dict = None,
+        expected_hash: str = None,
+        order_sensitive: bool = False
+    ) -> Tuple[bool, str]:
         """
         Compare expected and actual query results
         
+        Rows are compared as a multiset unless order_sensitive is set (for
+        questions whose query has an ORDER BY).
+        
+        Args:
+            expected_normalized: canonical expected result from prepare_expected
+                                 (e.g. DatabaseQuestion.expected_result_normalized)
+            expected_hash: its hash; recomputed here when missing or stale
+        
         Returns:
             Tuple of (is_match: bool, feedback: str)
         """
-        expected_normalized = DatabaseService.normalize_result(expected)
-        actual_normalized = DatabaseService.normalize_result(actual)
+        if expected_normalized is None or not result_compare.is_current(expected_hash, order_sensitive):
+            expected_normalized, expected_hash = DatabaseService.prepare_expected(expected, order_sensitive)
+        actual_normalized = result_compare.canonical(actual)
         
-        # Check row count
-        if len(expected_normalized) != len(actual_normalized):
-            return False, f"Row count mismatch: expected {len(expected_normalized)} rows, got {len(actual_normalized)} rows"
+        if expected_hash == result_compare.result_hash(actual_normalized, order_sensitive):
+            if not expected_normalized["rows"]:
+                return True, "Query returned no rows (as expected)"
+            return True, "Results match perfectly! Well done!"
         
-        # Check if both are empty
-        if not expected_normalized and not actual_normalized:
-            return True, "Query returned no rows (as expected)"
-        
-        # Check column names
-        if expected_normalized and actual_normalized:
-            expected_cols = set(expected_normalized[0].keys())
-            actual_cols = set(actual_normalized[0].keys())
-            
-            if expected_cols != actual_cols:
-                missing = expected_cols - actual_cols
-                extra = actual_cols - expected_cols
-                msg_parts = []
-                if missing:
-                    msg_parts.append(f"Missing columns: {', '.join(missing)}")
-                if extra:
-                    msg_parts.append(f"Extra columns: {', '.join(extra)}")
-                return False, "; ".join(msg_parts)
-        
-        # Compare row by row
-        for i, (exp_row, act_row) in enumerate(zip(expected_normalized, actual_normalized)):
-            if exp_row != act_row:
-                # Find which columns differ
-                diff_cols = []
-                for col in exp_row.keys():
-                    if exp_row.get(col) != act_row.get(col):
-                        diff_cols.append(f"{col}: expected '{exp_row.get(col)}', got '{act_row.get(col)}'")
-                
-                return False, f"Row {i+1} mismatch - {'; '.join(diff_cols)}"
-        
-        return True, "Results match perfectly! Well done!"
+        return False, result_compare.diff(expected_normalized, actual_normalized, order_sensitive)
     
     @staticmethod
     def execute_and_validate(
@@ -250,13 +347,18 @@ class DatabaseService:
         sample_data_sql: str,
         student_query: str,
         expected_result: List[Dict],
-        allow_write_operations: bool = False
+        allow_write_operations: bool = False,
+        expected_normalized: Dict = None,
+        expected_hash: str = None,
+        order_sensitive: bool = False
     ) -> Dict[str, Any]:
         """
         Execute student query and validate against expected results
         
         Args:
             allow_write_operations: If True, allows CREATE, INSERT, UPDATE, DELETE operations
+            expected_normalized, expected_hash: precomputed by prepare_expected (optional)
+            order_sensitive: compare rows in order (see compare_results)
         
         Returns:
             Dictionary with validation results:
@@ -269,17 +371,18 @@ class DatabaseService:
             }
         """
         try:
-            with DatabaseService.get_db_connection(db_type) as conn:
-                # Setup schema and sample data
-                DatabaseService.setup_schema(conn, schema_sql, sample_data_sql)
-                
+            with DatabaseService.seeded_connection(
+                db_type, schema_sql, sample_data_sql, read_only=not allow_write_operations
+            ) as conn:
                 # Execute student query
                 actual_result, exec_time = DatabaseService.execute_query(
                     conn, student_query, db_type, allow_write_operations
                 )
                 
                 # Compare results
-                is_correct, feedback = DatabaseService.compare_results(expected_result, actual_result)
+                is_correct, feedback = DatabaseService.compare_results(
+                    expected_result, actual_result, expected_normalized, expected_hash, order_sensitive
+                )
                 
                 return {
                     'is_correct': is_correct,
@@ -313,7 +416,10 @@ class DatabaseService:
         sample_data_sql: str,
         student_query: str,
         verification_query: str,
-        expected_result: List[Dict]
+        expected_result: List[Dict],
+        expected_normalized: Dict = None,
+        expected_hash: str = None,
+        order_sensitive: bool = False
     ) -> Dict[str, Any]:
         """
         Validate DDL/DML queries (CREATE, INSERT, UPDATE, DELETE) by:
@@ -328,6 +434,8 @@ class DatabaseService:
             student_query: Student's DDL/DML query (CREATE, INSERT, UPDATE, DELETE)
             verification_query: SELECT query to verify the result
             expected_result: Expected result from verification query
+            expected_normalized, expected_hash: precomputed by prepare_expected (optional)
+            order_sensitive: compare rows in order (see compare_results)
             
         Returns:
             Dictionary with validation results
@@ -348,7 +456,9 @@ class DatabaseService:
                 )
                 
                 # Compare verification results with expected
-                is_correct, feedback = DatabaseService.compare_results(expected_result, verification_result)
+                is_correct, feedback = DatabaseService.compare_results(
+                    expected_result, verification_result, expected_normalized, expected_hash, order_sensitive
+                )
                 
                 return {
                     'is_correct': is_correct,
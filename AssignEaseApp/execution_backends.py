@@ -0,0 +1,468 @@
+"""
+Execution backends behind PistonService.
+
+Every backend takes a Piston-style execute payload
+(language, version, files, stdin, run_timeout, ...) and returns a
+Piston-style response ({"compile": {...}, "run": {...}}), so the rest of
+the code - including batch harnesses - does not care where code runs.
+``aexecute`` is the awaitable form used by the async views.
+
+EXECUTION_BACKEND selects the backend:
+    'piston' - remote Piston server at PISTON_EXECUTE_URL (default)
+    'local'  - subprocess sandbox on this machine (Python, C, C++)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import httpx
+import requests
+from django.conf import settings
+from .http_client import AsyncHttpClient, HttpClient
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, the local backend is unavailable
+    resource = None
+
+
+class ExecutionBackendError(Exception):
+    """Raised when a backend cannot run the request at all"""
+    pass
+
+
+class ExecutionBackend:
+    name = ""
+
+    def execute(self, payload: dict, timeout: int = 30) -> dict:
+        raise NotImplementedError
+
+    async def aexecute(self, payload: dict, timeout: int = 30) -> dict:
+        # Backends without native async support run in a worker thread
+        return await asyncio.to_thread(self.execute, payload, timeout)
+
+
+class PistonBackend(ExecutionBackend):
+    """Remote Piston API"""
+    name = "piston"
+
+    def execute(self, payload: dict, timeout: int = 30) -> dict:
+        url = getattr(settings, 'PISTON_EXECUTE_URL', "https://execute.assignease.io/api/v2/execute")
+        try:
+            response = HttpClient.post(url, json=payload, read_timeout=timeout, breaker='piston')
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise ExecutionBackendError(str(e)) from e
+
+    async def aexecute(self, payload: dict, timeout: int = 30) -> dict:
+        url = getattr(settings, 'PISTON_EXECUTE_URL', "https://execute.assignease.io/api/v2/execute")
+        try:
+            response = await AsyncHttpClient.post(url, json=payload, read_timeout=timeout, breaker='piston')
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise ExecutionBackendError(str(e)) from e
+
+
+# Bootstrap run by pre-spawned Python interpreters. The process waits for one
+# job line on stdin, lowers its CPU limit to the job's, then points fds 0-2 at
+# the job's files and runs the entry script as __main__. Each process runs
+# exactly one job.
+PYTHON_BOOTSTRAP = r"""
+import json, os, resource, runpy, sys
+job = json.loads(sys.stdin.buffer.readline())
+resource.setrlimit(resource.RLIMIT_CPU, (job["cpu"], job["cpu"] + 1))
+os.chdir(job["cwd"])
+for fd, path, flags in (
+    (0, job["stdin"], os.O_RDONLY),
+    (1, job["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+    (2, job["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+):
+    target = os.open(path, flags, 0o600)
+    os.dup2(target, fd)
+    os.close(target)
+sys.argv = [job["entry"]]
+sys.path[0] = job["cwd"]
+del json, resource, fd, path, flags, target
+runpy.run_path(job["entry"], run_name="__main__")
+"""
+
+
+class LocalSandboxBackend(ExecutionBackend):
+    """
+    Runs code in a subprocess on the API host.
+
+    Rlimits alone do not keep student code away from the host, so every
+    compile and run goes through LOCAL_SANDBOX_WRAPPER (a bwrap/nsjail
+    command prefix) and/or drops to the unprivileged LOCAL_SANDBOX_UID. The
+    backend refuses to start with neither, unless LOCAL_SANDBOX_ALLOW_UNISOLATED
+    is set for local development.
+
+    Each execution gets a fresh temp dir and CPU, address-space, process-count
+    and file-size rlimits, set by exec'ing through prlimit (a preexec_fn is
+    not safe in this multi-threaded process); stdout/stderr go to files so
+    RLIMIT_FSIZE caps output. Only the execution's own dirs are writable by
+    the sandbox uid. Compiled binaries are copied into a build cache, keyed
+    by source hash, that the sandbox can run but not modify, and a few
+    Python interpreters are kept started ahead of time so a run skips
+    interpreter startup.
+    """
+    name = "local"
+
+    LANGUAGES = {
+        'python': 'python', 'python3': 'python', 'py': 'python',
+        'c': 'c', 'gcc': 'c',
+        'c++': 'cpp', 'cpp': 'cpp', 'g++': 'cpp',
+    }
+    COMPILERS = {
+        'c': (['gcc', '-std=c11', '-O2', '-o'], '.c'),
+        'cpp': (['g++', '-std=c++17', '-O2', '-o'], '.cpp'),
+    }
+
+    def __init__(self):
+        if resource is None:
+            raise ExecutionBackendError("The local sandbox requires a POSIX host")
+
+        self.wrapper = list(getattr(settings, 'LOCAL_SANDBOX_WRAPPER', None) or [])
+        self.uid = getattr(settings, 'LOCAL_SANDBOX_UID', None)
+        self.gid = getattr(settings, 'LOCAL_SANDBOX_GID', None)
+        if self.gid is None:
+            self.gid = self.uid
+        if not self.wrapper and self.uid is None and not getattr(settings, 'LOCAL_SANDBOX_ALLOW_UNISOLATED', False):
+            raise ExecutionBackendError(
+                "The local sandbox needs LOCAL_SANDBOX_WRAPPER or LOCAL_SANDBOX_UID to isolate jobs"
+            )
+
+        self.prlimit = shutil.which(getattr(settings, 'LOCAL_SANDBOX_PRLIMIT', 'prlimit'))
+        if not self.prlimit:
+            raise ExecutionBackendError("The local sandbox needs prlimit (util-linux) to apply resource limits")
+
+        self.root = getattr(settings, 'LOCAL_SANDBOX_ROOT', None) or os.path.join(tempfile.gettempdir(), 'assignease-sandbox')
+        self.python = getattr(settings, 'LOCAL_SANDBOX_PYTHON', None) or sys.executable
+        self.memory_bytes = getattr(settings, 'LOCAL_SANDBOX_MEMORY_MB', 256) * 1024 * 1024
+        self.compile_memory_bytes = getattr(settings, 'LOCAL_SANDBOX_COMPILE_MEMORY_MB', 1024) * 1024 * 1024
+        self.max_processes = getattr(settings, 'LOCAL_SANDBOX_MAX_PROCESSES', 64)
+        self.max_output = getattr(settings, 'LOCAL_SANDBOX_MAX_OUTPUT_BYTES', 1024 * 1024)
+        self.cpu_seconds = getattr(settings, 'LOCAL_SANDBOX_CPU_SECONDS', 10)
+        self.run_timeout = getattr(settings, 'LOCAL_SANDBOX_RUN_TIMEOUT', 3)
+        self.compile_timeout = getattr(settings, 'LOCAL_SANDBOX_COMPILE_TIMEOUT', 15)
+        self.start_timeout = getattr(settings, 'LOCAL_SANDBOX_START_TIMEOUT', 5)
+        self.warm_size = getattr(settings, 'LOCAL_SANDBOX_WARM_PROCESSES', 4)
+        self.build_cache_size = getattr(settings, 'LOCAL_SANDBOX_BUILD_CACHE', 64)
+
+        # Owned by this service: the sandbox may enter them but not list or write
+        for path in (self.root, os.path.join(self.root, 'builds')):
+            os.makedirs(path, exist_ok=True)
+            os.chmod(path, 0o711)
+        self._builds = OrderedDict()  # key -> build dir, LRU order
+        self._build_refs = {}  # key -> executions compiling or running that build
+        self._key_locks = {}  # key -> lock serializing the compile of that build
+        self._build_lock = threading.Lock()
+        self._warm = queue.Queue()
+        for _ in range(self.warm_size):
+            self._spawn_python()
+
+    # -- process helpers ---------------------------------------------------
+
+    def _limits(self, cpu_seconds, memory):
+        """prlimit command prefix applying the rlimits to the command it execs"""
+        return [
+            self.prlimit,
+            f"--cpu={cpu_seconds}:{cpu_seconds + 1}",
+            f"--as={memory}",
+            f"--nproc={self.max_processes}",
+            f"--fsize={self.max_output}",
+            "--core=0",
+            "--",
+        ]
+
+    def _popen(self, argv, cpu_seconds, memory, **kwargs):
+        """Start a sandboxed process: wrapper prefix, sandbox uid/gid and rlimits"""
+        if self.uid is not None:
+            kwargs.update(user=self.uid, group=self.gid, extra_groups=[])
+        try:
+            return subprocess.Popen(
+                self.wrapper + self._limits(cpu_seconds, memory) + argv,
+                start_new_session=True,
+                **kwargs
+            )
+        except OSError as e:
+            # Missing tool, no processes left (EAGAIN), failed uid switch, ...
+            raise ExecutionBackendError(f"Could not start the sandboxed process: {e}") from e
+
+    def _sandbox_dir(self, path):
+        """Create a directory the sandboxed process may write to"""
+        os.makedirs(path, exist_ok=True)
+        if self.uid is not None:
+            os.chown(path, self.uid, self.gid)
+
+    def _spawn_python(self):
+        proc = self._popen(
+            [self.python, '-c', PYTHON_BOOTSTRAP],
+            self.cpu_seconds, self.memory_bytes,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=self.root,
+        )
+        self._warm.put(proc)
+
+    def _take_python(self):
+        """
+        A live pre-started interpreter. Raises ExecutionBackendError when none
+        can be started within LOCAL_SANDBOX_START_TIMEOUT seconds.
+        """
+        deadline = time.monotonic() + self.start_timeout
+        delay = 0.01
+        while True:
+            try:
+                proc = self._warm.get_nowait()
+            except queue.Empty:
+                proc = None
+
+            if proc is not None and proc.poll() is None:
+                try:
+                    self._spawn_python()  # keep the pool topped up
+                except ExecutionBackendError:
+                    pass  # refilled by a later take
+                return proc
+
+            if time.monotonic() >= deadline:
+                raise ExecutionBackendError("No Python interpreter could be started in the sandbox")
+            self._spawn_python()
+            if proc is not None:
+                # Interpreters are exiting right after they start: back off
+                proc.stdin.close()
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+
+    @staticmethod
+    def _wait(proc, timeout):
+        """Wait for the process group; returns (code, signal name)"""
+        try:
+            code = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            proc.wait()
+            return None, "SIGKILL"
+
+        if code < 0:
+            return None, signal.Signals(-code).name
+        return code, None
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read(self.max_output).decode('utf-8', errors='replace')
+        except FileNotFoundError:
+            return ""
+
+    def _stage(self, io_dir, code, sig):
+        stdout = self._read(os.path.join(io_dir, 'stdout'))
+        stderr = self._read(os.path.join(io_dir, 'stderr'))
+        if code in (126, 127) and stderr.startswith("prlimit: failed to execute"):
+            # prlimit started but could not exec the command (e.g. no compiler installed)
+            raise ExecutionBackendError(f"Could not start the sandboxed process: {stderr.strip()}")
+        return {
+            "stdout": stdout,
+            "stderr": stderr,
+            "output": stdout + stderr,
+            "code": code,
+            "signal": sig,
+        }
+
+    # -- compilation -------------------------------------------------------
+
+    def _evict_builds(self):
+        """Drop least recently used builds over the cache size, skipping ones in use (lock held)"""
+        excess = len(self._builds) - self.build_cache_size
+        for key in list(self._builds):
+            if excess <= 0:
+                break
+            if self._build_refs.get(key):
+                continue
+            shutil.rmtree(self._builds.pop(key), ignore_errors=True)
+            excess -= 1
+
+    @contextmanager
+    def _build(self, language, files, work_dir):
+        """
+        Compile (or reuse) a binary; yields (binary path or None, compile stage dict)
+
+        The build stays referenced, so it is not evicted, until the caller is
+        done running it. Concurrent compiles of the same source wait for one
+        another rather than writing the same binary at once.
+        """
+        digest = hashlib.sha256(language.encode('utf-8'))
+        for f in files:
+            digest.update(b'\0' + (f["content"] or "").encode('utf-8'))
+        key = digest.hexdigest()
+
+        with self._build_lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+            self._build_refs[key] = self._build_refs.get(key, 0) + 1
+        try:
+            with key_lock:
+                yield self._compile(key, language, files, work_dir)
+        finally:
+            with self._build_lock:
+                self._build_refs[key] -= 1
+                if not self._build_refs[key]:
+                    del self._build_refs[key]
+                    del self._key_locks[key]
+                self._evict_builds()
+
+    def _compile(self, key, language, files, work_dir):
+        """Compile the build for ``key`` unless it is cached (its key lock held)"""
+        command, extension = self.COMPILERS[language]
+        build_dir = os.path.join(self.root, 'builds', key)
+        binary = os.path.join(build_dir, 'binary')
+
+        with self._build_lock:
+            if key in self._builds:
+                self._builds.move_to_end(key)
+                return binary, {"stdout": "", "stderr": "", "output": "", "code": 0, "signal": None}
+
+        src_dir = os.path.join(work_dir, 'src')
+        self._sandbox_dir(src_dir)
+        sources = []
+        for index, f in enumerate(files):
+            path = os.path.join(src_dir, f"{f.get('name') or f'file{index}'}{extension}")
+            with open(path, 'w') as out:
+                out.write(f["content"] or "")
+            sources.append(path)
+
+        # The compiler writes into this execution's scratch dir; only a copy
+        # owned by this service goes into the shared build cache
+        output = os.path.join(src_dir, 'binary')
+        io_dir = os.path.join(work_dir, 'compile')
+        os.makedirs(io_dir)
+        with open(os.path.join(io_dir, 'stdout'), 'wb') as out, open(os.path.join(io_dir, 'stderr'), 'wb') as err:
+            proc = self._popen(
+                command + [output] + [os.path.basename(path) for path in sources],
+                self.compile_timeout, self.compile_memory_bytes,
+                stdin=subprocess.DEVNULL, stdout=out, stderr=err,
+                cwd=src_dir,
+            )
+            code, sig = self._wait(proc, self.compile_timeout)
+
+        stage = self._stage(io_dir, code, sig)
+        if code != 0:
+            return None, stage
+
+        os.makedirs(build_dir, exist_ok=True)
+        os.chmod(build_dir, 0o711)
+        shutil.copyfile(output, binary)
+        os.chmod(binary, 0o755)
+        with self._build_lock:
+            self._builds[key] = build_dir
+        return binary, stage
+
+    # -- execution ---------------------------------------------------------
+
+    def execute(self, payload: dict, timeout: int = 30) -> dict:
+        language = self.LANGUAGES.get((payload.get("language") or "").lower())
+        if not language:
+            raise ExecutionBackendError(f"Language '{payload.get('language')}' is not supported by the local sandbox")
+
+        files = payload.get("files") or []
+        if not files:
+            raise ExecutionBackendError("No files to execute")
+
+        run_timeout = payload.get("run_timeout")
+        wall = (run_timeout / 1000.0) if run_timeout else self.run_timeout
+        wall = min(wall, timeout)
+        cpu = max(1, min(self.cpu_seconds, int(wall) + 1))
+
+        with tempfile.TemporaryDirectory(dir=self.root) as work_dir:
+            os.chmod(work_dir, 0o711)  # the sandbox uid may enter, not list
+            box = os.path.join(work_dir, 'box')
+            io_dir = os.path.join(work_dir, 'io')
+            self._sandbox_dir(box)
+            self._sandbox_dir(io_dir)
+            stdin_path = os.path.join(io_dir, 'stdin')
+            with open(stdin_path, 'w') as f:
+                f.write(payload.get("stdin") or "")
+            os.chmod(stdin_path, 0o644)
+
+            response = {"language": payload.get("language"), "version": payload.get("version")}
+
+            if language == 'python':
+                names = []
+                for index, f in enumerate(files):
+                    name = os.path.basename(f.get('name') or f'file{index}.py')
+                    with open(os.path.join(box, name), 'w') as out:
+                        out.write(f["content"] or "")
+                    names.append(name)
+
+                proc = self._take_python()
+                job = {
+                    "cwd": box,
+                    "entry": names[0],
+                    "cpu": cpu,
+                    "stdin": stdin_path,
+                    "stdout": os.path.join(io_dir, 'stdout'),
+                    "stderr": os.path.join(io_dir, 'stderr'),
+                }
+                started = time.monotonic()
+                proc.stdin.write((json.dumps(job) + "\n").encode('utf-8'))
+                proc.stdin.close()
+                code, sig = self._wait(proc, wall)
+            else:
+                with self._build(language, files, work_dir) as (binary, compile_stage):
+                    response["compile"] = compile_stage
+                    if binary is None:
+                        return response
+
+                    with open(stdin_path, 'rb') as stdin, \
+                            open(os.path.join(io_dir, 'stdout'), 'wb') as out, \
+                            open(os.path.join(io_dir, 'stderr'), 'wb') as err:
+                        started = time.monotonic()
+                        proc = self._popen(
+                            [binary], cpu, self.memory_bytes,
+                            stdin=stdin, stdout=out, stderr=err,
+                            cwd=box,
+                        )
+                        code, sig = self._wait(proc, wall)
+
+            response["run"] = self._stage(io_dir, code, sig)
+            response["run"]["wall_time"] = int((time.monotonic() - started) * 1000)  # ms, as Piston reports it
+            return response
+
+
+BACKENDS = {
+    'piston': PistonBackend,
+    'local': LocalSandboxBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> ExecutionBackend:
+    """Return the process-wide backend selected by EXECUTION_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = getattr(settings, 'EXECUTION_BACKEND', 'piston')
+                try:
+                    backend_class = BACKENDS[name]
+                except KeyError:
+                    raise ExecutionBackendError(f"Unknown EXECUTION_BACKEND '{name}'")
+                _backend = backend_class()
+    return _backend
@@ -0,0 +1,105 @@
+"""
+Content-addressed cache of sandbox executions.
+
+A run is identified by a SHA-256 of (source, language, version, stdin,
+limits), so re-running unchanged code against the same input is answered
+from the cache without calling the sandbox. Entries live in the Django
+cache named by EXECUTION_CACHE_ALIAS, which provides the TTL and LRU
+eviction (see CACHES in settings).
+
+Only deterministic outcomes are stored: a normal exit or a compile error.
+A timeout, a signal or a backend failure can come from an overloaded
+sandbox, and caching it would stick one flaky run to every later grade.
+"""
+import hashlib
+import json
+import threading
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ExecutionCache:
+    """Cache in front of the execution backend, with hit/miss counters"""
+
+    _lock = threading.Lock()
+    _hits = 0
+    _misses = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, 'EXECUTION_CACHE_ENABLED', True)
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'EXECUTION_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def make_key(source_code: str, language: str, version: str, stdin: str = "", limits: dict = None) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            [source_code or "", (language or "").lower(), version or "", stdin or "", limits or {}],
+            sort_keys=True,
+        ).encode('utf-8'))
+        return f"exec:{digest.hexdigest()}"
+
+    @classmethod
+    def get(cls, key: str):
+        """Return the cached result dict for ``key`` or None"""
+        if not cls.enabled():
+            return None
+
+        return cls._count(cls._cache().get(key))
+
+    @classmethod
+    async def aget(cls, key: str):
+        """Async form of get"""
+        if not cls.enabled():
+            return None
+        return cls._count(await cls._cache().aget(key))
+
+    @classmethod
+    def _count(cls, result):
+        with cls._lock:
+            if result is None:
+                cls._misses += 1
+            else:
+                cls._hits += 1
+        return result
+
+    @staticmethod
+    def cacheable(result: dict) -> bool:
+        """True for deterministic outcomes: a compile error or a normal exit"""
+        if result.get("error"):
+            return False
+        if result.get("compile_error"):
+            return True
+        if result.get("signal"):
+            return False
+        code = result.get("exit_code")
+        # None/-1: no exit status; 124 and 128+N: the batch harnesses' timeout / signal codes
+        return isinstance(code, int) and 0 <= code < 128 and code != 124
+
+    @classmethod
+    def set(cls, key: str, result: dict):
+        """Store a result if it is deterministic (see cacheable)"""
+        if not cls.enabled() or not cls.cacheable(result):
+            return
+        cls._cache().set(key, result, getattr(settings, 'EXECUTION_CACHE_TTL', 3600))
+
+    @classmethod
+    async def aset(cls, key: str, result: dict):
+        """Async form of set"""
+        if not cls.enabled() or not cls.cacheable(result):
+            return
+        await cls._cache().aset(key, result, getattr(settings, 'EXECUTION_CACHE_TTL', 3600))
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            lookups = cls._hits + cls._misses
+            return {
+                "enabled": cls.enabled(),
+                "hits": cls._hits,
+                "misses": cls._misses,
+                "hit_rate": (cls._hits / lookups) if lookups else 0.0,
+            }
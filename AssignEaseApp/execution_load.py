@@ -0,0 +1,47 @@
+"""
+Count of sandbox executions outstanding in this process.
+
+PistonService and Judge0Service wrap every call that runs code in
+ExecutionLoad.track: a single run, a harness batch, and a Judge0 batch from
+submission until its results are collected. Each counts one per test case it
+carries. Unlike the ExecutionPool job count this includes the async views,
+which await the backends directly instead of going through the pool, so it
+is what ExecutionRateLimiter sheds load on.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+
+class ExecutionLoad:
+    _lock = threading.Lock()
+    _in_flight = 0
+
+    @classmethod
+    def in_flight(cls) -> int:
+        """Executions currently sent to a backend and not yet answered"""
+        return cls._in_flight
+
+    @classmethod
+    def _add(cls, delta: int):
+        with cls._lock:
+            cls._in_flight += delta
+
+    @classmethod
+    @contextmanager
+    def track(cls, executions: int = 1):
+        """Count ``executions`` as outstanding for the duration of the block (sync or async callers)"""
+        cls._add(executions)
+        try:
+            yield
+        finally:
+            cls._add(-executions)
+
+    @classmethod
+    def _reset_after_fork(cls):
+        cls._lock = threading.Lock()
+        cls._in_flight = 0
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=ExecutionLoad._reset_after_fork)
@@ -0,0 +1,137 @@
+"""
+Bounded-concurrency executor for sandbox calls.
+
+Every call that talks to an execution backend (Piston, Judge0, ...) goes
+through one process-wide thread pool. The pool size is the global in-flight
+limit; each caller additionally caps how many of its own jobs may be queued
+at once so a single large submission cannot starve everyone else.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+
+class ExecutionPool:
+    """Process-wide pool used to fan test cases out to the sandbox"""
+
+    _executor = None
+    _lock = threading.Lock()
+    _in_flight = 0
+    _local = threading.local()
+
+    @staticmethod
+    def max_in_flight() -> int:
+        return max(1, int(getattr(settings, 'EXECUTION_MAX_IN_FLIGHT', 32)))
+
+    @staticmethod
+    def max_per_submission() -> int:
+        return max(1, int(getattr(settings, 'EXECUTION_MAX_PER_SUBMISSION', 8)))
+
+    @classmethod
+    def _get_executor(cls):
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=cls.max_in_flight(),
+                        thread_name_prefix='assignease-exec',
+                        initializer=cls._mark_worker,
+                    )
+        return cls._executor
+
+    @classmethod
+    def _mark_worker(cls):
+        cls._local.worker = True
+
+    @classmethod
+    def on_worker(cls) -> bool:
+        """True on a pool thread, which already holds one of the pool's slots"""
+        return getattr(cls._local, 'worker', False)
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # Worker threads do not survive fork(); the child starts a fresh pool
+        cls._executor = None
+        cls._lock = threading.Lock()
+        cls._in_flight = 0
+
+    @classmethod
+    def in_flight(cls) -> int:
+        """Number of jobs currently queued or running in the pool"""
+        return cls._in_flight
+
+    @classmethod
+    def _track(cls, delta: int):
+        with cls._lock:
+            cls._in_flight += delta
+
+    @classmethod
+    def submit(cls, func, *args):
+        """Schedule one call on the shared pool and return its concurrent.futures.Future"""
+        def run():
+            try:
+                return func(*args)
+            finally:
+                cls._track(-1)
+
+        cls._track(1)
+        return cls._get_executor().submit(run)
+
+    @classmethod
+    def call(cls, func, *args):
+        """
+        Run ``func`` in one pool slot and wait for its result.
+
+        Used for calls that carry several test cases at once (a Piston batch,
+        a Judge0 submission batch) so they count against EXECUTION_MAX_IN_FLIGHT
+        like single runs. Called from a pool thread it runs inline, since that
+        thread already holds a slot.
+        """
+        if cls.on_worker():
+            return func(*args)
+        return cls.submit(func, *args).result()
+
+    @classmethod
+    def map(cls, func, items, max_concurrency: int = None) -> list:
+        """
+        Apply ``func`` to every item concurrently and return results in input order.
+
+        Args:
+            func: Callable taking a single item
+            items: Iterable of items to process
+            max_concurrency: Per-call limit (defaults to EXECUTION_MAX_PER_SUBMISSION)
+
+        Returns:
+            List of results, one per item. Exceptions raised by ``func`` propagate.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        limit = max_concurrency or cls.max_per_submission()
+        if len(items) == 1 or limit == 1 or cls.on_worker():
+            # A pool thread waiting on further pool jobs could deadlock a saturated pool
+            return [func(item) for item in items]
+
+        executor = cls._get_executor()
+        slots = threading.BoundedSemaphore(limit)
+
+        def run(item):
+            try:
+                return func(item)
+            finally:
+                cls._track(-1)
+                slots.release()
+
+        futures = []
+        for item in items:
+            slots.acquire()
+            cls._track(1)
+            futures.append(executor.submit(run, item))
+
+        return [future.result() for future in futures]
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=ExecutionPool._reset_after_fork)
@@ -0,0 +1,117 @@
+"""
+Spreads test case executions across Piston and Judge0 (GRADING_BACKEND = 'auto').
+
+Every backend gets a weight of 1 / (latency x (1 + queued)), where latency
+is an exponentially weighted moving average of the seconds per test case
+this process has observed and queued is the number of test cases currently
+running on it. Each run goes to a backend picked at random in proportion to
+its weight (but at least EXECUTION_ROUTER_MIN_SHARE of the runs), so both
+backends carry load and the faster, less busy one gets more of it. Backends
+whose circuit breaker is open are tried last, and test cases that fail with
+a backend error are retried on the next backend.
+"""
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from .circuit_breaker import get_breaker
+
+
+class ExecutionRouter:
+    """Weighted backend choice for GradingService.run_testcases"""
+
+    BACKENDS = ('piston', 'judge0')
+
+    _lock = threading.Lock()
+    _latency = {}  # backend -> EWMA of seconds per test case
+    _queued = {}  # backend -> test cases running now
+
+    @classmethod
+    def _add_queued(cls, backend: str, count: int):
+        with cls._lock:
+            cls._queued[backend] = cls._queued.get(backend, 0) + count
+
+    @classmethod
+    def observe(cls, backend: str, seconds_per_case: float):
+        """Fold one successful run into the backend's latency average"""
+        alpha = getattr(settings, 'EXECUTION_ROUTER_EWMA_ALPHA', 0.3)
+        with cls._lock:
+            previous = cls._latency.get(backend)
+            cls._latency[backend] = seconds_per_case if previous is None else (
+                alpha * seconds_per_case + (1 - alpha) * previous
+            )
+
+    @classmethod
+    def weight(cls, backend: str) -> float:
+        latency = cls._latency.get(backend)
+        if latency is None:
+            # Not observed yet: assume it is as fast as the best one so it gets tried
+            latency = min(cls._latency.values(), default=getattr(settings, 'EXECUTION_ROUTER_INITIAL_LATENCY', 1.0))
+        return 1.0 / (max(latency, 0.001) * (1 + cls._queued.get(backend, 0)))
+
+    @classmethod
+    def order(cls, candidates) -> list:
+        """
+        Order ``candidates`` for one run.
+
+        Returns:
+            Backends to try in turn: a weighted random pick among the available
+            ones, the other available ones by weight, then those with an open circuit
+        """
+        available = [b for b in candidates if get_breaker(b).available()]
+        unavailable = [b for b in candidates if b not in available]
+        if not available:
+            return unavailable
+
+        # Every available backend keeps a minimum share so its latency stays measured
+        weights = [cls.weight(b) for b in available]
+        min_share = getattr(settings, 'EXECUTION_ROUTER_MIN_SHARE', 0.1)
+        total = sum(weights)
+        shares = [max(w / total, min_share) for w in weights]
+        first = random.choices(available, weights=shares)[0]
+        rest = sorted((b for b in available if b != first), key=cls.weight, reverse=True)
+        return [first] + rest + unavailable
+
+    @classmethod
+    @contextmanager
+    def dispatch(cls, backend: str, count: int):
+        """
+        Count ``count`` test cases as queued on ``backend`` while the block runs.
+
+        The block sets outcome["failed"] when the backend did not deliver;
+        otherwise its duration is recorded as the backend's latency.
+        """
+        outcome = {"failed": False}
+        cls._add_queued(backend, count)
+        started = time.monotonic()
+        try:
+            yield outcome
+        except BaseException:
+            outcome["failed"] = True
+            raise
+        finally:
+            cls._add_queued(backend, -count)
+            if not outcome["failed"] and count:
+                cls.observe(backend, (time.monotonic() - started) / count)
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        return {
+            backend: {
+                "latency": cls._latency.get(backend),
+                "queued": cls._queued.get(backend, 0),
+                "weight": cls.weight(backend),
+            }
+            for backend in cls.BACKENDS
+        }
+
+    @classmethod
+    def _reset_after_fork(cls):
+        cls._lock = threading.Lock()
+        cls._queued = {}
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=ExecutionRouter._reset_after_fork)
@@ -0,0 +1,581 @@
+import asyncio
+import hashlib
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, router, transaction
+from .checkers import cap_output, outputs_match
+from .models import TestCase, TestCaseResult
+from .piston_service import PistonService
+from .judge0_service import Judge0Service
+from .language_registry import LanguageRegistry
+from .execution_pool import ExecutionPool
+from .execution_router import ExecutionRouter
+
+
+# Per-execution telemetry copied from backend results onto graded results / TestCaseResult
+TELEMETRY_FIELDS = ("backend", "backend_time", "bytes_in", "bytes_out", "cache_hit")
+
+
+def _advance(steps, value):
+    """Resume an evaluation generator; returns (finished, yielded job or final summary)"""
+    try:
+        return False, steps.send(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+class GradingError(Exception):
+    """Raised when a submission cannot be graded (e.g. no language configured)"""
+    pass
+
+
+class GradingService:
+    """Runs test cases against the execution backend and stores the outcome"""
+
+    @staticmethod
+    def resolve_language(assignment):
+        """
+        Resolve the execution language for an assignment.
+
+        Returns:
+            Tuple of (piston_language, piston_version, judge0_language_id);
+            language may be None, judge0_language_id may be None
+        """
+        piston_language = None
+        piston_version = assignment.language_version or ""
+        judge0_language_id = None
+
+        if assignment.language:
+            # ProgrammingLanguage matched by piston, display or language name (no query once loaded)
+            resolved = LanguageRegistry.resolve(assignment.language)
+            if resolved:
+                piston_language = resolved.piston_language
+                # prefer explicit version from assignment, otherwise PL's version
+                if not piston_version:
+                    piston_version = resolved.piston_version
+                judge0_language_id = resolved.judge0_language_id
+            else:
+                # fallback to raw assignment.language (user might have stored piston name there)
+                piston_language = assignment.language
+
+        return piston_language, piston_version, judge0_language_id
+
+    @staticmethod
+    def run_testcases(source_code: str, language: str, version: str, testcases, judge0_language_id=None) -> list:
+        """
+        Execute every test case on the backend selected by GRADING_BACKEND.
+
+        'piston' and 'judge0' use that backend; 'auto' lets ExecutionRouter
+        spread runs over both and fail over when one of them is down.
+
+        Returns:
+            List of dicts (in test case order) with testcase, stdout, stderr,
+            passed, compile_error, backend_error and, when the backend reports them,
+            execution_time, memory_used and judge0_token
+        """
+        testcases = list(testcases)
+        backend = getattr(settings, 'GRADING_BACKEND', 'piston')
+
+        if backend != 'auto':
+            return GradingService._run_on(backend, source_code, language, version, testcases, judge0_language_id)
+
+        results = [None] * len(testcases)
+        pending = list(range(len(testcases)))
+        for backend in ExecutionRouter.order(GradingService._candidate_backends(language, judge0_language_id)):
+            with ExecutionRouter.dispatch(backend, len(pending)) as outcome:
+                outputs = GradingService._run_on(
+                    backend, source_code, language, version, [testcases[i] for i in pending], judge0_language_id
+                )
+                outcome["failed"] = any(r["backend_error"] for r in outputs)
+            pending = GradingService._merge_routed(results, pending, outputs)
+            if not pending:
+                break
+
+        return results
+
+    @staticmethod
+    async def arun_testcases(source_code: str, language: str, version: str, testcases, judge0_language_id=None) -> list:
+        """Async form of run_testcases; awaits the backend instead of blocking a thread per case"""
+        testcases = list(testcases)
+        backend = getattr(settings, 'GRADING_BACKEND', 'piston')
+        # A cold or expired LanguageRegistry queries the database, which cannot run on the event loop
+        candidates, judge0_language_id = await sync_to_async(GradingService._resolve_backends)(
+            backend, language, judge0_language_id
+        )
+
+        if backend != 'auto':
+            return await GradingService._arun_on(backend, source_code, language, version, testcases, judge0_language_id)
+
+        results = [None] * len(testcases)
+        pending = list(range(len(testcases)))
+        for backend in ExecutionRouter.order(candidates):
+            with ExecutionRouter.dispatch(backend, len(pending)) as outcome:
+                outputs = await GradingService._arun_on(
+                    backend, source_code, language, version, [testcases[i] for i in pending], judge0_language_id
+                )
+                outcome["failed"] = any(r["backend_error"] for r in outputs)
+            pending = GradingService._merge_routed(results, pending, outputs)
+            if not pending:
+                break
+
+        return results
+
+    @staticmethod
+    def _candidate_backends(language, judge0_language_id):
+        """Backends able to run ``language`` when GRADING_BACKEND is 'auto'"""
+        candidates = ['piston']
+        if judge0_language_id or Judge0Service.supports_language(language):
+            candidates.append('judge0')
+        return candidates
+
+    @staticmethod
+    def _resolve_backends(backend, language, judge0_language_id):
+        """
+        Backends arun_testcases may use for ``language`` and the Judge0 id to
+        send if one of them is Judge0, looked up before anything is awaited
+
+        Returns:
+            Tuple of (backend names, judge0_language_id or None)
+        """
+        candidates = GradingService._candidate_backends(language, judge0_language_id) if backend == 'auto' else [backend]
+        if 'judge0' in candidates and not judge0_language_id:
+            judge0_language_id = Judge0Service.get_language_id(language)
+        return candidates, judge0_language_id
+
+    @staticmethod
+    def _merge_routed(results, pending, outputs):
+        """Store the outputs for the pending indexes; returns the indexes to retry elsewhere"""
+        for i, output in zip(pending, outputs):
+            results[i] = output
+        return [i for i in pending if results[i]["backend_error"]]
+
+    @staticmethod
+    def _run_on(backend, source_code, language, version, testcases, judge0_language_id=None) -> list:
+        """Run test cases on one backend ('piston' or 'judge0')"""
+        queued_at = time.monotonic()
+
+        if backend == 'judge0':
+            language_id = judge0_language_id or Judge0Service.get_language_id(language)
+            # One pool slot for the whole Judge0 batch
+            outputs = ExecutionPool.call(Judge0Service.evaluate_testcases, source_code, language_id, testcases)
+            return GradingService._judge0_results(source_code, testcases, outputs, queued_at)
+
+        if len(testcases) > 1 and PistonService.supports_batch(language):
+            # Compile once and run the cases in as few sandbox executions as fit
+            # the server's run_timeout (one pool slot each, see PistonService.run_batch)
+            outputs = PistonService.run_batch(
+                source_code, language, version,
+                [tc.input_text for tc in testcases],
+                timeout=max(tc.timeout for tc in testcases),
+            )
+            return [
+                GradingService._timed(GradingService._grade(tc, result), queued_at, queued_at)
+                for tc, result in zip(testcases, outputs)
+            ]
+
+        def run(tc):
+            started = time.monotonic()
+            result = PistonService.run_code(
+                source_code=source_code,
+                language=language,
+                version=version,
+                stdin=tc.input_text,
+                timeout=tc.timeout,
+            )
+            return GradingService._timed(GradingService._grade(tc, result), queued_at, started)
+
+        return ExecutionPool.map(run, testcases)
+
+    @staticmethod
+    async def _arun_on(backend, source_code, language, version, testcases, judge0_language_id=None) -> list:
+        """Async form of _run_on; judge0_language_id must already be resolved (see _resolve_backends)"""
+        queued_at = time.monotonic()
+
+        if any(tc.input_blob or tc.expected_output_blob for tc in testcases):
+            # Read blob-backed test data from storage off the event loop
+            await asyncio.to_thread(GradingService._load_test_data, testcases)
+
+        if backend == 'judge0':
+            outputs = await Judge0Service.aevaluate_testcases(source_code, judge0_language_id, testcases)
+            return GradingService._judge0_results(source_code, testcases, outputs, queued_at)
+
+        if len(testcases) > 1 and PistonService.supports_batch(language):
+            outputs = await PistonService.arun_batch(
+                source_code, language, version,
+                [tc.input_text for tc in testcases],
+                timeout=max(tc.timeout for tc in testcases),
+            )
+            return [
+                GradingService._timed(GradingService._grade(tc, result), queued_at, queued_at)
+                for tc, result in zip(testcases, outputs)
+            ]
+
+        slots = asyncio.Semaphore(ExecutionPool.max_per_submission())
+
+        async def run(tc):
+            async with slots:
+                started = time.monotonic()
+                result = await PistonService.arun_code(
+                    source_code=source_code,
+                    language=language,
+                    version=version,
+                    stdin=tc.input_text,
+                    timeout=tc.timeout,
+                )
+            return GradingService._timed(GradingService._grade(tc, result), queued_at, started)
+
+        return await asyncio.gather(*(run(tc) for tc in testcases))
+
+    @staticmethod
+    def _timed(graded, queued_at, started):
+        """Add queue_wait (until the case was sent) and wall_time (until its result) in seconds"""
+        graded["queue_wait"] = started - queued_at
+        graded["wall_time"] = time.monotonic() - queued_at
+        return graded
+
+    @staticmethod
+    def _grade(tc, result):
+        """Compare a Piston run with the expected output using the test case's checker"""
+        stdout, truncated = cap_output(result.get("stdout"))
+        stderr = result.get("stderr") or ""
+        if truncated and not stderr:
+            stderr = "Output limit exceeded"
+
+        graded = {
+            "testcase": tc,
+            "stdout": stdout.strip(),
+            "stderr": stderr,
+            "passed": stderr == "" and outputs_match(tc, stdout),
+            "compile_error": result.get("compile_error", False),
+            "backend_error": bool(result.get("error")),
+            "execution_time": result.get("execution_time"),
+            "memory_used": result.get("memory_used"),
+        }
+        graded.update((field, result[field]) for field in TELEMETRY_FIELDS if field in result)
+        return graded
+
+    @staticmethod
+    def _judge0_result(tc, result):
+        return {
+            "testcase": tc,
+            "stdout": (result.get("actual_output") or "").strip(),
+            "stderr": result.get("error_message") or "",
+            "passed": result["passed"],
+            "compile_error": result.get("compile_error", False),
+            "backend_error": result.get("status") == "error",
+            "execution_time": result.get("execution_time"),
+            "memory_used": result.get("memory_used"),
+            "judge0_token": result.get("judge0_token"),
+        }
+
+    @staticmethod
+    def _judge0_results(source_code, testcases, outputs, queued_at):
+        """_judge0_result for a whole batch, with the batch round trip split over its cases"""
+        elapsed = time.monotonic() - queued_at
+        code_bytes = len((source_code or "").encode('utf-8')) // max(1, len(testcases))
+        results = []
+        for tc, output in zip(testcases, outputs):
+            graded = GradingService._judge0_result(tc, output)
+            graded.update(
+                backend="judge0",
+                backend_time=elapsed / len(testcases),
+                bytes_in=code_bytes + len((tc.input_text or "").encode('utf-8')),
+                bytes_out=len((output.get("actual_output") or "").encode('utf-8')) + len(graded["stderr"].encode('utf-8')),
+                cache_hit=False,
+                queue_wait=0.0,
+                wall_time=elapsed,
+            )
+            results.append(graded)
+        return results
+
+    @staticmethod
+    def run_testcase(source_code: str, language: str, version: str, testcase, judge0_language_id=None) -> dict:
+        """Execute a single test case; same result dict as run_testcases"""
+        return GradingService.run_testcases(
+            source_code, language, version, [testcase], judge0_language_id=judge0_language_id
+        )[0]
+
+    @staticmethod
+    def save_results(submission, results):
+        """
+        Upsert one TestCaseResult per result dict in a single INSERT.
+
+        Existing rows for the same (submission, testcase) are overwritten via
+        ON CONFLICT / ON DUPLICATE KEY UPDATE instead of a SELECT and an
+        INSERT or UPDATE per case. Call inside a transaction.
+        """
+        rows = []
+        for r in results:
+            if r.get("reused"):
+                continue
+            if r.get("skipped"):
+                status = "skipped"
+            else:
+                status = "passed" if r["passed"] else "failed"
+            rows.append(TestCaseResult(
+                submission=submission,
+                testcase=r["testcase"],
+                status=status,
+                actual_output=r["stdout"],
+                error_message=r["stderr"],
+                execution_time=r.get("execution_time"),
+                memory_used=r.get("memory_used"),
+                judge0_token=r.get("judge0_token"),
+                grading_hash=r.get("grading_hash"),
+                backend=r.get("backend") or "",
+                wall_time=r.get("wall_time"),
+                backend_time=r.get("backend_time"),
+                queue_wait=r.get("queue_wait"),
+                bytes_in=r.get("bytes_in"),
+                bytes_out=r.get("bytes_out"),
+                cache_hit=bool(r.get("cache_hit")),
+            ))
+
+        if not rows:
+            return
+
+        # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target
+        db = router.db_for_write(TestCaseResult)
+        unique_fields = None
+        if connections[db].features.supports_update_conflicts_with_target:
+            unique_fields = ["submission", "testcase"]
+
+        TestCaseResult.objects.using(db).bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=[
+                "status", "actual_output", "error_message",
+                "execution_time", "memory_used", "judge0_token",
+                "grading_hash", "backend", "wall_time", "backend_time",
+                "queue_wait", "bytes_in", "bytes_out", "cache_hit", "updated_at",
+            ],
+        )
+
+    @staticmethod
+    def grading_hash(source_code: str, language: str, version: str, testcase) -> str:
+        """Identify a (code, test case) pair; a result with the same hash can be reused"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([
+            source_code or "", (language or "").lower(), version or "",
+            GradingService._test_data_key(testcase, "input"),
+            GradingService._test_data_key(testcase, "expected_output"),
+            testcase.timeout, testcase.memory_limit,
+            testcase.checker, testcase.float_tolerance,
+        ]).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _load_test_data(testcases):
+        for tc in testcases:
+            tc.input_text, tc.expected_output_text
+
+    @staticmethod
+    def _test_data_key(testcase, field):
+        # Blob-backed data is identified by its digest so hashing does not load it
+        blob = getattr(testcase, f"{field}_blob", None)
+        return f"blob:{blob}" if blob else getattr(testcase, field) or ""
+
+    @staticmethod
+    def grading_policy(question):
+        """
+        Resolve the grading policy of a question, falling back to its assignment.
+
+        Returns:
+            Tuple of (policy, max_consecutive_failures)
+        """
+        assignment = question.assignment
+        policy = question.grading_policy or assignment.grading_policy or 'run_all'
+        if question.max_consecutive_failures is not None:
+            max_failures = question.max_consecutive_failures
+        else:
+            max_failures = assignment.max_consecutive_failures
+        return policy, max(1, max_failures or 1)
+
+    @staticmethod
+    def evaluate_submission(submission, on_progress=None, reuse_results=False) -> dict:
+        """
+        Run the test cases of the submission's question, store every
+        TestCaseResult and update the submission marks. Each chunk of results
+        is written with one bulk upsert in the same transaction as the
+        submission totals.
+
+        The question's grading policy decides when to stop early:
+            run_all               - run every case
+            stop_on_compile_error - run the first case alone and skip the
+                                    rest if the program did not compile
+            stop_after_failures   - stop once max_consecutive_failures cases
+                                    in a row have failed
+        Cases that are not run are stored with status 'skipped' and count as
+        failed. Compile errors are reported by compiled languages only; an
+        interpreted program with a syntax error is caught by
+        stop_after_failures.
+
+        Every stored result carries a grading_hash of the code, language and
+        test case. With reuse_results, cases whose stored hash still matches
+        are not run again, which makes regrading after a test case edit cheap
+        and lets an interrupted regrade resume where it stopped.
+
+        Args:
+            on_progress: Optional callback ``(completed, passed, total)``. When
+                given, cases are run in chunks of GRADING_PROGRESS_CHUNK and the
+                results and submission totals are saved after every chunk.
+            reuse_results: Keep stored results whose grading_hash is unchanged.
+
+        Raises:
+            GradingError: if no language can be resolved for the assignment
+        """
+        steps = GradingService._evaluation_steps(submission, on_progress, reuse_results)
+        finished, value = _advance(steps, None)
+        while not finished:
+            # value is a run_testcases job; send its results back
+            finished, value = _advance(steps, GradingService.run_testcases(**value))
+        return value
+
+    @staticmethod
+    async def aevaluate_submission(submission, on_progress=None, reuse_results=False) -> dict:
+        """
+        Async form of evaluate_submission. Database work runs in Django's
+        sync thread; test case executions are awaited on the event loop.
+        """
+        steps = GradingService._evaluation_steps(submission, on_progress, reuse_results)
+        advance = sync_to_async(_advance)
+        finished, value = await advance(steps, None)
+        while not finished:
+            finished, value = await advance(steps, await GradingService.arun_testcases(**value))
+        return value
+
+    @staticmethod
+    def _evaluation_steps(submission, on_progress, reuse_results):
+        """
+        Generator behind evaluate_submission and aevaluate_submission: yields
+        run_testcases keyword arguments, receives the results and returns the
+        summary, so the same grading logic serves the sync and async drivers.
+        """
+        question = submission.question
+        testcases = list(TestCase.objects.filter(question=question).order_by('id'))
+        total_count = len(testcases)
+
+        if not testcases:
+            return {
+                "submission_id": submission.id,
+                "total_testcases": 0,
+                "passed_testcases": 0,
+                "skipped_testcases": 0,
+                "reused_testcases": 0,
+                "auto_marks": 0,
+                "percentage": 0,
+            }
+
+        piston_language, piston_version, judge0_language_id = GradingService.resolve_language(submission.assignment)
+        if not piston_language:
+            raise GradingError("No language configured for assignment")
+
+        policy, max_failures = GradingService.grading_policy(question)
+        hashes = {
+            tc.id: GradingService.grading_hash(submission.code, piston_language, piston_version, tc)
+            for tc in testcases
+        }
+        stored = {}
+        if reuse_results:
+            for row in TestCaseResult.objects.filter(submission=submission).exclude(status="skipped"):
+                if row.grading_hash and row.grading_hash == hashes.get(row.testcase_id):
+                    stored[row.testcase_id] = row
+        if on_progress is None:
+            chunk_size = total_count
+        else:
+            chunk_size = max(1, int(getattr(settings, 'GRADING_PROGRESS_CHUNK', 8)))
+
+        completed_count = 0
+        passed_count = 0
+        skipped_count = 0
+        reused_count = 0
+        auto_marks = 0
+        consecutive_failures = 0
+        skip_reason = None
+
+        while completed_count < total_count:
+            if skip_reason:
+                chunk = testcases[completed_count:]
+                results = [
+                    {"testcase": tc, "stdout": "", "stderr": skip_reason, "passed": False, "skipped": True}
+                    for tc in chunk
+                ]
+                skipped_count += len(results)
+            else:
+                size = chunk_size
+                if policy == 'stop_on_compile_error' and completed_count == 0:
+                    # A compile error shows up on the first case, so probe it alone
+                    size = 1
+                elif policy == 'stop_after_failures':
+                    # A round of the remaining failure budget cannot overshoot the
+                    # limit; below one fan-out wave, run the whole wave anyway (the
+                    # cases past the limit are discarded) so the round still runs
+                    # in parallel / as one batch. At most a wave minus one is wasted.
+                    size = min(size, max(max_failures - consecutive_failures, ExecutionPool.max_per_submission()))
+
+                chunk = testcases[completed_count:completed_count + size]
+                pending = [tc for tc in chunk if tc.id not in stored]
+                outputs = iter((yield {
+                    "source_code": submission.code,
+                    "language": piston_language,
+                    "version": piston_version,
+                    "testcases": pending,
+                    "judge0_language_id": judge0_language_id,
+                }) if pending else [])
+
+                results = []
+                for tc in chunk:
+                    row = stored.get(tc.id)
+                    output = next(outputs) if row is None else None
+                    if skip_reason:
+                        # Ran in the same round as the case that hit the limit
+                        results.append({"testcase": tc, "stdout": "", "stderr": skip_reason, "passed": False, "skipped": True})
+                        skipped_count += 1
+                        continue
+                    if row is None:
+                        r = output
+                        r["grading_hash"] = hashes[tc.id]
+                    else:
+                        r = {
+                            "testcase": tc,
+                            "stdout": row.actual_output or "",
+                            "stderr": row.error_message or "",
+                            "passed": row.status == "passed",
+                            "reused": True,
+                        }
+                        reused_count += 1
+                    results.append(r)
+
+                    consecutive_failures = 0 if r["passed"] else consecutive_failures + 1
+                    if policy == 'stop_on_compile_error' and r.get("compile_error"):
+                        skip_reason = "Skipped: the submission failed to compile"
+                    elif policy == 'stop_after_failures' and consecutive_failures >= max_failures:
+                        skip_reason = f"Skipped after {max_failures} consecutive failed test cases"
+
+            completed_count += len(results)
+            passed_count += sum(1 for r in results if r["passed"])
+            auto_marks = (passed_count / total_count) * question.total_marks
+
+            with transaction.atomic():
+                GradingService.save_results(submission, results)
+
+                submission.total_testcases = total_count
+                submission.passed_testcases = passed_count
+                submission.auto_marks = auto_marks
+                submission.save(update_fields=["total_testcases", "passed_testcases", "auto_marks", "updated_at"])
+
+            if on_progress is not None:
+                on_progress(completed_count, passed_count, total_count)
+
+        return {
+            "submission_id": submission.id,
+            "total_testcases": total_count,
+            "passed_testcases": passed_count,
+            "skipped_testcases": skipped_count,
+            "reused_testcases": reused_count,
+            "auto_marks": auto_marks,
+            "percentage": (passed_count / total_count * 100) if total_count else 0
+        }
@@ -0,0 +1,147 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import GradingJob, Submission, TestCase
+from .grading_service import GradingService
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'GRADING_WORKERS', 4),
+                    thread_name_prefix='assignease-grading',
+                )
+    return _executor
+
+
+def _reset_after_fork():
+    global _executor, _lock
+    _executor = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def run_grading_job(job_id, reuse_results=False):
+    """Grade the job's submission, updating job and submission progress as cases finish"""
+    close_old_connections()
+    try:
+        # Claim the job; a job re-queued by recover_stale_jobs may be submitted twice
+        claimed = GradingJob.objects.filter(id=job_id, status="queued").update(
+            status="running", started_at=timezone.now(), updated_at=timezone.now()
+        )
+        if not claimed:
+            return
+        job = GradingJob.objects.select_related('submission', 'submission__question', 'submission__assignment').get(id=job_id)
+
+        def on_progress(completed, passed, total):
+            job.total_testcases = total
+            job.completed_testcases = completed
+            job.passed_testcases = passed
+            job.save(update_fields=["total_testcases", "completed_testcases", "passed_testcases", "updated_at"])
+
+        try:
+            summary = GradingService.evaluate_submission(
+                job.submission, on_progress=on_progress, reuse_results=reuse_results
+            )
+            job.total_testcases = summary["total_testcases"]
+            job.completed_testcases = summary["total_testcases"]
+            job.passed_testcases = summary["passed_testcases"]
+            job.status = "done"
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+
+        job.completed_at = timezone.now()
+        job.save()
+    finally:
+        connection.close()
+
+
+def enqueue_grading(submission, requested_by=None, reuse_results=False) -> GradingJob:
+    """Create a GradingJob for the submission and hand it to the worker pool"""
+    job = GradingJob.objects.create(submission=submission, requested_by=requested_by)
+    transaction.on_commit(lambda: _get_executor().submit(run_grading_job, job.id, reuse_results))
+    return job
+
+
+def stale_jobs():
+    """
+    Queued or running jobs with no progress for GRADING_JOB_STALE_SECONDS.
+
+    Jobs live in an in-process thread pool, so a restart or deploy loses
+    every job it had not finished; their rows stop being updated.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'GRADING_JOB_STALE_SECONDS', 900))
+    return GradingJob.objects.filter(status__in=("queued", "running")).filter(
+        Q(updated_at__lt=cutoff) | Q(updated_at__isnull=True, created_at__lt=cutoff)
+    )
+
+
+def recover_stale_jobs(jobs=None) -> dict:
+    """
+    Re-queue stale jobs, or fail them after GRADING_JOB_MAX_ATTEMPTS re-queues.
+
+    Args:
+        jobs: GradingJob queryset to look at (defaults to all of them)
+
+    Returns:
+        {"requeued": n, "failed": n}
+    """
+    jobs = stale_jobs() if jobs is None else jobs & stale_jobs()
+    max_attempts = getattr(settings, 'GRADING_JOB_MAX_ATTEMPTS', 2)
+    counts = {"requeued": 0, "failed": 0}
+
+    for job in jobs:
+        # Conditional update so only one process recovers a given job
+        unchanged = GradingJob.objects.filter(id=job.id, status=job.status, updated_at=job.updated_at)
+        if job.attempts >= max_attempts:
+            if unchanged.update(
+                status="error", error="Grading was interrupted (the grading worker stopped)",
+                completed_at=timezone.now(), updated_at=timezone.now(),
+            ):
+                counts["failed"] += 1
+        elif unchanged.update(status="queued", attempts=F("attempts") + 1, updated_at=timezone.now()):
+            _get_executor().submit(run_grading_job, job.id, True)
+            counts["requeued"] += 1
+    return counts
+
+
+def submissions_to_regrade(question_id=None, assignment_id=None, class_id=None):
+    """Coding submissions of a question, assignment or class whose question has test cases"""
+    submissions = Submission.objects.filter(
+        question__in=TestCase.objects.values('question')
+    ).select_related('question', 'assignment')
+    if question_id:
+        submissions = submissions.filter(question_id=question_id)
+    if assignment_id:
+        submissions = submissions.filter(assignment_id=assignment_id)
+    if class_id:
+        submissions = submissions.filter(assignment__class_assigned_id=class_id)
+    return submissions.order_by('id')
+
+
+def regrade_submission(submission_id, reuse_results=True) -> dict:
+    """
+    Regrade one submission, by default reusing results whose test case and
+    code are unchanged. Runs in regrade_submissions worker processes.
+    """
+    close_old_connections()
+    try:
+        submission = Submission.objects.select_related('question__assignment', 'assignment').get(id=submission_id)
+        return GradingService.evaluate_submission(submission, reuse_results=reuse_results)
+    finally:
+        connection.close()
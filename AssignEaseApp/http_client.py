@@ -0,0 +1,221 @@
+"""
+Shared HTTP client for the execution and LLM backends.
+
+Piston, Judge0 and Ollama calls go through one ``requests.Session`` per
+host so TCP/TLS connections are kept alive and reused across test cases
+and grading calls. Failures to connect and 502/503 responses are retried
+with exponential backoff plus jitter; read timeouts and errors after the
+request was sent are not, so a slow call is never repeated.
+
+AsyncHttpClient is the non-blocking equivalent (httpx) used by the async
+views, with the same pool size, timeouts and retry policy. Its clients live
+for one ``AsyncHttpClient.scope()`` (AsyncAPIView opens one per request):
+calls inside share one ``httpx.AsyncClient`` per host, and they are closed
+when the scope exits. Under WSGI every request runs on its own event loop, so
+clients cached per loop would never be closed. A call outside any scope uses
+a client of its own.
+
+Calls made with ``breaker=<name>`` go through that circuit breaker (see
+circuit_breaker): while it is open they raise CircuitOpenError /
+AsyncCircuitOpenError at once, which callers already handle as
+connection errors.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from .circuit_breaker import get_breaker
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a service whose circuit is open"""
+    pass
+
+
+class AsyncCircuitOpenError(httpx.ConnectError):
+    """Async counterpart of CircuitOpenError"""
+    pass
+
+
+class HttpClient:
+    """Per-host pooled, keep-alive sessions"""
+
+    _sessions = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _build_session() -> requests.Session:
+        pool_size = getattr(settings, 'HTTP_POOL_SIZE', 32)
+        retries = getattr(settings, 'HTTP_RETRIES', 2)
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            # Never re-send a request the server may already be processing: a read
+            # timeout would otherwise repeat a whole Piston/Ollama call or create a
+            # Judge0 batch twice
+            read=0,
+            other=0,
+            status=retries,
+            status_forcelist=(502, 503),
+            allowed_methods=None,  # POST too, but only for connect errors and 502/503
+            backoff_factor=getattr(settings, 'HTTP_RETRY_BACKOFF', 0.3),
+            backoff_jitter=getattr(settings, 'HTTP_RETRY_JITTER', 0.3),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @classmethod
+    def session_for(cls, url: str) -> requests.Session:
+        """Return the shared session for the scheme and host of ``url``"""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+
+        session = cls._sessions.get(key)
+        if session is None:
+            with cls._lock:
+                session = cls._sessions.get(key)
+                if session is None:
+                    session = cls._build_session()
+                    cls._sessions[key] = session
+        return session
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # A forked child must not share keep-alive sockets with its parent
+        cls._sessions = {}
+        cls._lock = threading.Lock()
+
+    @staticmethod
+    def _timeout(read_timeout):
+        return (getattr(settings, 'HTTP_CONNECT_TIMEOUT', 5), read_timeout)
+
+    @classmethod
+    def _request(cls, method: str, url: str, read_timeout: float, breaker: str = None, **kwargs) -> requests.Response:
+        circuit = get_breaker(breaker) if breaker else None
+        ticket = circuit.allow() if circuit else None
+        if circuit and ticket is None:
+            raise CircuitOpenError(f"{breaker} is unavailable (circuit open)")
+
+        started = time.monotonic()
+        failed = True
+        try:
+            response = cls.session_for(url).request(method, url, timeout=cls._timeout(read_timeout), **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            if circuit:
+                circuit.record(ticket, failed, time.monotonic() - started)
+
+    @classmethod
+    def post(cls, url: str, read_timeout: float = 30, breaker: str = None, **kwargs) -> requests.Response:
+        return cls._request("POST", url, read_timeout, breaker=breaker, **kwargs)
+
+    @classmethod
+    def get(cls, url: str, read_timeout: float = 10, breaker: str = None, **kwargs) -> requests.Response:
+        return cls._request("GET", url, read_timeout, breaker=breaker, **kwargs)
+
+
+class AsyncHttpClient:
+    """Per-host pooled httpx clients for async callers, scoped to a request"""
+
+    _clients = contextvars.ContextVar('async_http_clients', default=None)  # {host: AsyncClient}
+
+    @staticmethod
+    def _build_client() -> httpx.AsyncClient:
+        pool_size = getattr(settings, 'HTTP_POOL_SIZE', 32)
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        # The transport retries failed connects; 502/503 are retried in _request
+        transport = httpx.AsyncHTTPTransport(limits=limits, retries=getattr(settings, 'HTTP_RETRIES', 2))
+        return httpx.AsyncClient(transport=transport)
+
+    @classmethod
+    @asynccontextmanager
+    async def scope(cls):
+        """Share clients between the calls made inside (tasks included) and close them on exit"""
+        if cls._clients.get() is not None:  # nested: the outer scope owns the clients
+            yield
+            return
+
+        clients = {}
+        token = cls._clients.set(clients)
+        try:
+            yield
+        finally:
+            cls._clients.reset(token)
+            for client in clients.values():
+                await client.aclose()
+
+    @classmethod
+    @asynccontextmanager
+    async def client_for(cls, url: str):
+        """Yield the scope's client for the scheme and host of ``url``, or a one-off client"""
+        clients = cls._clients.get()
+        if clients is None:
+            async with cls._build_client() as client:
+                yield client
+            return
+
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = cls._build_client()
+        yield client
+
+    @classmethod
+    async def _request(cls, method: str, url: str, read_timeout: float, breaker: str = None, **kwargs) -> httpx.Response:
+        circuit = get_breaker(breaker) if breaker else None
+        ticket = circuit.allow() if circuit else None
+        if circuit and ticket is None:
+            raise AsyncCircuitOpenError(f"{breaker} is unavailable (circuit open)")
+
+        started = time.monotonic()
+        failed = True
+        try:
+            response = await cls._send(method, url, read_timeout, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            if circuit:
+                circuit.record(ticket, failed, time.monotonic() - started)
+
+    @classmethod
+    async def _send(cls, method: str, url: str, read_timeout: float, **kwargs) -> httpx.Response:
+        timeout = httpx.Timeout(read_timeout, connect=getattr(settings, 'HTTP_CONNECT_TIMEOUT', 5))
+        retries = getattr(settings, 'HTTP_RETRIES', 2)
+        backoff = getattr(settings, 'HTTP_RETRY_BACKOFF', 0.3)
+        jitter = getattr(settings, 'HTTP_RETRY_JITTER', 0.3)
+
+        async with cls.client_for(url) as client:
+            for attempt in range(retries + 1):
+                response = await client.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code not in (502, 503) or attempt == retries:
+                    return response
+                await response.aclose()
+                await asyncio.sleep(backoff * (2 ** attempt) + random.uniform(0, jitter))
+
+    @classmethod
+    async def post(cls, url: str, read_timeout: float = 30, breaker: str = None, **kwargs) -> httpx.Response:
+        return await cls._request("POST", url, read_timeout, breaker=breaker, **kwargs)
+
+    @classmethod
+    async def get(cls, url: str, read_timeout: float = 10, breaker: str = None, **kwargs) -> httpx.Response:
+        return await cls._request("GET", url, read_timeout, breaker=breaker, **kwargs)
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=HttpClient._reset_after_fork)
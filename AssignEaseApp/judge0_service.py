@@ -1,10 +1,27 @@
+import asyncio
+import httpx
 import requests
 import time
 from django.conf import settings
+from .checkers import cap_output, outputs_match
+from .execution_load import ExecutionLoad
+from .http_client import AsyncHttpClient, HttpClient
+from .language_registry import LanguageRegistry
 
 JUDGE0_BASE_URL = "https://tcase.assignease.io"
 
 class Judge0Service:
+    LANGUAGE_IDS = {
+        'python': 71,      # Python 3.8.1
+        'javascript': 63,  # JavaScript (Node.js 12.14.0)
+        'java': 62,        # Java (OpenJDK 13.0.1)
+        'cpp': 54,         # C++ (GCC 9.2.0)
+        'c': 50,           # C (GCC 9.2.0)
+        'csharp': 51,      # C# (Mono 6.6.0.161)
+        'php': 68,         # PHP (7.4.1)
+        'typescript': 74,  # TypeScript (3.7.4)
+    }
+
     @staticmethod
     def get_language_id(language_name_or_id):
         """Map language names to Judge0 language IDs, or return ID if already numeric"""
@@ -18,18 +35,19 @@ class Judge0Service:
         except (ValueError, TypeError):
             pass
         
-        # Otherwise, map language name to ID
-        language_map = {
-            'python': 71,      # Python 3.8.1
-            'javascript': 63,  # JavaScript (Node.js 12.14.0)
-            'java': 62,        # Java (OpenJDK 13.0.1)
-            'cpp': 54,         # C++ (GCC 9.2.0)
-            'c': 50,           # C (GCC 9.2.0)
-            'csharp': 51,      # C# (Mono 6.6.0.161)
-            'php': 68,         # PHP (7.4.1)
-            'typescript': 74,  # TypeScript (3.7.4)
-        }
-        return language_map.get(str(language_name_or_id).lower(), 71)
+        # Otherwise, map language name to ID: configured ProgrammingLanguage first, then the built-in map
+        configured = LanguageRegistry.judge0_language_id(language_name_or_id)
+        if configured:
+            return configured
+        return Judge0Service.LANGUAGE_IDS.get(str(language_name_or_id).lower(), 71)
+
+    @staticmethod
+    def supports_language(language_name) -> bool:
+        """True if get_language_id knows this language name (instead of defaulting to Python)"""
+        return (
+            str(language_name).lower() in Judge0Service.LANGUAGE_IDS
+            or LanguageRegistry.judge0_language_id(language_name) is not None
+        )
     
     @staticmethod
     def submit_code(source_code, language_id, stdin, expected_output, timeout=2, memory_limit=128000):
@@ -49,7 +67,7 @@ class Judge0Service:
         }
          
         try:
-            response = requests.post(url, json=payload, timeout=30)
+            response = HttpClient.post(url, json=payload, read_timeout=30, breaker='judge0')
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -61,50 +79,252 @@ class Judge0Service:
         url = f"{JUDGE0_BASE_URL}/submissions/{token}?base64_encoded=false"
         
         try:
-            response = requests.get(url, timeout=10)
+            response = HttpClient.get(url, read_timeout=10, breaker='judge0')
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             return {"error": str(e)}
     
+    @staticmethod
+    def _batch_payload(source_code, language_id, testcases):
+        return {
+            "submissions": [
+                {
+                    "source_code": source_code,
+                    "language_id": language_id,
+                    "stdin": tc.input_text,
+                    "cpu_time_limit": tc.timeout,
+                    "memory_limit": tc.memory_limit,
+                }
+                for tc in testcases
+            ]
+        }
+
+    @staticmethod
+    def _batch_tokens(created, count):
+        """Tokens from a /submissions/batch response; None where the submission was rejected"""
+        tokens = []
+        for i in range(count):
+            item = created[i] if i < len(created) else {}
+            tokens.append(item.get("token") if isinstance(item, dict) else None)
+        return tokens
+
+    @staticmethod
+    def _poll_url(tokens):
+        fields = "token,stdout,stderr,compile_output,status,time,memory"
+        return f"{JUDGE0_BASE_URL}/submissions/batch?tokens={','.join(tokens)}&base64_encoded=false&fields={fields}"
+
+    @staticmethod
+    def _collect_finished(tokens, submissions, results):
+        """Store finished submissions in ``results`` and return the tokens still queued"""
+        still_pending = []
+        for token, result in zip(tokens, submissions):
+            status_id = ((result or {}).get("status") or {}).get("id")
+            if status_id in (1, 2):  # In Queue / Processing
+                still_pending.append(token)
+            else:
+                results[token] = result
+        return still_pending
+
+    @staticmethod
+    def submit_batch(source_code, language_id, testcases):
+        """
+        Submit one submission per test case through /submissions/batch.
+
+        Returns:
+            List of tokens in test case order; None where the submission was rejected
+        """
+        if not isinstance(language_id, int):
+            language_id = Judge0Service.get_language_id(language_id)
+
+        url = f"{JUDGE0_BASE_URL}/submissions/batch?base64_encoded=false"
+        batch_size = getattr(settings, 'JUDGE0_BATCH_SIZE', 20)
+        tokens = []
+
+        for start in range(0, len(testcases), batch_size):
+            chunk = testcases[start:start + batch_size]
+            try:
+                response = HttpClient.post(url, json=Judge0Service._batch_payload(source_code, language_id, chunk), read_timeout=30, breaker='judge0')
+                response.raise_for_status()
+                created = response.json()
+            except (requests.exceptions.RequestException, ValueError):
+                created = []
+            tokens.extend(Judge0Service._batch_tokens(created, len(chunk)))
+
+        return tokens
+
+    @staticmethod
+    async def asubmit_batch(source_code, language_id, testcases):
+        """Async form of submit_batch"""
+        if not isinstance(language_id, int):
+            language_id = Judge0Service.get_language_id(language_id)
+
+        url = f"{JUDGE0_BASE_URL}/submissions/batch?base64_encoded=false"
+        batch_size = getattr(settings, 'JUDGE0_BATCH_SIZE', 20)
+        tokens = []
+
+        for start in range(0, len(testcases), batch_size):
+            chunk = testcases[start:start + batch_size]
+            try:
+                response = await AsyncHttpClient.post(url, json=Judge0Service._batch_payload(source_code, language_id, chunk), read_timeout=30, breaker='judge0')
+                response.raise_for_status()
+                created = response.json()
+            except (httpx.HTTPError, ValueError):
+                created = []
+            tokens.extend(Judge0Service._batch_tokens(created, len(chunk)))
+
+        return tokens
+
+    @staticmethod
+    def poll_batch(tokens):
+        """
+        Poll /submissions/batch until every token has finished (status > 2)
+        or JUDGE0_POLL_TIMEOUT seconds pass. The poll interval starts short
+        and backs off while results are still queued.
+
+        Returns:
+            Dict mapping token -> submission result (an {"error": ...} dict if unfinished)
+        """
+        pending = [t for t in tokens if t]
+        results = {}
+        batch_size = getattr(settings, 'JUDGE0_BATCH_SIZE', 20)
+        delay = getattr(settings, 'JUDGE0_POLL_INITIAL_DELAY', 0.2)
+        max_delay = getattr(settings, 'JUDGE0_POLL_MAX_DELAY', 2.0)
+        deadline = time.monotonic() + getattr(settings, 'JUDGE0_POLL_TIMEOUT', 60)
+
+        while pending and time.monotonic() < deadline:
+            time.sleep(delay)
+            still_pending = []
+
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                try:
+                    response = HttpClient.get(Judge0Service._poll_url(chunk), read_timeout=10, breaker='judge0')
+                    response.raise_for_status()
+                    submissions = response.json().get("submissions") or []
+                except (requests.exceptions.RequestException, ValueError):
+                    still_pending.extend(chunk)
+                    continue
+                still_pending.extend(Judge0Service._collect_finished(chunk, submissions, results))
+
+            # Back off while nothing is finishing, poll quickly while results arrive
+            if len(still_pending) == len(pending):
+                delay = min(delay * 1.5, max_delay)
+            pending = still_pending
+
+        for token in pending:
+            results[token] = {"error": "Timed out waiting for Judge0 result", "token": token}
+
+        return results
+
+    @staticmethod
+    async def apoll_batch(tokens):
+        """Async form of poll_batch"""
+        pending = [t for t in tokens if t]
+        results = {}
+        batch_size = getattr(settings, 'JUDGE0_BATCH_SIZE', 20)
+        delay = getattr(settings, 'JUDGE0_POLL_INITIAL_DELAY', 0.2)
+        max_delay = getattr(settings, 'JUDGE0_POLL_MAX_DELAY', 2.0)
+        deadline = time.monotonic() + getattr(settings, 'JUDGE0_POLL_TIMEOUT', 60)
+
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            still_pending = []
+
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                try:
+                    response = await AsyncHttpClient.get(Judge0Service._poll_url(chunk), read_timeout=10, breaker='judge0')
+                    response.raise_for_status()
+                    submissions = response.json().get("submissions") or []
+                except (httpx.HTTPError, ValueError):
+                    still_pending.extend(chunk)
+                    continue
+                still_pending.extend(Judge0Service._collect_finished(chunk, submissions, results))
+
+            if len(still_pending) == len(pending):
+                delay = min(delay * 1.5, max_delay)
+            pending = still_pending
+
+        for token in pending:
+            results[token] = {"error": "Timed out waiting for Judge0 result", "token": token}
+
+        return results
+
+    @staticmethod
+    def _evaluated(testcases, tokens, results):
+        evaluated = []
+        for tc, token in zip(testcases, tokens):
+            if token is None:
+                result = {"error": "Judge0 rejected the submission"}
+            else:
+                result = dict(results.get(token) or {}, token=token)
+            evaluated.append(Judge0Service._interpret_result(result, tc))
+        return evaluated
+
+    @staticmethod
+    def evaluate_testcases(source_code, language_id, testcases):
+        """Evaluate several test cases with one batch submission and batched polling"""
+        testcases = list(testcases)
+        with ExecutionLoad.track(len(testcases)):
+            tokens = Judge0Service.submit_batch(source_code, language_id, testcases)
+            results = Judge0Service.poll_batch(tokens)
+        return Judge0Service._evaluated(testcases, tokens, results)
+
+    @staticmethod
+    async def aevaluate_testcases(source_code, language_id, testcases):
+        """Async form of evaluate_testcases"""
+        testcases = list(testcases)
+        with ExecutionLoad.track(len(testcases)):
+            tokens = await Judge0Service.asubmit_batch(source_code, language_id, testcases)
+            results = await Judge0Service.apoll_batch(tokens)
+        return Judge0Service._evaluated(testcases, tokens, results)
+
     @staticmethod
     def evaluate_testcase(source_code, language_id, testcase):
         """Evaluate a single test case"""
-        result = Judge0Service.submit_code(
-            source_code=source_code,
-            language_id=language_id,
-            stdin=testcase.input,
-            expected_output=testcase.expected_output,
-            timeout=testcase.timeout,
-            memory_limit=testcase.memory_limit
-        )
-        
+        with ExecutionLoad.track():
+            result = Judge0Service.submit_code(
+                source_code=source_code,
+                language_id=language_id,
+                stdin=testcase.input_text,
+                expected_output=testcase.expected_output_text,
+                timeout=testcase.timeout,
+                memory_limit=testcase.memory_limit
+            )
+        return Judge0Service._interpret_result(result, testcase)
+
+    @staticmethod
+    def _interpret_result(result, testcase):
+        """Turn a Judge0 submission result into a pass/fail test case result"""
         if "error" in result:
             return {
                 "status": "error",
                 "error_message": result["error"],
                 "passed": False,
-                "actual_output": ""
+                "actual_output": "",
+                "judge0_token": result.get("token"),
             }
-        
-        status_id = result.get("status", {}).get("id")
-        status_desc = result.get("status", {}).get("description", "Unknown")
+
+        status = result.get("status") or {}
+        status_id = status.get("id")
+        status_desc = status.get("description", "Unknown")
         stdout = result.get("stdout", "")
         stderr = result.get("stderr", "")
         compile_output = result.get("compile_output", "")
         
-        # Trim outputs for comparison
-        actual_output_trimmed = stdout.strip() if stdout else ""
-        expected_output_trimmed = testcase.expected_output.strip() if testcase.expected_output else ""
+        stdout, truncated = cap_output(stdout)
         
         # Status IDs: 3=Accepted, 4=Wrong Answer, 5=Time Limit Exceeded, 6=Compilation Error, etc.
-        # Mark as passed only if status is Accepted AND outputs match
-        passed = (status_id == 3) and (actual_output_trimmed == expected_output_trimmed)
+        # Mark as passed only if status is Accepted AND outputs match (test case's checker)
+        passed = (status_id == 3) and not truncated and outputs_match(testcase, stdout)
         
         # Build meaningful error message
         error_message = ""
         if stderr:
             error_message = stderr
+        elif truncated:
+            error_message = "Output limit exceeded"
         elif compile_output:
             error_message = compile_output
         elif status_id != 3:
@@ -117,5 +337,6 @@ class Judge0Service:
             "execution_time": result.get("time"),
             "memory_used": result.get("memory"),
             "error_message": error_message,
+            "compile_error": status_id == 6,
             "judge0_token": result.get("token")
         }
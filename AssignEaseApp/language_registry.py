@@ -0,0 +1,82 @@
+"""
+In-process index of ProgrammingLanguage rows.
+
+Grading resolves ``assignment.language`` (a display, Piston or language name)
+to the Piston name/version and Judge0 id on every evaluation. The registry
+loads all rows once, indexes them by normalised name and answers lookups
+from memory. signals.py invalidates it whenever a ProgrammingLanguage is
+saved or deleted; LANGUAGE_REGISTRY_TTL bounds how long other processes
+keep a stale copy.
+"""
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
+
+ResolvedLanguage = namedtuple('ResolvedLanguage', ['piston_language', 'piston_version', 'judge0_language_id'])
+
+
+def _normalise(name) -> str:
+    return str(name or "").strip().lower()
+
+
+class LanguageRegistry:
+    _lock = threading.Lock()
+    # (index, judge0_ids, loaded_at), replaced as a whole so readers never see
+    # a half-updated or dropped copy:
+    #   index: normalised name -> ResolvedLanguage
+    #   judge0_ids: normalised name -> Judge0 language id
+    _tables = None
+
+    @classmethod
+    def _load(cls):
+        from .models import ProgrammingLanguage
+
+        index = {}
+        judge0_ids = {}
+        rows = ProgrammingLanguage.objects.order_by('display_name', 'id').values_list(
+            'display_name', 'piston_name', 'language_name', 'piston_version',
+            'judge0_language_id', 'judge0_language_name',
+        )
+        for display_name, piston_name, language_name, piston_version, judge0_id, judge0_name in rows:
+            resolved = ResolvedLanguage(piston_name or language_name or display_name, piston_version or "", judge0_id)
+            # Same precedence as the old query's .first(): earliest display_name wins
+            for name in (piston_name, display_name, language_name):
+                if name:
+                    index.setdefault(_normalise(name), resolved)
+            if judge0_id:
+                for name in (piston_name, display_name, language_name, judge0_name):
+                    if name:
+                        judge0_ids.setdefault(_normalise(name), judge0_id)
+
+        return index, judge0_ids, time.monotonic()
+
+    @classmethod
+    def _ensure_loaded(cls):
+        """Current (index, judge0_ids, loaded_at), loading them if missing or expired"""
+        ttl = getattr(settings, 'LANGUAGE_REGISTRY_TTL', 300)
+        tables = cls._tables
+        if tables is None or (ttl and time.monotonic() - tables[2] > ttl):
+            with cls._lock:
+                tables = cls._tables
+                if tables is None or (ttl and time.monotonic() - tables[2] > ttl):
+                    tables = cls._tables = cls._load()
+        return tables
+
+    @classmethod
+    def resolve(cls, name):
+        """ResolvedLanguage for a display, Piston or language name (case-insensitive), or None"""
+        index, _, _ = cls._ensure_loaded()
+        return index.get(_normalise(name))
+
+    @classmethod
+    def judge0_language_id(cls, name):
+        """Judge0 id configured on a ProgrammingLanguage with this name, or None"""
+        _, judge0_ids, _ = cls._ensure_loaded()
+        return judge0_ids.get(_normalise(name))
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the index; the next lookup reloads it"""
+        with cls._lock:
+            cls._tables = None
@@ -1,7 +1,7 @@
-import requests
 import json
 import re
 import time
+from .http_client import AsyncHttpClient, HttpClient
 
 
 OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
@@ -81,7 +81,7 @@ def call_qwen(question: str, answer: str, retries: int = 1) -> dict:
 
     for attempt in range(retries + 1):
         try:
-            res = requests.post(OLLAMA_URL, json=payload, timeout=180)
+            res = HttpClient.post(OLLAMA_URL, json=payload, read_timeout=180, breaker='ollama')
 
             if res.status_code != 200:
                 raise AIGradingError(f"Ollama HTTP {res.status_code}: {res.text}")
@@ -155,20 +155,7 @@ def normalize_ai_result(result: dict) -> dict:
     return result
 
 
-def generate_database_assignment(questions_list: list) -> dict:
-    """
-    Generate database schema and questions from natural language descriptions using AI.
-    
-    Args:
-        questions_list: List of question descriptions in natural language
-        
-    Returns:
-        dict with keys:
-        - schema_sql: CREATE TABLE statements
-        - sample_data_sql: INSERT statements
-        - questions: List of generated questions with expected results
-    """
-
+def _database_assignment_payload(questions_list: list) -> dict:
     # Create simple, direct prompt
     q_list = "\n".join([f"- {q}" for q in questions_list])
     
@@ -195,139 +182,175 @@ All SQL must work in SQLite. Return ONLY JSON, no explanation."""
         },
     }
 
-    try:
-        res = requests.post(OLLAMA_URL, json=payload, timeout=120)
+    return payload
 
-        if res.status_code != 200:
-            raise AIGradingError(f"Ollama HTTP {res.status_code}: {res.text[:200]}")
 
-        data = res.json()
+def _parse_database_assignment(res) -> dict:
+    """Extract and validate the assignment JSON from an Ollama response (requests or httpx)"""
+    if res.status_code != 200:
+        raise AIGradingError(f"Ollama HTTP {res.status_code}: {res.text[:200]}")
 
-        if "error" in data:
-            raise AIGradingError(f"Ollama error: {data['error']}")
+    data = res.json()
 
-        raw = data.get("response", "").strip()
+    if "error" in data:
+        raise AIGradingError(f"Ollama error: {data['error']}")
 
-        if not raw:
-            raise AIGradingError("AI returned empty response")
+    raw = data.get("response", "").strip()
 
-        # Find the first { and try to parse from there
-        start_idx = raw.find('{')
-        if start_idx == -1:
-            raise AIGradingError(f"No JSON found. Response starts with: {raw[:100]}")
+    if not raw:
+        raise AIGradingError("AI returned empty response")
 
-        # Extract from first { to the end, but try to parse valid JSON
-        remaining = raw[start_idx:]
-        result = None
-        best_result = None
-        best_keys = 0
-        last_error = None
-        
-        # Try to parse by finding matching closing brace
-        # Prepare field mappings for normalization
-        field_mappings = {
-            "schemas_sql": "schema_sql",      # Handle plural typo
-            "schema": "schema_sql",            # Handle shorthand
-            "ddl": "schema_sql",               # Handle alternate naming
-            "sample_data": "sample_data_sql",  # Handle shorthand
-            "test_data": "sample_data_sql",    # Handle alternate naming
-            "data_sql": "sample_data_sql",     # Handle alternate naming
-            "question": "questions",           # Handle singular typo
-            "question_list": "questions",      # Handle alternate naming
-        }
-
-        brace_count = 0
-        for i, char in enumerate(remaining):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    # Found matching brace, try to parse
-                    json_str = remaining[:i+1]
-                    try:
-                        candidate = json.loads(json_str)
-                        
-                        # Normalize field names immediately after parsing
-                        for old_key, new_key in field_mappings.items():
-                            if old_key in candidate and new_key not in candidate:
-                                candidate[new_key] = candidate.pop(old_key)
-                        
-                        # Count how many required keys it has
-                        keys_found = sum(1 for k in ["schema_sql", "sample_data_sql", "questions"] if k in candidate)
-                        if keys_found > best_keys:
-                            best_keys = keys_found
-                            best_result = candidate
-                        if keys_found == 3:  # All required keys found
-                            result = candidate
-                            break
-                    except json.JSONDecodeError as e:
-                        last_error = f"Parse failed at char {i}: {str(e)[:50]}"
-                        continue
-
-        if not result and best_result:
-            # Use the best partial result, but warn about it
-            result = best_result
-            missing = [k for k in ["schema_sql", "sample_data_sql", "questions"] if k not in result]
-            raise AIGradingError(f"Incomplete response - missing: {missing}. Found {list(result.keys())}")
+    # Find the first { and try to parse from there
+    start_idx = raw.find('{')
+    if start_idx == -1:
+        raise AIGradingError(f"No JSON found. Response starts with: {raw[:100]}")
 
-        if not result:
-            # Try to repair incomplete JSON
-            attempt_repair = remaining.rstrip()
-            
-            # If response ends with an unclosed string, close it
-            in_string = False
-            escape_next = False
-            last_quote_pos = -1
-            
-            for i, char in enumerate(attempt_repair):
-                if escape_next:
-                    escape_next = False
-                    continue
-                if char == '\\':
-                    escape_next = True
-                    continue
-                if char == '"':
-                    in_string = not in_string
-                    last_quote_pos = i
-            
-            # If we ended while in a string, close it
-            if in_string:
-                attempt_repair += '"'
-            
-            # Now add missing closing braces and brackets
-            open_braces = attempt_repair.count('{') - attempt_repair.count('}')
-            open_brackets = attempt_repair.count('[') - attempt_repair.count(']')
-            
-            if open_braces > 0 or open_brackets > 0:
-                repair_str = ']' * open_brackets + '}' * open_braces
-                attempt_repair += repair_str
-                
+    # Extract from first { to the end, but try to parse valid JSON
+    remaining = raw[start_idx:]
+    result = None
+    best_result = None
+    best_keys = 0
+    last_error = None
+    
+    # Try to parse by finding matching closing brace
+    # Prepare field mappings for normalization
+    field_mappings = {
+        "schemas_sql": "schema_sql",      # Handle plural typo
+        "schema": "schema_sql",            # Handle shorthand
+        "ddl": "schema_sql",               # Handle alternate naming
+        "sample_data": "sample_data_sql",  # Handle shorthand
+        "test_data": "sample_data_sql",    # Handle alternate naming
+        "data_sql": "sample_data_sql",     # Handle alternate naming
+        "question": "questions",           # Handle singular typo
+        "question_list": "questions",      # Handle alternate naming
+    }
+
+    brace_count = 0
+    for i, char in enumerate(remaining):
+        if char == '{':
+            brace_count += 1
+        elif char == '}':
+            brace_count -= 1
+            if brace_count == 0:
+                # Found matching brace, try to parse
+                json_str = remaining[:i+1]
                 try:
-                    result = json.loads(attempt_repair)
+                    candidate = json.loads(json_str)
                     
-                    # Normalize field names
+                    # Normalize field names immediately after parsing
                     for old_key, new_key in field_mappings.items():
-                        if old_key in result and new_key not in result:
-                            result[new_key] = result.pop(old_key)
+                        if old_key in candidate and new_key not in candidate:
+                            candidate[new_key] = candidate.pop(old_key)
                     
-                except json.JSONDecodeError:
-                    pass  # Fall through to error below
+                    # Count how many required keys it has
+                    keys_found = sum(1 for k in ["schema_sql", "sample_data_sql", "questions"] if k in candidate)
+                    if keys_found > best_keys:
+                        best_keys = keys_found
+                        best_result = candidate
+                    if keys_found == 3:  # All required keys found
+                        result = candidate
+                        break
+                except json.JSONDecodeError as e:
+                    last_error = f"Parse failed at char {i}: {str(e)[:50]}"
+                    continue
+
+    if not result and best_result:
+        # Use the best partial result, but warn about it
+        result = best_result
+        missing = [k for k in ["schema_sql", "sample_data_sql", "questions"] if k not in result]
+        raise AIGradingError(f"Incomplete response - missing: {missing}. Found {list(result.keys())}")
+
+    if not result:
+        # Try to repair incomplete JSON
+        attempt_repair = remaining.rstrip()
+        
+        # If response ends with an unclosed string, close it
+        in_string = False
+        escape_next = False
+        last_quote_pos = -1
+        
+        for i, char in enumerate(attempt_repair):
+            if escape_next:
+                escape_next = False
+                continue
+            if char == '\\':
+                escape_next = True
+                continue
+            if char == '"':
+                in_string = not in_string
+                last_quote_pos = i
+        
+        # If we ended while in a string, close it
+        if in_string:
+            attempt_repair += '"'
+        
+        # Now add missing closing braces and brackets
+        open_braces = attempt_repair.count('{') - attempt_repair.count('}')
+        open_brackets = attempt_repair.count('[') - attempt_repair.count(']')
+        
+        if open_braces > 0 or open_brackets > 0:
+            repair_str = ']' * open_brackets + '}' * open_braces
+            attempt_repair += repair_str
             
-            if not result:
-                raise AIGradingError(f"Could not parse JSON. Response too short or malformed. Response chars 0-300: {remaining[:300]}")
+            try:
+                result = json.loads(attempt_repair)
+                
+                # Normalize field names
+                for old_key, new_key in field_mappings.items():
+                    if old_key in result and new_key not in result:
+                        result[new_key] = result.pop(old_key)
+                
+            except json.JSONDecodeError:
+                pass  # Fall through to error below
+        
+        if not result:
+            raise AIGradingError(f"Could not parse JSON. Response too short or malformed. Response chars 0-300: {remaining[:300]}")
+
 
 
+    # Validate result structure (normalization already happened above)
+    if not all(key in result for key in ["schema_sql", "sample_data_sql", "questions"]):
+        missing = [k for k in ["schema_sql", "sample_data_sql", "questions"] if k not in result]
+        raise AIGradingError(f"Missing keys: {missing}. Has: {list(result.keys())}")
 
-        # Validate result structure (normalization already happened above)
-        if not all(key in result for key in ["schema_sql", "sample_data_sql", "questions"]):
-            missing = [k for k in ["schema_sql", "sample_data_sql", "questions"] if k not in result]
-            raise AIGradingError(f"Missing keys: {missing}. Has: {list(result.keys())}")
+    if not isinstance(result.get("questions"), list) or len(result["questions"]) == 0:
+        raise AIGradingError("Questions not a non-empty list")
+
+    return result
 
-        if not isinstance(result.get("questions"), list) or len(result["questions"]) == 0:
-            raise AIGradingError("Questions not a non-empty list")
 
-        return result
+def generate_database_assignment(questions_list: list) -> dict:
+    """
+    Generate database schema and questions from natural language descriptions using AI.
+    
+    Args:
+        questions_list: List of question descriptions in natural language
+        
+    Returns:
+        dict with keys:
+        - schema_sql: CREATE TABLE statements
+        - sample_data_sql: INSERT statements
+        - questions: List of generated questions with expected results
+    """
+    payload = _database_assignment_payload(questions_list)
+
+    try:
+        res = HttpClient.post(OLLAMA_URL, json=payload, read_timeout=120, breaker='ollama')
+        return _parse_database_assignment(res)
+
+    except json.JSONDecodeError as e:
+        raise AIGradingError(f"JSON parse error: {str(e)}")
+    except Exception as e:
+        raise AIGradingError(f"Database assignment generation failed: {str(e)}") from e
+
+
+async def agenerate_database_assignment(questions_list: list) -> dict:
+    """Async form of generate_database_assignment, for the async views"""
+    payload = _database_assignment_payload(questions_list)
+
+    try:
+        res = await AsyncHttpClient.post(OLLAMA_URL, json=payload, read_timeout=120, breaker='ollama')
+        return _parse_database_assignment(res)
 
     except json.JSONDecodeError as e:
         raise AIGradingError(f"JSON parse error: {str(e)}")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from AssignEaseApp.telemetry import PERCENTILES, TIMINGS, execution_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Report p50/p95/p99 wall time, backend round trip, queue wait, run time "
+        "and memory of graded test case executions, per language and backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=7, help="Only executions from the last N days (default 7).")
+        parser.add_argument("--assignment", type=int, help="Only executions for this assignment id.")
+
+    def _format(self, timing, value):
+        if value is None:
+            return "-"
+        if timing == "memory_used":
+            return f"{value}KB"
+        return f"{value * 1000:.0f}ms"
+
+    def handle(self, *args, **options):
+        groups = execution_stats(days=options["days"], assignment_id=options["assignment"])
+        if not groups:
+            self.stdout.write("No executions recorded in this period.")
+            return
+
+        for group in groups:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{group['language'] or '?'} on {group['backend']}: {group['executions']} execution(s), "
+                f"{group['cache_hit_rate']:.0%} cache hits, {group['bytes_in']}B in / {group['bytes_out']}B out"
+            ))
+            for timing in TIMINGS:
+                values = " ".join(
+                    f"p{pct}={self._format(timing, group[timing][f'p{pct}'])}" for pct in PERCENTILES
+                )
+                self.stdout.write(f"  {timing:<15}{values}")
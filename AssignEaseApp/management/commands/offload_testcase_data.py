@@ -0,0 +1,32 @@
+from django.db.models import Q
+from django.db.models.functions import Length
+from django.core.management.base import BaseCommand
+
+from AssignEaseApp.blob_storage import BlobStore
+from AssignEaseApp.models import CodingTestCase, TestCase
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing test case inputs/expected outputs larger than "
+        "TESTCASE_BLOB_THRESHOLD into blob storage."
+    )
+
+    def handle(self, *args, **options):
+        # A UTF-8 character is at most 4 bytes, so shorter values cannot be over
+        # the threshold; save() then checks the exact byte size of the candidates
+        min_chars = BlobStore.threshold() // 4
+        for model in (TestCase, CodingTestCase):
+            offloaded = 0
+            candidates = Q()
+            for field in model.TEST_DATA_FIELDS:
+                candidates |= Q(**{f"{field}_blob__isnull": True, f"{field}_length__gt": min_chars})
+            rows = model.objects.annotate(
+                **{f"{field}_length": Length(field) for field in model.TEST_DATA_FIELDS}
+            ).filter(candidates)
+            for testcase in rows.iterator(chunk_size=100):
+                blobs = (testcase.input_blob, testcase.expected_output_blob)
+                testcase.save(update_fields=list(model.TEST_DATA_FIELDS))
+                if (testcase.input_blob, testcase.expected_output_blob) != blobs:
+                    offloaded += 1
+            self.stdout.write(f"{model.__name__}: {offloaded} row(s) moved to blob storage")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from AssignEaseApp.grading_worker import recover_stale_jobs, stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-queue grading jobs left queued or running by a restarted process "
+        "(no progress for GRADING_JOB_STALE_SECONDS), or fail them after "
+        "GRADING_JOB_MAX_ATTEMPTS re-queues. Run it after a deploy or from cron; "
+        "re-queued jobs are graded before the command exits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only list the stale jobs.")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            for job in stale_jobs():
+                self.stdout.write(f"{job.id} submission={job.submission_id} status={job.status} attempts={job.attempts}")
+            return
+
+        counts = recover_stale_jobs()
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-queued {counts['requeued']} job(s), failed {counts['failed']} job(s)."
+        ))
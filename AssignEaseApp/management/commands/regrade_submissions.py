@@ -0,0 +1,100 @@
+"""
+Regrade every coding submission of a question, assignment or class.
+Usage: python manage.py regrade_submissions (--question ID | --assignment ID | --class ID) [--workers N] [--force]
+
+Submissions are graded in parallel worker processes. Results whose code and
+test case are unchanged (same grading hash) are kept, so re-running the
+command after an interruption only grades what is left.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def _init_worker():
+    # Forked workers inherit the configured app registry; spawned ones do not
+    if not apps.ready:
+        django.setup()
+
+
+class Command(BaseCommand):
+    help = "Regrade all coding submissions of a question, assignment or class"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--question", type=int, help="AssignmentQuestion id")
+        parser.add_argument("--assignment", type=int, help="Assignment id")
+        parser.add_argument("--class", dest="class_id", type=int, help="Class id")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="Number of worker processes (default: min(4, CPU count))",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-run every test case, even ones whose code and test case are unchanged.",
+        )
+
+    def handle(self, *args, **options):
+        # Imported here so spawned workers can load this module before django.setup()
+        from AssignEaseApp.grading_worker import regrade_submission, submissions_to_regrade
+
+        if not (options["question"] or options["assignment"] or options["class_id"]):
+            raise CommandError("Pass at least one of --question, --assignment or --class")
+
+        submission_ids = list(submissions_to_regrade(
+            question_id=options["question"],
+            assignment_id=options["assignment"],
+            class_id=options["class_id"],
+        ).values_list("id", flat=True))
+
+        total = len(submission_ids)
+        if total == 0:
+            self.stdout.write(self.style.WARNING("No submissions with test cases match."))
+            return
+
+        workers = max(1, options["workers"])
+        reuse_results = not options["force"]
+        self.stdout.write(f"Regrading {total} submission(s) with {workers} worker(s)...")
+
+        # Worker processes must open their own database connections
+        connections.close_all()
+
+        done = 0
+        failed = 0
+        executed = 0
+        reused = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(regrade_submission, submission_id, reuse_results): submission_id
+                for submission_id in submission_ids
+            }
+            for future in as_completed(futures):
+                submission_id = futures[future]
+                done += 1
+                try:
+                    summary = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"[{done}/{total}] submission {submission_id}: {exc}"))
+                    continue
+
+                reused += summary["reused_testcases"]
+                executed += summary["total_testcases"] - summary["reused_testcases"] - summary["skipped_testcases"]
+                self.stdout.write(
+                    f"[{done}/{total}] submission {submission_id}: "
+                    f"{summary['passed_testcases']}/{summary['total_testcases']} passed, "
+                    f"{summary['reused_testcases']} unchanged, {summary['auto_marks']:.2f} marks"
+                )
+
+        self.stdout.write("")
+        message = f"Regraded {total - failed}/{total} submission(s): {executed} test case run(s), {reused} unchanged."
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{message} {failed} failed; re-run to retry them."))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
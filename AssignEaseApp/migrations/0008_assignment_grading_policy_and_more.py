@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-17 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0007_gradingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='grading_policy',
+            field=models.CharField(choices=[('run_all', 'Run All Test Cases'), ('stop_on_compile_error', 'Stop On Compile Error'), ('stop_after_failures', 'Stop After Consecutive Failures')], default='run_all', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='max_consecutive_failures',
+            field=models.PositiveIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='assignmentquestion',
+            name='grading_policy',
+            field=models.CharField(blank=True, choices=[('run_all', 'Run All Test Cases'), ('stop_on_compile_error', 'Stop On Compile Error'), ('stop_after_failures', 'Stop After Consecutive Failures')], default='', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='assignmentquestion',
+            name='max_consecutive_failures',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0008_assignment_grading_policy_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='grading_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0009_testcaseresult_grading_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='checker',
+            field=models.CharField(choices=[('exact', 'Exact match'), ('whitespace', 'Ignore whitespace differences'), ('tokens', 'Token by token'), ('float', 'Numbers within tolerance'), ('unordered', 'Lines in any order')], default='exact', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='float_tolerance',
+            field=models.FloatField(default=1e-06),
+        ),
+    ]
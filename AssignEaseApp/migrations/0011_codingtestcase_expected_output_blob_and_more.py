@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0010_testcase_checker_testcase_float_tolerance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codingtestcase',
+            name='expected_output_blob',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='codingtestcase',
+            name='expected_output_size',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='codingtestcase',
+            name='input_blob',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='codingtestcase',
+            name='input_size',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='expected_output_blob',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='expected_output_size',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='input_blob',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='input_size',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0011_codingtestcase_expected_output_blob_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='backend',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='backend_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='bytes_in',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='bytes_out',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='cache_hit',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='queue_wait',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='wall_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
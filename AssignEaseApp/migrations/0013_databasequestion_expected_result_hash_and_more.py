@@ -0,0 +1,55 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:15
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+# Frozen copy of DatabaseService.prepare_expected as of this migration (the
+# first hash format), so later changes to the live code cannot alter it.
+def _normalize_result(result):
+    normalized = []
+    for row in result or []:
+        normalized.append({key: None if value is None else str(value).strip() for key, value in row.items()})
+    try:
+        normalized.sort(key=lambda x: tuple(str(v) if v is not None else '' for v in x.values()))
+    except Exception:
+        pass
+    return normalized
+
+
+def _prepare_expected(expected):
+    normalized = _normalize_result(expected)
+    payload = json.dumps(normalized, sort_keys=True, separators=(',', ':'), default=str)
+    return normalized, hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def prepare_expected_results(apps, schema_editor):
+    DatabaseQuestion = apps.get_model('AssignEaseApp', 'DatabaseQuestion')
+    for question in DatabaseQuestion.objects.only('id', 'expected_result').iterator():
+        normalized, digest = _prepare_expected(question.expected_result)
+        DatabaseQuestion.objects.filter(pk=question.pk).update(
+            expected_result_normalized=normalized, expected_result_hash=digest
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0012_testcaseresult_backend_testcaseresult_backend_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databasequestion',
+            name='expected_result_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='databasequestion',
+            name='expected_result_normalized',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(prepare_expected_results, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:16
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# Frozen copy of DatabaseService.prepare_expected / result_compare as of this
+# migration (hash format "v2"), so later changes to the live code cannot alter it.
+def _canonical(result):
+    result = result or []
+    columns = sorted(result[0].keys()) if result else []
+    rows = [
+        [None if row.get(col) is None else str(row.get(col)).strip() for col in columns]
+        for row in result
+    ]
+    return {"columns": columns, "rows": rows}
+
+
+def _row_bytes(row):
+    return b"\x1f".join(b"\x00" if value is None else value.encode('utf-8') for value in row)
+
+
+def _result_hash(canon, order_sensitive):
+    header = b"\x1f".join(col.encode('utf-8') for col in canon["columns"])
+    if order_sensitive:
+        digest = hashlib.sha256(header)
+        for row in canon["rows"]:
+            digest.update(b"\x1e")
+            digest.update(_row_bytes(row))
+        body = digest.hexdigest()
+    else:
+        total = 0
+        for row in canon["rows"]:
+            total += int.from_bytes(hashlib.blake2b(_row_bytes(row), digest_size=32).digest(), 'big')
+        body = f"{total % (1 << 256):064x}"
+    mode = "ordered" if order_sensitive else "multiset"
+    return f"v2:{mode}:{hashlib.sha256(header).hexdigest()[:16]}:{len(canon['rows'])}:{body}"
+
+
+def rehash_expected_results(apps, schema_editor):
+    DatabaseQuestion = apps.get_model('AssignEaseApp', 'DatabaseQuestion')
+    for question in DatabaseQuestion.objects.only('id', 'expected_result', 'order_sensitive').iterator():
+        normalized = _canonical(question.expected_result)
+        digest = _result_hash(normalized, question.order_sensitive)
+        DatabaseQuestion.objects.filter(pk=question.pk).update(
+            expected_result_normalized=normalized, expected_result_hash=digest
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0013_databasequestion_expected_result_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databasequestion',
+            name='order_sensitive',
+            field=models.BooleanField(default=False, help_text='Rows must come back in the expected order (the query has an ORDER BY)'),
+        ),
+        # v2 hashes ("v2:<mode>:<columns>:<rows>:<digest>") are longer than the
+        # plain sha256 the column was sized for
+        migrations.AlterField(
+            model_name='databasequestion',
+            name='expected_result_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=128),
+        ),
+        migrations.RunPython(rehash_expected_results, migrations.RunPython.noop),
+    ]
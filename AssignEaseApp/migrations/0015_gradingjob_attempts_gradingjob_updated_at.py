@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AssignEaseApp', '0014_databasequestion_order_sensitive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradingjob',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Times the job was re-queued after its worker went away'),
+        ),
+        migrations.AddField(
+            model_name='gradingjob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
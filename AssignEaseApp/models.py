@@ -5,6 +5,10 @@ from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
 import os
 import uuid
+from django.conf import settings
+from .blob_storage import BlobStore
+from .checkers import CHECKER_CHOICES
+from .database_service import DatabaseService
 
 def validate_file_size(file):
     max_mb = 10  # default per-assignment can override via Assignment.max_file_size_mb if implemented in views
@@ -105,6 +109,12 @@ class Assignment(models.Model):
         ('files_only', 'Files Only'),
         ('text_and_files', 'Text and Files'),
     ]
+
+    GRADING_POLICY_CHOICES = [
+        ('run_all', 'Run All Test Cases'),
+        ('stop_on_compile_error', 'Stop On Compile Error'),
+        ('stop_after_failures', 'Stop After Consecutive Failures'),
+    ]
     
     class_assigned = models.ForeignKey(Class, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -129,6 +139,14 @@ class Assignment(models.Model):
     allowed_file_formats = models.JSONField(default=list, blank=True)
     max_file_size_mb = models.PositiveIntegerField(default=10)
     max_files_per_submission = models.PositiveIntegerField(default=5)
+
+    # How test cases are run when grading a coding submission
+    grading_policy = models.CharField(
+        max_length=30,
+        choices=GRADING_POLICY_CHOICES,
+        default='run_all'
+    )
+    max_consecutive_failures = models.PositiveIntegerField(default=3)  # for 'stop_after_failures'
     
     def __str__(self):
         return self.title 
@@ -141,6 +159,14 @@ class AssignmentQuestion(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
     title = models.TextField()
     total_marks = models.FloatField(default=10.0)  # Total marks for this question
+    # Per-question overrides of the assignment's grading policy (blank/null = inherit)
+    grading_policy = models.CharField(
+        max_length=30,
+        choices=Assignment.GRADING_POLICY_CHOICES,
+        blank=True,
+        default=''
+    )
+    max_consecutive_failures = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -288,7 +314,90 @@ class NonCodingSubmissionFile(models.Model):
     def __str__(self):
         return f"File for NonCodingSubmission {self.submission.id} ({os.path.basename(self.file.name)})"
 
-class TestCase(models.Model):
+class TestDataBlobs(models.Model):
+    """
+    Moves large ``input`` / ``expected_output`` values into blob storage.
+
+    On save, a value over TESTCASE_BLOB_THRESHOLD bytes is stored in BlobStore
+    and the column keeps only its first TESTCASE_BLOB_PREVIEW_CHARS characters,
+    so listings never load the full data. Code that needs the real data
+    (execution, comparison) reads ``input_text`` / ``expected_output_text``,
+    which load the blob lazily. Writing new content to ``input`` or
+    ``expected_output`` replaces the blob on the next save.
+    """
+    TEST_DATA_FIELDS = ('input', 'expected_output')
+
+    input_blob = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    input_size = models.IntegerField(default=0, editable=False)
+    expected_output_blob = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    expected_output_size = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_columns = {f: instance.__dict__[f] for f in cls.TEST_DATA_FIELDS if f in instance.__dict__}
+        return instance
+
+    def _test_data(self, field):
+        blob = getattr(self, f"{field}_blob")
+        if not blob:
+            return getattr(self, field) or ""
+        cache = self.__dict__.setdefault('_blob_texts', {})
+        if cache.get(field, (None,))[0] != blob:
+            cache[field] = (blob, BlobStore.get(blob))
+        return cache[field][1]
+
+    @property
+    def data_truncated(self) -> bool:
+        """True if ``input`` or ``expected_output`` holds only a preview"""
+        return bool(self.input_blob or self.expected_output_blob)
+
+    @property
+    def input_text(self):
+        return self._test_data('input')
+
+    @property
+    def expected_output_text(self):
+        return self._test_data('expected_output')
+
+    def offload_test_data(self, fields=None):
+        """Move oversized test data to blob storage; returns the fields that changed"""
+        stored = getattr(self, '_stored_columns', {})
+        preview = getattr(settings, 'TESTCASE_BLOB_PREVIEW_CHARS', 1000)
+        deferred = self.get_deferred_fields()
+        changed = []
+        for field in self.TEST_DATA_FIELDS:
+            if field in deferred or (fields is not None and field not in fields):
+                continue
+            value = getattr(self, field) or ""
+            blob = getattr(self, f"{field}_blob")
+            if blob and value == stored.get(field):
+                continue  # column still holds the preview of the stored blob
+
+            size = len(value.encode('utf-8'))
+            blob = None
+            if size > BlobStore.threshold():
+                blob = BlobStore.put(value)
+                setattr(self, field, value[:preview])
+            setattr(self, f"{field}_blob", blob)
+            setattr(self, f"{field}_size", size)
+            changed.append(field)
+        return changed
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        changed = self.offload_test_data(update_fields)
+        if update_fields is not None:
+            extra = [f"{field}{suffix}" for field in changed for suffix in ('', '_blob', '_size')]
+            kwargs['update_fields'] = list(dict.fromkeys(list(update_fields) + extra))
+        super().save(*args, **kwargs)
+        self._stored_columns = {f: self.__dict__[f] for f in self.TEST_DATA_FIELDS if f in self.__dict__}
+
+
+class TestCase(TestDataBlobs):
     question = models.ForeignKey(AssignmentQuestion, on_delete=models.CASCADE, related_name='testcases')
     input = models.TextField(blank=True, default='')
     expected_output = models.TextField(blank=True, default='')
@@ -300,12 +409,15 @@ class TestCase(models.Model):
     )
     timeout = models.IntegerField(default=2)
     memory_limit = models.IntegerField(default=128000)
+    # How stdout is compared with expected_output (see checkers.py)
+    checker = models.CharField(max_length=20, choices=CHECKER_CHOICES, default='exact')
+    float_tolerance = models.FloatField(default=1e-6)
 
     def __str__(self):
         return f"TC for {self.question_id} - {self.id}"
 
 
-class CodingTestCase(models.Model):
+class CodingTestCase(TestDataBlobs):
     """Test cases for CodingQuestion"""
     question = models.ForeignKey(CodingQuestion, on_delete=models.CASCADE, related_name='testcases')
     input = models.TextField(blank=True, default='')
@@ -331,13 +443,24 @@ class TestCaseResult(models.Model):
     """Stores the result of each test case execution for a submission"""
     submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='testcase_results')
     testcase = models.ForeignKey(TestCase, on_delete=models.CASCADE)
-    status = models.CharField(max_length=50)  # 'passed', 'failed', 'error', 'timeout'
+    status = models.CharField(max_length=50)  # 'passed', 'failed', 'error', 'timeout', 'skipped'
     actual_output = models.TextField(blank=True, null=True)
     execution_time = models.FloatField(null=True, blank=True)  # in seconds
     memory_used = models.IntegerField(null=True, blank=True)  # in KB
     judge0_token = models.CharField(max_length=100, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
+    # SHA-256 of the code, language and test case this result was graded from
+    grading_hash = models.CharField(max_length=64, blank=True, null=True)
+    # Execution telemetry (seconds / bytes); execution_time above is the program's own run time
+    backend = models.CharField(max_length=20, blank=True, default='')
+    wall_time = models.FloatField(null=True, blank=True)  # queued -> result
+    backend_time = models.FloatField(null=True, blank=True)  # sandbox round trip
+    queue_wait = models.FloatField(null=True, blank=True)
+    bytes_in = models.IntegerField(null=True, blank=True)
+    bytes_out = models.IntegerField(null=True, blank=True)
+    cache_hit = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
     
     class Meta:
         unique_together = ('submission', 'testcase')
@@ -345,6 +468,36 @@ class TestCaseResult(models.Model):
     def __str__(self):
         return f"Result for Submission {self.submission_id} - TestCase {self.testcase_id}"
 
+
+class GradingJob(models.Model):
+    """Background grading run of a submission's test cases"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('error', 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='grading_jobs')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='grading_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    total_testcases = models.IntegerField(default=0)
+    completed_testcases = models.IntegerField(default=0)
+    passed_testcases = models.IntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    attempts = models.IntegerField(default=0, help_text="Times the job was re-queued after its worker went away")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"GradingJob {self.id} for Submission {self.submission_id} ({self.status})"
+
 class Contact(models.Model):
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=20, blank=True, null=True)
@@ -460,6 +613,13 @@ class DatabaseQuestion(models.Model):
         null=True
     )
     expected_result = models.JSONField(help_text="Expected query result as JSON")
+    order_sensitive = models.BooleanField(
+        default=False,
+        help_text="Rows must come back in the expected order (the query has an ORDER BY)"
+    )
+    # expected_result as DatabaseService.prepare_expected returns it, kept in step on save
+    expected_result_normalized = models.JSONField(null=True, blank=True, editable=False)
+    expected_result_hash = models.CharField(max_length=128, blank=True, default='', editable=False)
     total_marks = models.FloatField(default=10.0)
     order = models.IntegerField(default=0)
     hints = models.TextField(blank=True, null=True)
@@ -471,6 +631,24 @@ class DatabaseQuestion(models.Model):
     
     def __str__(self):
         return f"DB Question {self.id} for {self.assignment.title}"
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'expected_result', 'order_sensitive'} & set(update_fields):
+            self.expected_result_normalized, self.expected_result_hash = DatabaseService.prepare_expected(
+                self.expected_result, self.order_sensitive
+            )
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + ['expected_result_normalized', 'expected_result_hash']
+        super().save(*args, **kwargs)
+    
+    def expected_comparison(self) -> dict:
+        """Keyword arguments passing the precomputed expected result to DatabaseService"""
+        return {
+            'expected_normalized': self.expected_result_normalized,
+            'expected_hash': self.expected_result_hash,
+            'order_sensitive': self.order_sensitive,
+        }
 
 
 class DatabaseSubmission(models.Model):
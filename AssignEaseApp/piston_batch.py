@@ -0,0 +1,259 @@
+"""
+Harness programs used by PistonService.run_batch.
+
+A batch execution sends the student's program together with a small harness
+file. The harness receives every test case input on its own stdin, runs the
+program once per case and writes the per-case results back as framed
+sections on stdout:
+
+    stdin : "<count> <timeout>\\n" then, per case, "<len>\\n<input bytes>"
+    stdout: per case, "\\n@@ASSIGNEASE <index> <exit code> <out len> <err len>@@\\n"
+            followed by the case's stdout and stderr bytes
+
+For C/C++ the harness is compiled with the submission and forks before
+``main`` runs, so the program is compiled once and every case still starts
+from a fresh process. For Python the harness re-runs the solution file with
+the sandbox's interpreter.
+"""
+import re
+
+
+C_HARNESS = r"""
+#ifndef _GNU_SOURCE
+#define _GNU_SOURCE
+#endif
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+static char *ae_read_fd(int fd, size_t *out_len)
+{
+    size_t cap = 65536, len = 0;
+    char *buf = (char *)malloc(cap);
+    ssize_t n;
+    if (!buf) _exit(97);
+    while ((n = read(fd, buf + len, cap - len)) > 0) {
+        len += (size_t)n;
+        if (len == cap) {
+            cap *= 2;
+            buf = (char *)realloc(buf, cap);
+            if (!buf) _exit(97);
+        }
+    }
+    *out_len = len;
+    return buf;
+}
+
+static void ae_write_all(int fd, const char *buf, size_t len)
+{
+    while (len > 0) {
+        ssize_t n = write(fd, buf, len);
+        if (n <= 0) _exit(98);
+        buf += n;
+        len -= (size_t)n;
+    }
+}
+
+static int ae_tmpfd(void)
+{
+    char path[] = "/tmp/assigneaseXXXXXX";
+    int fd = mkstemp(path);
+    if (fd < 0) _exit(99);
+    unlink(path);
+    return fd;
+}
+
+__attribute__((constructor))
+static void ae_batch_main(void)
+{
+    size_t in_len;
+    char *in = ae_read_fd(0, &in_len);
+    char *p = in;
+    long count = strtol(p, &p, 10);
+    long timeout = strtol(p, &p, 10);
+    long c;
+    int i;
+
+    if (*p == '\n') p++;
+
+    for (c = 0; c < count; c++) {
+        long len = strtol(p, &p, 10);
+        int fds[3];
+        pid_t pid;
+        int status = 0, code;
+        size_t out_len, err_len;
+        char *out, *err;
+        char header[128];
+        int header_len;
+
+        if (*p == '\n') p++;
+        for (i = 0; i < 3; i++) fds[i] = ae_tmpfd();
+        ae_write_all(fds[0], p, (size_t)len);
+        lseek(fds[0], 0, SEEK_SET);
+        p += len;
+
+        pid = fork();
+        if (pid < 0) _exit(96);
+        if (pid == 0) {
+            dup2(fds[0], 0);
+            dup2(fds[1], 1);
+            dup2(fds[2], 2);
+            for (i = 0; i < 3; i++) close(fds[i]);
+            free(in);
+            if (timeout > 0) alarm((unsigned)timeout);
+            return; /* continue into the program's own main() */
+        }
+
+        waitpid(pid, &status, 0);
+        code = WIFEXITED(status) ? WEXITSTATUS(status) : 128 + WTERMSIG(status);
+
+        lseek(fds[1], 0, SEEK_SET);
+        out = ae_read_fd(fds[1], &out_len);
+        lseek(fds[2], 0, SEEK_SET);
+        err = ae_read_fd(fds[2], &err_len);
+
+        header_len = snprintf(header, sizeof header, "\n@@ASSIGNEASE %ld %d %zu %zu@@\n",
+                              c, code, out_len, err_len);
+        ae_write_all(1, header, (size_t)header_len);
+        ae_write_all(1, out, out_len);
+        ae_write_all(1, err, err_len);
+
+        free(out);
+        free(err);
+        for (i = 0; i < 3; i++) close(fds[i]);
+    }
+
+    _exit(0);
+}
+"""
+
+PYTHON_HARNESS = r"""
+import subprocess
+import sys
+
+
+def main():
+    data = sys.stdin.buffer.read()
+    header, _, rest = data.partition(b"\n")
+    count, timeout = (int(x) for x in header.split())
+    out = sys.stdout.buffer
+    pos = 0
+
+    for index in range(count):
+        newline = rest.index(b"\n", pos)
+        length = int(rest[pos:newline])
+        pos = newline + 1
+        case_input = rest[pos:pos + length]
+        pos += length
+
+        try:
+            proc = subprocess.run(
+                [sys.executable, "solution.py"],
+                input=case_input,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout or None,
+            )
+            code, stdout, stderr = proc.returncode, proc.stdout, proc.stderr
+            if code < 0:
+                code = 128 - code
+        except subprocess.TimeoutExpired as e:
+            code = 124
+            stdout = e.stdout or b""
+            stderr = (e.stderr or b"") + b"Time limit exceeded"
+
+        out.write(b"\n@@ASSIGNEASE %d %d %d %d@@\n" % (index, code, len(stdout), len(stderr)))
+        out.write(stdout)
+        out.write(stderr)
+        # Finished cases must reach the server even if it stops the batch later
+        out.flush()
+
+
+main()
+"""
+
+# Piston language name (and aliases) -> (harness source, harness file name, solution file name)
+HARNESSES = {
+    'c': (C_HARNESS, 'assignease_harness', 'solution'),
+    'gcc': (C_HARNESS, 'assignease_harness', 'solution'),
+    'c++': (C_HARNESS, 'assignease_harness', 'solution'),
+    'cpp': (C_HARNESS, 'assignease_harness', 'solution'),
+    'g++': (C_HARNESS, 'assignease_harness', 'solution'),
+    'python': (PYTHON_HARNESS, 'assignease_harness.py', 'solution.py'),
+    'python3': (PYTHON_HARNESS, 'assignease_harness.py', 'solution.py'),
+    'py': (PYTHON_HARNESS, 'assignease_harness.py', 'solution.py'),
+}
+
+_FRAME_RE = re.compile(rb"\n@@ASSIGNEASE (\d+) (-?\d+) (\d+) (\d+)@@\n")
+
+
+def supports(language: str) -> bool:
+    return (language or "").lower() in HARNESSES
+
+
+def build_files(language: str, source_code: str) -> list:
+    """
+    Return the Piston ``files`` list for a batch run. The entry file comes
+    first for interpreted languages; compiled languages build every file.
+    """
+    harness, harness_name, solution_name = HARNESSES[language.lower()]
+    solution = {"name": solution_name, "content": source_code}
+    harness_file = {"name": harness_name, "content": harness}
+
+    if harness_name.endswith('.py'):
+        return [harness_file, solution]
+    return [solution, harness_file]
+
+
+def encode_stdin(stdins: list, timeout: int) -> str:
+    parts = [f"{len(stdins)} {int(timeout or 0)}\n"]
+    for stdin in stdins:
+        data = stdin or ""
+        parts.append(f"{len(data.encode('utf-8'))}\n")
+        parts.append(data)
+    return "".join(parts)
+
+
+def parse_stdout(stdout: str, count: int, partial: bool = False) -> list:
+    """
+    Split the harness output back into per-case results.
+
+    With ``partial`` the results of the leading cases whose output is
+    complete are returned instead of raising, e.g. when the server stopped
+    the harness at its run_timeout or output limit.
+
+    Raises:
+        ValueError: if the output is truncated or not in harness format
+    """
+    data = (stdout or "").encode('utf-8')
+    results = []
+    pos = 0
+
+    for index in range(count):
+        match = _FRAME_RE.match(data, pos)
+        if not match or int(match.group(1)) != index:
+            if partial:
+                break
+            raise ValueError(f"Malformed batch output at case {index}")
+
+        exit_code = int(match.group(2))
+        out_len = int(match.group(3))
+        err_len = int(match.group(4))
+        start = match.end()
+        end = start + out_len + err_len
+        if end > len(data):
+            if partial:
+                break
+            raise ValueError(f"Truncated batch output at case {index}")
+
+        results.append({
+            "stdout": data[start:start + out_len].decode('utf-8', errors='replace'),
+            "stderr": data[start + out_len:end].decode('utf-8', errors='replace'),
+            "exit_code": exit_code,
+        })
+        pos = end
+
+    return results
@@ -1,11 +1,25 @@
-import requests
+import asyncio
+import time
+from django.conf import settings
+from . import piston_batch
+from .execution_backends import ExecutionBackendError, get_backend
+from .execution_load import ExecutionLoad
+from .execution_pool import ExecutionPool
+from .execution_cache import ExecutionCache
 
-PISTON_EXECUTE_URL = "https://execute.assignease.io/api/v2/execute"
+class PistonService:
+    @staticmethod
+    def _execute(payload: dict, timeout: int = 30) -> dict:
+        """Run a Piston-style payload on the configured execution backend"""
+        return get_backend().execute(payload, timeout=timeout)
 
+    @staticmethod
+    async def _aexecute(payload: dict, timeout: int = 30) -> dict:
+        """Async form of _execute"""
+        return await get_backend().aexecute(payload, timeout=timeout)
 
-class PistonService:
     @staticmethod
-    def run_code(source_code: str, language: str, version: str, stdin: str = ""):
+    def run_code(source_code: str, language: str, version: str, stdin: str = "", timeout: int = None):
         """
         Call Piston API to execute code.
 
@@ -13,8 +27,44 @@ class PistonService:
         :param language: Piston language name (e.g. 'python', 'javascript')
         :param version: Piston version (e.g. '3.10.0', '18.15.0')
         :param stdin: Input to pass to the program (single test case input)
-        :return: dict with stdout, stderr, exit_code or error
+        :param timeout: Wall time limit in seconds (the server's default if None),
+                        capped at PISTON_MAX_RUN_TIMEOUT_MS
+        :return: dict with stdout, stderr, exit_code or error; compile_error is
+                 set when the program failed to compile; execution_time and
+                 memory_used when the server reports them; telemetry fields
+                 (see _record)
         """
+        cache_key = PistonService._cache_key(source_code, language, version, stdin, timeout)
+        result = ExecutionCache.get(cache_key)
+        if result is None:
+            result = PistonService._run_code_uncached(source_code, language, version, stdin, timeout)
+            ExecutionCache.set(cache_key, result)
+            return result
+        return PistonService._cache_hit(result)
+
+    @staticmethod
+    async def arun_code(source_code: str, language: str, version: str, stdin: str = "", timeout: int = None):
+        """Async form of run_code"""
+        cache_key = PistonService._cache_key(source_code, language, version, stdin, timeout)
+        result = await ExecutionCache.aget(cache_key)
+        if result is None:
+            result = await PistonService._arun_code_uncached(source_code, language, version, stdin, timeout)
+            await ExecutionCache.aset(cache_key, result)
+            return result
+        return PistonService._cache_hit(result)
+
+    @staticmethod
+    def _cache_key(source_code: str, language: str, version: str, stdin: str, timeout: int = None) -> str:
+        """ExecutionCache key of one input, shared by run_code and run_batch"""
+        limits = {"timeout": int(timeout)} if timeout else None
+        return ExecutionCache.make_key(source_code, language, version, stdin, limits)
+
+    @staticmethod
+    def _max_run_timeout() -> int:
+        return getattr(settings, 'PISTON_MAX_RUN_TIMEOUT_MS', 3000)
+
+    @staticmethod
+    def _code_payload(source_code: str, language: str, version: str, stdin: str = "", timeout: int = None) -> dict:
         payload = {
             "language": language,
             "version": version,
@@ -25,23 +75,284 @@ class PistonService:
             ],
             "stdin": stdin or ""
         }
+        if timeout:
+            payload["run_timeout"] = min(PistonService._max_run_timeout(), int(timeout) * 1000)
+        return payload
 
-        try:
-            response = requests.post(PISTON_EXECUTE_URL, json=payload, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            run = data.get("run", {}) or {}
+    @staticmethod
+    def _run_result(data: dict) -> dict:
+        """Turn an execute response into a run_code result"""
+        compile_stage = data.get("compile") or {}
+        run = data.get("run", {}) or {}
 
+        if compile_stage.get("code"):
             return {
-                "stdout": (run.get("stdout") or ""),
-                "stderr": (run.get("stderr") or ""),
-                "exit_code": run.get("code", -1),
-            }
-        except requests.exceptions.RequestException as e:
-            # Network / API error
-            return {
-                "error": str(e),
                 "stdout": "",
-                "stderr": "",
-                "exit_code": -1,
+                "stderr": compile_stage.get("stderr") or compile_stage.get("output") or "",
+                "exit_code": compile_stage.get("code", -1),
+                "compile_error": True,
             }
+
+        result = {
+            "stdout": (run.get("stdout") or ""),
+            "stderr": (run.get("stderr") or ""),
+            "exit_code": run.get("code", -1),
+        }
+        if run.get("signal"):
+            # Killed (time/memory limit or a crash); see ExecutionCache.cacheable
+            result["signal"] = run["signal"]
+        # Resource usage, when the server reports it (ms and bytes)
+        run_time = run.get("wall_time") if run.get("wall_time") is not None else run.get("cpu_time")
+        if run_time is not None:
+            result["execution_time"] = run_time / 1000.0
+        if run.get("memory") is not None:
+            result["memory_used"] = run["memory"] // 1024
+        return result
+
+    @staticmethod
+    def _record(result: dict, started: float, source_code: str, stdin: str, cases: int = 1) -> dict:
+        """
+        Add telemetry to a result: backend, backend_time (round trip in seconds,
+        split evenly over the cases of a batch), bytes_in, bytes_out, cache_hit
+        """
+        result["backend"] = get_backend().name
+        result["backend_time"] = (time.monotonic() - started) / cases
+        result["bytes_in"] = len((source_code or "").encode('utf-8')) // cases + len((stdin or "").encode('utf-8'))
+        result["bytes_out"] = len(result["stdout"].encode('utf-8')) + len(result["stderr"].encode('utf-8'))
+        result["cache_hit"] = False
+        return result
+
+    @staticmethod
+    def _cache_hit(result: dict) -> dict:
+        """A cached result as returned to the caller: no sandbox time or traffic"""
+        return dict(result, backend_time=0.0, bytes_in=0, bytes_out=0, cache_hit=True)
+
+    @staticmethod
+    def _error_result(error) -> dict:
+        # Network / API / sandbox error
+        return {
+            "error": str(error),
+            "stdout": "",
+            "stderr": "",
+            "exit_code": -1,
+        }
+
+    @staticmethod
+    def _run_code_uncached(source_code: str, language: str, version: str, stdin: str = "", timeout: int = None):
+        payload = PistonService._code_payload(source_code, language, version, stdin, timeout)
+        started = time.monotonic()
+        try:
+            with ExecutionLoad.track():
+                result = PistonService._run_result(PistonService._execute(payload))
+        except ExecutionBackendError as e:
+            result = PistonService._error_result(e)
+        return PistonService._record(result, started, source_code, stdin)
+
+    @staticmethod
+    async def _arun_code_uncached(source_code: str, language: str, version: str, stdin: str = "", timeout: int = None):
+        payload = PistonService._code_payload(source_code, language, version, stdin, timeout)
+        started = time.monotonic()
+        try:
+            with ExecutionLoad.track():
+                result = PistonService._run_result(await PistonService._aexecute(payload))
+        except ExecutionBackendError as e:
+            result = PistonService._error_result(e)
+        return PistonService._record(result, started, source_code, stdin)
+
+    @staticmethod
+    def supports_batch(language: str) -> bool:
+        """True if run_batch can pack several inputs into one execution for this language"""
+        return getattr(settings, 'PISTON_BATCH_EXECUTION', True) and piston_batch.supports(language)
+
+    @staticmethod
+    def run_batch(source_code: str, language: str, version: str, stdins: list, timeout: int = 2) -> list:
+        """
+        Execute the same program against several inputs in a single Piston call.
+
+        The program is compiled once and run once per input by a harness file
+        (see piston_batch), which stops each input at ``timeout``. Up to
+        PISTON_BATCH_MAX_CASES inputs share one execution, bounded by the
+        server's PISTON_MAX_RUN_TIMEOUT_MS as a whole rather than by the sum
+        of the per-case limits: cases usually finish far below their limit.
+        Inputs the harness did not get to before the server stopped it (or
+        whose output was cut by the server's output limit) go into the next
+        execution. Languages without a harness, time limits longer than the
+        server allows, and a batch from which no result can be read fall
+        back to one run_code call per input.
+
+        :param stdins: List of inputs, one per test case
+        :param timeout: Per-case wall time limit in seconds
+        :return: list of run_code-style dicts, one per input, in the same order
+        """
+        stdins = list(stdins)
+        if not stdins:
+            return []
+
+        # Answer repeated runs from the cache (same keys as run_code) and only execute the misses
+        keys = [PistonService._cache_key(source_code, language, version, stdin, timeout) for stdin in stdins]
+        results = [ExecutionCache.get(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        results = [result and PistonService._cache_hit(result) for result in results]
+
+        if pending:
+            outputs = PistonService._run_batch_uncached(
+                source_code, language, version, [stdins[i] for i in pending], timeout
+            )
+            for i, output in zip(pending, outputs):
+                ExecutionCache.set(keys[i], output)
+                results[i] = output
+
+        return results
+
+    @staticmethod
+    async def arun_batch(source_code: str, language: str, version: str, stdins: list, timeout: int = 2) -> list:
+        """Async form of run_batch"""
+        stdins = list(stdins)
+        if not stdins:
+            return []
+
+        keys = [PistonService._cache_key(source_code, language, version, stdin, timeout) for stdin in stdins]
+        results = [await ExecutionCache.aget(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        results = [result and PistonService._cache_hit(result) for result in results]
+
+        if pending:
+            outputs = await PistonService._arun_batch_uncached(
+                source_code, language, version, [stdins[i] for i in pending], timeout
+            )
+            for i, output in zip(pending, outputs):
+                await ExecutionCache.aset(keys[i], output)
+                results[i] = output
+
+        return results
+
+    @staticmethod
+    def _batch_payload(source_code: str, language: str, version: str, stdins: list, timeout: int) -> dict:
+        return {
+            "language": language,
+            "version": version,
+            "files": piston_batch.build_files(language, source_code),
+            "stdin": piston_batch.encode_stdin(stdins, timeout),
+            "run_timeout": min(PistonService._max_run_timeout(), (int(timeout or 0) * len(stdins) + 1) * 1000),
+        }
+
+    @staticmethod
+    def _batch_results(data: dict, count: int) -> list:
+        """
+        Per-input results of a batch execute response: one per input on a
+        compile error, otherwise those of the leading inputs the harness
+        finished (fewer than ``count`` if the server stopped it early)
+        """
+        compile_stage = data.get("compile") or {}
+        run = data.get("run", {}) or {}
+
+        if compile_stage.get("code"):
+            # Compilation failed: every case gets the compiler output
+            compile_error = compile_stage.get("stderr") or compile_stage.get("output") or ""
+            return [
+                {"stdout": "", "stderr": compile_error, "exit_code": compile_stage.get("code", -1), "compile_error": True}
+                for _ in range(count)
+            ]
+
+        return piston_batch.parse_stdout(run.get("stdout") or "", count, partial=True)
+
+    @staticmethod
+    def _batch_size(timeout: int) -> int:
+        """
+        Most cases one harness execution may hold: PISTON_BATCH_MAX_CASES, or
+        0 when a single case's time limit does not fit PISTON_MAX_RUN_TIMEOUT_MS
+        """
+        if max(1, int(timeout or 0)) * 1000 > PistonService._max_run_timeout():
+            return 0
+        return getattr(settings, 'PISTON_BATCH_MAX_CASES', 32)
+
+    @staticmethod
+    def _chunks(stdins: list, timeout: int) -> list:
+        size = max(1, PistonService._batch_size(timeout))
+        return [stdins[i:i + size] for i in range(0, len(stdins), size)]
+
+    @staticmethod
+    def _run_chunk(source_code: str, language: str, version: str, stdins: list, timeout: int) -> list:
+        """Harness executions for ``stdins`` until each has a result, falling back to a run per input"""
+        results = []
+        while len(stdins) - len(results) > 1:
+            rest = stdins[len(results):]
+            payload = PistonService._batch_payload(source_code, language, version, rest, timeout)
+            started = time.monotonic()
+            try:
+                with ExecutionLoad.track(len(rest)):
+                    data = PistonService._execute(payload, timeout=60)
+            except ExecutionBackendError:
+                break
+            finished = PistonService._batch_results(data, len(rest))
+            if not finished:
+                # Not even the first input came back (harness failure or output limit)
+                break
+            results.extend(
+                PistonService._record(result, started, source_code, stdin, len(finished))
+                for result, stdin in zip(finished, rest)
+            )
+
+        return results + [
+            PistonService._run_code_uncached(source_code, language, version, stdin, timeout)
+            for stdin in stdins[len(results):]
+        ]
+
+    @staticmethod
+    async def _arun_chunk(source_code: str, language: str, version: str, stdins: list, timeout: int) -> list:
+        """Async form of _run_chunk"""
+        results = []
+        while len(stdins) - len(results) > 1:
+            rest = stdins[len(results):]
+            payload = PistonService._batch_payload(source_code, language, version, rest, timeout)
+            started = time.monotonic()
+            try:
+                with ExecutionLoad.track(len(rest)):
+                    data = await PistonService._aexecute(payload, timeout=60)
+            except ExecutionBackendError:
+                break
+            finished = PistonService._batch_results(data, len(rest))
+            if not finished:
+                break
+            results.extend(
+                PistonService._record(result, started, source_code, stdin, len(finished))
+                for result, stdin in zip(finished, rest)
+            )
+
+        return results + [
+            await PistonService._arun_code_uncached(source_code, language, version, stdin, timeout)
+            for stdin in stdins[len(results):]
+        ]
+
+    @staticmethod
+    def _run_batch_uncached(source_code: str, language: str, version: str, stdins: list, timeout: int) -> list:
+        if PistonService.supports_batch(language) and PistonService._batch_size(timeout) > 1:
+            # One pool slot per harness execution
+            chunks = ExecutionPool.map(
+                lambda chunk: PistonService._run_chunk(source_code, language, version, chunk, timeout),
+                PistonService._chunks(stdins, timeout),
+            )
+            return [result for chunk in chunks for result in chunk]
+
+        return ExecutionPool.map(
+            lambda stdin: PistonService._run_code_uncached(source_code, language, version, stdin, timeout),
+            stdins,
+        )
+
+    @staticmethod
+    async def _arun_batch_uncached(source_code: str, language: str, version: str, stdins: list, timeout: int) -> list:
+        slots = asyncio.Semaphore(ExecutionPool.max_per_submission())
+
+        if PistonService.supports_batch(language) and PistonService._batch_size(timeout) > 1:
+            async def run_chunk(chunk):
+                async with slots:
+                    return await PistonService._arun_chunk(source_code, language, version, chunk, timeout)
+
+            chunks = await asyncio.gather(*(run_chunk(chunk) for chunk in PistonService._chunks(stdins, timeout)))
+            return [result for chunk in chunks for result in chunk]
+
+        async def run(stdin):
+            async with slots:
+                return await PistonService._arun_code_uncached(source_code, language, version, stdin, timeout)
+
+        return await asyncio.gather(*(run(stdin) for stdin in stdins))
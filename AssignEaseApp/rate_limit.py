@@ -0,0 +1,101 @@
+"""
+Admission control for sandbox executions.
+
+Requests that run code are charged one token per test case execution from
+a per-user and a global token bucket. Buckets live in the Django cache named
+by EXECUTION_RATE_LIMIT_CACHE, so limits hold across worker processes when
+that cache is shared (e.g. Redis). When a bucket is empty, or this process
+already has EXECUTION_MAX_QUEUED executions outstanding at the sandbox
+backends (see execution_load, which counts sync and async calls alike), the
+request is turned away with a retry delay instead of queueing more work on
+the sandbox.
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from .execution_load import ExecutionLoad
+
+
+class ExecutionRateLimiter:
+    """Token buckets counting sandbox executions"""
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, 'EXECUTION_RATE_LIMIT_ENABLED', True)
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'EXECUTION_RATE_LIMIT_CACHE', 'default')]
+
+    @classmethod
+    def _take(cls, key: str, cost: float, rate: float, burst: float) -> float:
+        """
+        Take ``cost`` tokens from the bucket at ``key`` (a negative cost refunds).
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they will be available
+        """
+        cache = cls._cache()
+        lock_key = f"{key}:lock"
+        with cls._lock:
+            # cache.add is atomic on shared caches, so this also serialises other processes
+            locked = False
+            for _ in range(100):
+                locked = cache.add(lock_key, 1, timeout=1)
+                if locked:
+                    break
+                time.sleep(0.001)
+
+            try:
+                now = time.time()
+                tokens, updated = cache.get(key) or (burst, now)
+                tokens = min(burst, tokens + (now - updated) * rate)
+                ttl = int(burst / rate) + 60
+
+                if cost > 0 and tokens < cost:
+                    cache.set(key, (tokens, now), ttl)
+                    return (cost - tokens) / rate
+
+                cache.set(key, (min(burst, tokens - cost), now), ttl)
+                return 0
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+
+    @classmethod
+    def check(cls, user, executions: int):
+        """
+        Admit ``executions`` sandbox runs for ``user``.
+
+        Returns:
+            None if admitted (tokens are consumed), otherwise the number of
+            seconds the client should wait before retrying
+        """
+        if not cls.enabled() or executions <= 0:
+            return None
+
+        max_queued = getattr(settings, 'EXECUTION_MAX_QUEUED', 256)
+        if max_queued and ExecutionLoad.in_flight() >= max_queued:
+            return 1.0
+
+        user_rate = getattr(settings, 'EXECUTION_USER_RATE', 1.0)
+        user_burst = getattr(settings, 'EXECUTION_USER_BURST', 60)
+        global_rate = getattr(settings, 'EXECUTION_GLOBAL_RATE', 50.0)
+        global_burst = getattr(settings, 'EXECUTION_GLOBAL_BURST', 500)
+
+        # A request larger than the bucket is admitted once the bucket is full
+        user_key = f"ratelimit:exec:user:{user.pk}"
+        user_cost = min(executions, user_burst)
+        wait = cls._take(user_key, user_cost, user_rate, user_burst)
+        if wait:
+            return wait
+
+        wait = cls._take("ratelimit:exec:global", min(executions, global_burst), global_rate, global_burst)
+        if wait:
+            cls._take(user_key, -user_cost, user_rate, user_burst)
+            return wait
+
+        return None
@@ -0,0 +1,101 @@
+"""
+Check a question's test cases against a teacher's reference solution.
+
+The reference solution is run on every test case input at once through
+GradingService.run_testcases (batched / concurrent like grading). Its
+output is then compared with each expected output using the test case's
+checker, and expected outputs are optionally filled in or replaced. Writes
+happen in one transaction and only when the solution ran cleanly on every
+case, so a broken reference never half-updates a question.
+"""
+import difflib
+from django.db import transaction
+from .grading_service import GradingService
+
+MODES = ("verify", "fill", "overwrite")
+DIFF_MAX_CHARS = 10000
+DIFF_MAX_LINES = 40
+
+
+def _diff(expected: str, actual: str) -> str:
+    lines = list(difflib.unified_diff(
+        expected[:DIFF_MAX_CHARS].splitlines(),
+        actual[:DIFF_MAX_CHARS].splitlines(),
+        fromfile="expected_output",
+        tofile="reference_output",
+        lineterm="",
+        n=1,
+    ))
+    if len(lines) > DIFF_MAX_LINES:
+        lines = lines[:DIFF_MAX_LINES] + [f"... {len(lines) - DIFF_MAX_LINES} more diff line(s)"]
+    return "\n".join(lines)
+
+
+def check_reference_solution(testcases, source_code, language, version, judge0_language_id=None, mode="verify"):
+    """
+    Run ``source_code`` on every test case and compare/fill expected outputs.
+
+    Args:
+        testcases: TestCase or CodingTestCase instances
+        mode: 'verify' (report only), 'fill' (set empty expected outputs) or
+              'overwrite' (also replace expected outputs that differ)
+
+    Returns:
+        Report dict: applied, counts per status and one entry per test case
+        with status 'match', 'mismatch', 'filled', 'updated' or 'error'
+        (plus a unified diff for mismatches)
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+
+    testcases = list(testcases)
+    results = GradingService.run_testcases(
+        source_code, language, version, testcases, judge0_language_id=judge0_language_id
+    )
+
+    cases = []
+    updates = []
+    for r in results:
+        tc = r["testcase"]
+        entry = {"testcase_id": tc.id}
+        expected = tc.expected_output_text or ""
+
+        if r["backend_error"] or r["compile_error"] or r["stderr"]:
+            entry.update(status="error", error=r["stderr"] or "Execution failed")
+        elif not expected.strip():
+            entry["status"] = "filled" if mode != "verify" else "mismatch"
+            entry["reference_output"] = r["stdout"]
+            if mode != "verify":
+                updates.append((tc, r["stdout"]))
+        elif r["passed"]:
+            entry["status"] = "match"
+        else:
+            entry["status"] = "updated" if mode == "overwrite" else "mismatch"
+            entry["diff"] = _diff(expected, r["stdout"])
+            if mode == "overwrite":
+                updates.append((tc, r["stdout"]))
+        cases.append(entry)
+
+    failed = any(entry["status"] == "error" for entry in cases)
+    if updates and failed:
+        # Nothing is written; report what would have changed as mismatches
+        for entry in cases:
+            if entry["status"] in ("filled", "updated"):
+                entry["status"] = "mismatch"
+    elif updates:
+        with transaction.atomic():
+            for tc, output in updates:
+                tc.expected_output = output
+                tc.save(update_fields=["expected_output"])
+
+    counts = {}
+    for entry in cases:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+
+    return {
+        "mode": mode,
+        "applied": bool(updates) and not failed,
+        "total": len(cases),
+        "counts": counts,
+        "testcases": cases,
+    }
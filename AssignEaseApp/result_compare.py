@@ -0,0 +1,117 @@
+"""
+Comparison of SQL query results for DatabaseService.compare_results.
+
+A result (list of row dicts) is reduced once to a canonical form: sorted
+column names plus one tuple per row, in column order. Each value becomes
+its stripped string, and NULL stays None. Two results are then compared
+through a hash of that form:
+
+- order-insensitive questions (the default) hash the rows as a multiset:
+  a 256-bit sum of per-row blake2b digests, so no sorting is needed and any
+  row order gives the same hash
+- order-sensitive questions (DatabaseQuestion.order_sensitive, for
+  ORDER BY) hash the rows in sequence
+
+Equal hashes are a match. Only on a mismatch is the detailed diff built
+(columns, row count, missing/extra rows or the first out-of-place row) to
+explain it to the student.
+"""
+import hashlib
+from collections import Counter
+
+HASH_VERSION = "v2"
+_MODULUS = 1 << 256
+_NULL = b"\x00"
+_SEPARATOR = b"\x1f"
+MAX_REPORTED_ROWS = 3
+
+
+def canonical(result) -> dict:
+    """
+    Canonical form of a query result, safe to store as JSON
+
+    Returns:
+        {"columns": [sorted column names], "rows": [[value, ...], ...]}
+    """
+    result = result or []
+    columns = sorted(result[0].keys()) if result else []
+    rows = [
+        [None if row.get(col) is None else str(row.get(col)).strip() for col in columns]
+        for row in result
+    ]
+    return {"columns": columns, "rows": rows}
+
+
+def _row_bytes(row) -> bytes:
+    if None not in row:
+        return "\x1f".join(row).encode('utf-8')
+    return _SEPARATOR.join(_NULL if value is None else value.encode('utf-8') for value in row)
+
+
+def result_hash(canon: dict, order_sensitive: bool = False) -> str:
+    """Hash of a canonical result; equal hashes mean equal results"""
+    header = _SEPARATOR.join(col.encode('utf-8') for col in canon["columns"])
+    if order_sensitive:
+        digest = hashlib.sha256(header)
+        for row in canon["rows"]:
+            digest.update(b"\x1e")
+            digest.update(_row_bytes(row))
+        body = digest.hexdigest()
+    else:
+        total = 0
+        for row in canon["rows"]:
+            total += int.from_bytes(hashlib.blake2b(_row_bytes(row), digest_size=32).digest(), 'big')
+        body = f"{total % _MODULUS:064x}"
+    mode = "ordered" if order_sensitive else "multiset"
+    return f"{HASH_VERSION}:{mode}:{hashlib.sha256(header).hexdigest()[:16]}:{len(canon['rows'])}:{body}"
+
+
+def is_current(digest: str, order_sensitive: bool = False) -> bool:
+    """Whether a stored hash was made by this version of result_hash in the same mode"""
+    mode = "ordered" if order_sensitive else "multiset"
+    return bool(digest) and digest.startswith(f"{HASH_VERSION}:{mode}:")
+
+
+def _format_row(columns, row) -> str:
+    return "(" + ", ".join(f"{col}={'NULL' if value is None else repr(value)}" for col, value in zip(columns, row)) + ")"
+
+
+def diff(expected: dict, actual: dict, order_sensitive: bool = False) -> str:
+    """Explain why two canonical results differ (both assumed unequal)"""
+    expected_cols, actual_cols = expected["columns"], actual["columns"]
+    expected_rows, actual_rows = expected["rows"], actual["rows"]
+
+    if expected_rows and actual_rows and expected_cols != actual_cols:
+        missing = [col for col in expected_cols if col not in actual_cols]
+        extra = [col for col in actual_cols if col not in expected_cols]
+        msg_parts = []
+        if missing:
+            msg_parts.append(f"Missing columns: {', '.join(missing)}")
+        if extra:
+            msg_parts.append(f"Extra columns: {', '.join(extra)}")
+        return "; ".join(msg_parts)
+
+    if len(expected_rows) != len(actual_rows):
+        return f"Row count mismatch: expected {len(expected_rows)} rows, got {len(actual_rows)} rows"
+
+    expected_counts = Counter(map(tuple, expected_rows))
+    actual_counts = Counter(map(tuple, actual_rows))
+    if expected_counts == actual_counts:
+        if order_sensitive:
+            for i, (exp_row, act_row) in enumerate(zip(expected_rows, actual_rows)):
+                if exp_row != act_row:
+                    return (
+                        f"Rows are correct but in the wrong order: row {i+1} should be "
+                        f"{_format_row(expected_cols, exp_row)}, got {_format_row(actual_cols, act_row)}"
+                    )
+        return "Results do not match the expected output"
+
+    missing = list((expected_counts - actual_counts).elements())
+    extra = list((actual_counts - expected_counts).elements())
+    msg_parts = []
+    for label, rows in (("Missing rows", missing), ("Unexpected rows", extra)):
+        if rows:
+            shown = "; ".join(_format_row(expected_cols, row) for row in rows[:MAX_REPORTED_ROWS])
+            more = f" (and {len(rows) - MAX_REPORTED_ROWS} more)" if len(rows) > MAX_REPORTED_ROWS else ""
+            msg_parts.append(f"{label}: {shown}{more}")
+    return " - ".join(msg_parts)
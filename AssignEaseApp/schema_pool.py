@@ -0,0 +1,196 @@
+"""
+Warm pool of seeded SQLite connections for read-only SQL grading.
+
+During a lab every student queries the same DatabaseSchema. Read-only paths
+(SELECT grading and practice queries) lease an in-memory connection that
+already holds the schema and sample data, so they do no setup at all. Idle
+connections are kept per schema hash (see schema_snapshots.snapshot_key):
+
+- at most DATABASE_POOL_SIZE idle connections per schema; extra returns are
+  closed
+- schemas unused for DATABASE_POOL_IDLE_SECONDS are dropped
+- the images of all idle connections together stay under
+  DATABASE_POOL_MAX_BYTES; least recently used schemas are dropped first
+
+A lease runs inside a SAVEPOINT that is rolled back on return, and an
+authorizer refuses anything but reads while the connection is lent out
+(including ATTACH and every PRAGMA except the ones that only describe the
+schema, such as table_info), so no lease can leave state for the next one.
+A connection that cannot be rolled back cleanly is closed, not reused.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.conf import settings
+from .schema_snapshots import SchemaSnapshotCache, snapshot_key
+
+_READ_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+# Pragmas that only describe the schema, as statements (PRAGMA table_info(t))
+# or table-valued functions (SELECT * FROM pragma_table_info('t'))
+READ_ONLY_PRAGMAS = {
+    'table_info',
+    'table_xinfo',
+    'table_list',
+    'index_list',
+    'index_info',
+    'index_xinfo',
+    'foreign_key_list',
+}
+
+
+def _read_only(action, arg1, arg2, db_name, trigger):
+    if action in _READ_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and (arg1 or "").lower() in READ_ONLY_PRAGMAS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_UPDATE and arg1 == 'sqlite_master':
+        # Asked once per connection when a pragma_* table-valued function is
+        # first set up. Statements cannot write sqlite_master anyway without
+        # PRAGMA writable_schema, which is denied above.
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+class SchemaConnectionPool:
+    _lock = threading.Lock()
+    _idle = OrderedDict()  # key -> list of idle connections (LRU order by last use)
+    _sizes = {}  # key -> bytes of one connection's database image
+    _last_used = {}  # key -> monotonic time
+    _leased = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return SchemaSnapshotCache.enabled() and getattr(settings, 'DATABASE_POOL_SIZE', 4) > 0
+
+    @staticmethod
+    def _connect(schema_sql: str, sample_data_sql: str, build):
+        """New seeded connection and the size of its database image"""
+        conn = sqlite3.connect(':memory:', check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            size = SchemaSnapshotCache.restore(conn, schema_sql, sample_data_sql, build)
+        except Exception:
+            conn.close()
+            raise
+        return conn, size
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @classmethod
+    def _take(cls, key: str):
+        """An idle connection for the schema (or None) and its image size"""
+        with cls._lock:
+            cls._evict(time.monotonic())
+            conns = cls._idle.get(key)
+            conn = conns.pop() if conns else None
+            cls._leased += 1
+            return conn, cls._sizes.get(key)
+
+    @classmethod
+    def _give_back(cls, key: str, conn, size=0):
+        """Return a leased connection (None if it was discarded) to the idle list"""
+        now = time.monotonic()
+        with cls._lock:
+            cls._leased -= 1
+            if conn is not None:
+                cls._sizes[key] = size or 0
+                cls._last_used[key] = now
+                conns = cls._idle.setdefault(key, [])
+                cls._idle.move_to_end(key)
+                if len(conns) < getattr(settings, 'DATABASE_POOL_SIZE', 4):
+                    conns.append(conn)
+                    conn = None
+            cls._evict(now)
+        if conn is not None:
+            cls._close(conn)
+
+    @classmethod
+    def _evict(cls, now: float):
+        """Drop idle schemas and, oldest first, whatever exceeds the memory cap (lock held)"""
+        idle_seconds = getattr(settings, 'DATABASE_POOL_IDLE_SECONDS', 300)
+        max_bytes = getattr(settings, 'DATABASE_POOL_MAX_BYTES', 64 * 1024 * 1024)
+        total = sum(cls._sizes.get(key, 0) * len(conns) for key, conns in cls._idle.items())
+        for key in list(cls._idle):
+            conns = cls._idle[key]
+            expired = now - cls._last_used.get(key, now) > idle_seconds
+            if not expired and (not max_bytes or total <= max_bytes):
+                continue
+            while conns and (expired or total > max_bytes):
+                total -= cls._sizes.get(key, 0)
+                cls._close(conns.pop(0))
+            if not conns:
+                del cls._idle[key]
+                cls._sizes.pop(key, None)
+                cls._last_used.pop(key, None)
+
+    @classmethod
+    @contextmanager
+    def lease(cls, schema_sql: str, sample_data_sql: str, build):
+        """
+        Yield a read-only connection seeded with the schema and sample data
+
+        Args:
+            build: schema script runner, as for SchemaSnapshotCache.image
+        """
+        key = snapshot_key(schema_sql, sample_data_sql)
+        conn, size = cls._take(key)
+        try:
+            if conn is None:
+                conn, size = cls._connect(schema_sql, sample_data_sql, build)
+            conn.execute("SAVEPOINT lease")
+            conn.set_authorizer(_read_only)
+        except Exception:
+            cls._give_back(key, None)
+            if conn is not None:
+                cls._close(conn)
+            raise
+
+        try:
+            yield conn
+        finally:
+            try:
+                conn.set_authorizer(None)
+                conn.execute("ROLLBACK TO lease")
+                conn.execute("RELEASE lease")
+            except Exception:
+                cls._close(conn)
+                conn = None
+            cls._give_back(key, conn, size)
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            return {
+                "enabled": cls.enabled(),
+                "schemas": len(cls._idle),
+                "idle_connections": sum(len(conns) for conns in cls._idle.values()),
+                "leased_connections": cls._leased,
+                "bytes": sum(cls._sizes.get(key, 0) * len(conns) for key, conns in cls._idle.items()),
+            }
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # sqlite connections must not cross a fork; the child starts cold
+        cls._lock = threading.Lock()
+        cls._idle = OrderedDict()
+        cls._sizes = {}
+        cls._last_used = {}
+        cls._leased = 0
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=SchemaConnectionPool._reset_after_fork)
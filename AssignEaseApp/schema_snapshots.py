@@ -0,0 +1,128 @@
+"""
+Cache of built SQLite databases for DatabaseService.setup_schema.
+
+Running a DatabaseSchema's schema_sql and sample_data_sql means parsing and
+executing every CREATE and INSERT again for each submission, test query and
+validation. Instead the script is run once into a scratch :memory: database
+whose serialized image is kept, keyed by a sha256 of the SQL. Every later
+connection is seeded with Connection.deserialize(image), which is a copy of
+the pages rather than hundreds of INSERTs. Images are immutable bytes, so
+clones never see each other's writes. Editing a schema changes its hash, so
+stale images are never served; they simply age out of the LRU.
+
+PRAGMA statements in the schema configure the connection rather than the
+file (e.g. foreign_keys), so they are replayed on every clone.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+# Connection.serialize()/deserialize() need Python 3.11+ built against SQLite 3.23+
+SUPPORTED = hasattr(sqlite3.Connection, 'serialize') and hasattr(sqlite3.Connection, 'deserialize')
+
+
+def snapshot_key(schema_sql: str, sample_data_sql: str = "") -> str:
+    digest = hashlib.sha256()
+    digest.update((schema_sql or "").encode('utf-8'))
+    digest.update(b"\0")
+    digest.update((sample_data_sql or "").encode('utf-8'))
+    return digest.hexdigest()
+
+
+def split_statements(sql: str) -> list:
+    return [s.strip() for s in (sql or "").split(';') if s.strip()]
+
+
+class SchemaSnapshotCache:
+    _lock = threading.Lock()
+    _images = OrderedDict()  # key -> (image bytes, pragma statements)
+    _hits = 0
+    _misses = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return SUPPORTED and getattr(settings, 'DATABASE_SNAPSHOT_CACHE_SIZE', 32) > 0
+
+    @classmethod
+    def _lookup(cls, key: str):
+        with cls._lock:
+            entry = cls._images.get(key)
+            if entry is not None:
+                cls._images.move_to_end(key)
+                cls._hits += 1
+            else:
+                cls._misses += 1
+            return entry
+
+    @classmethod
+    def _store(cls, key: str, entry):
+        size = getattr(settings, 'DATABASE_SNAPSHOT_CACHE_SIZE', 32)
+        max_bytes = getattr(settings, 'DATABASE_SNAPSHOT_MAX_BYTES', 16 * 1024 * 1024)
+        if max_bytes and len(entry[0]) > max_bytes:
+            return
+        with cls._lock:
+            cls._images[key] = entry
+            cls._images.move_to_end(key)
+            while len(cls._images) > size:
+                cls._images.popitem(last=False)
+
+    @classmethod
+    def image(cls, schema_sql: str, sample_data_sql: str, build):
+        """
+        Serialized database for the schema, building it on a miss.
+
+        Args:
+            build: callable(conn, schema_sql, sample_data_sql) running the script
+                   on a fresh connection; its exceptions propagate and nothing
+                   is cached
+
+        Returns:
+            Tuple of (image bytes, pragma statements to replay)
+        """
+        key = snapshot_key(schema_sql, sample_data_sql)
+        entry = cls._lookup(key)
+        if entry is not None:
+            return entry
+
+        scratch = sqlite3.connect(':memory:')
+        try:
+            build(scratch, schema_sql, sample_data_sql)
+            entry = (scratch.serialize(), tuple(
+                s for s in split_statements(schema_sql) if s[:6].upper() == 'PRAGMA'
+            ))
+        finally:
+            scratch.close()
+        # Two requests may build the same schema at once; the last one stored wins
+        cls._store(key, entry)
+        return entry
+
+    @classmethod
+    def restore(cls, conn, schema_sql: str, sample_data_sql: str, build):
+        """Seed ``conn`` with the schema's cached image and return the image size in bytes"""
+        image, pragmas = cls.image(schema_sql, sample_data_sql, build)
+        conn.deserialize(image)
+        for statement in pragmas:
+            conn.execute(statement)
+        return len(image)
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            return {
+                "enabled": cls.enabled(),
+                "snapshots": len(cls._images),
+                "bytes": sum(len(image) for image, _ in cls._images.values()),
+                "hits": cls._hits,
+                "misses": cls._misses,
+            }
+
+    @classmethod
+    def _reset_after_fork(cls):
+        cls._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):  # POSIX only
+    os.register_at_fork(after_in_child=SchemaSnapshotCache._reset_after_fork)
@@ -1,9 +1,10 @@
 from rest_framework import serializers
-from .models import Profile, Class, ClassStudent, ProgrammingLanguage, Assignment, Contact, BugReport, AssignmentQuestion, CodingQuestion, CodingTestCase, NonCodingQuestion, Submission, TeacherFeedback, AssignmentAttachment, SubmissionFile, NonCodingSubmission, NonCodingSubmissionFile, TestCase, TestCaseResult, AIEvaluation, DatabaseSchema, DatabaseQuestion, DatabaseSubmission
+from .models import Profile, Class, ClassStudent, ProgrammingLanguage, Assignment, Contact, BugReport, AssignmentQuestion, CodingQuestion, CodingTestCase, NonCodingQuestion, Submission, TeacherFeedback, AssignmentAttachment, SubmissionFile, NonCodingSubmission, NonCodingSubmissionFile, TestCase, TestCaseResult, GradingJob, AIEvaluation, DatabaseSchema, DatabaseQuestion, DatabaseSubmission
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
+from .blob_storage import BlobStore
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
@@ -209,7 +210,7 @@ class TestCaseSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TestCase
-        fields = ['id', 'question', 'input', 'expected_output', 'marks', 'visibility', 'timeout', 'memory_limit']
+        fields = ['id', 'question', 'input', 'expected_output', 'marks', 'visibility', 'timeout', 'memory_limit', 'checker', 'float_tolerance']
 
     def validate(self, data):
         question = data.get('question')
@@ -245,15 +246,51 @@ class TestCaseResultSerializer(serializers.ModelSerializer):
             return None
 
 
-class CodingTestCaseSerializer(serializers.ModelSerializer):
+class TestDataPreviewMixin:
+    """
+    Shared by the test case serializers. On a blob-backed test case,
+    ``input`` / ``expected_output`` are previews (see TestDataBlobs), and
+    saving an edited preview would replace the full data with it. For those
+    fields only the unchanged preview or a complete new value (larger than
+    TESTCASE_BLOB_THRESHOLD) is accepted.
+    """
+
+    def get_data_truncated(self, obj):
+        # input/expected_output are previews; full data at .../<id>/data/
+        return obj.data_truncated
+
+    def validate_test_data(self, data):
+        if not isinstance(self.instance, (TestCase, CodingTestCase)):
+            return
+        errors = {}
+        for field in self.instance.TEST_DATA_FIELDS:
+            if field not in data or not getattr(self.instance, f"{field}_blob"):
+                continue
+            value = data[field] or ""
+            if value == getattr(self.instance, field) or len(value.encode('utf-8')) > BlobStore.threshold():
+                continue
+            errors[field] = (
+                "Only a preview of this field is stored here, so it cannot be edited; "
+                "send the complete new value or create a new test case."
+            )
+        if errors:
+            raise ValidationError(errors)
+
+
+class CodingTestCaseSerializer(TestDataPreviewMixin, serializers.ModelSerializer):
     question = serializers.PrimaryKeyRelatedField(queryset=CodingQuestion.objects.all())
     input = serializers.CharField(required=False, allow_blank=True, default='')
     expected_output = serializers.CharField(required=False, allow_blank=True, default='')
+    data_truncated = serializers.SerializerMethodField()
 
     class Meta:
         model = CodingTestCase
-        fields = ['id', 'question', 'input', 'expected_output', 'marks', 'visibility', 'timeout', 'memory_limit', 'created_at']
-        read_only_fields = ['created_at']
+        fields = ['id', 'question', 'input', 'expected_output', 'marks', 'visibility', 'timeout', 'memory_limit', 'input_size', 'expected_output_size', 'data_truncated', 'created_at']
+        read_only_fields = ['input_size', 'expected_output_size', 'created_at']
+
+    def validate(self, data):
+        self.validate_test_data(data)
+        return data
 
     def create(self, validated_data):
         return CodingTestCase.objects.create(**validated_data)
@@ -293,7 +330,7 @@ class AssignmentQuestionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = AssignmentQuestion
-        fields = ['id', 'title', 'assignment', 'total_marks', 'testcases', 'created_at']
+        fields = ['id', 'title', 'assignment', 'total_marks', 'grading_policy', 'max_consecutive_failures', 'testcases', 'created_at']
     
     def get_testcases(self, obj):
         # Only return public testcases for students, all for teachers
@@ -328,6 +365,7 @@ class AssignmentSerializer(serializers.ModelSerializer):
             'class_assigned','teacher','language','language_version',
             'assignment_type','assignment_type_display',
             'submission_type','submission_type_display',
+            'grading_policy','max_consecutive_failures',
             'is_submitted','attachments'
         ]
         read_only_fields = ['teacher']
@@ -767,17 +805,20 @@ class NonCodingSubmissionSerializer(serializers.ModelSerializer):
         return None
 
 # New serializer for TestCase
-class TestCaseSerializer(serializers.ModelSerializer):
+class TestCaseSerializer(TestDataPreviewMixin, serializers.ModelSerializer):
     question = serializers.PrimaryKeyRelatedField(queryset=AssignmentQuestion.objects.all())
+    data_truncated = serializers.SerializerMethodField()
 
     class Meta:
         model = TestCase
-        fields = ['id', 'question', 'input', 'expected_output', 'marks', 'visibility', 'timeout', 'memory_limit']
+        fields = ['id', 'question', 'input', 'expected_output', 'marks', 'visibility', 'timeout', 'memory_limit', 'checker', 'float_tolerance', 'input_size', 'expected_output_size', 'data_truncated']
+        read_only_fields = ['input_size', 'expected_output_size']
 
     def validate(self, data):
         question = data.get('question')
         if question and question.assignment.assignment_type != 'coding':
             raise ValidationError({"question": "Test cases can only be added to coding assignment questions."})
+        self.validate_test_data(data)
         return data
 
     def create(self, validated_data):
@@ -808,6 +849,25 @@ class TestCaseResultSerializer(serializers.ModelSerializer):
         except Exception:
             return None
 
+class GradingJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GradingJob
+        fields = [
+            'id', 'submission', 'status', 'total_testcases', 'completed_testcases',
+            'passed_testcases', 'progress', 'attempts', 'error', 'created_at', 'updated_at',
+            'started_at', 'completed_at'
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        """Percentage of test cases run so far (not the score)"""
+        if not obj.total_testcases:
+            return 0
+        return obj.completed_testcases / obj.total_testcases * 100
+
+
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
@@ -920,7 +980,7 @@ class DatabaseQuestionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = DatabaseQuestion
-        fields = '__all__'
+        exclude = ['expected_result_normalized', 'expected_result_hash']
         read_only_fields = ['created_at', 'updated_at']
 
 
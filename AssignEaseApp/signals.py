@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Submission, AIEvaluation, Assignment, DatabaseSubmission, NonCodingSubmission
+from .models import Submission, AIEvaluation, Assignment, DatabaseSubmission, NonCodingSubmission, ProgrammingLanguage
+from .language_registry import LanguageRegistry
 from .ai_worker import run_ai_background
 from .email_service import EmailService
 import logging
@@ -86,6 +88,15 @@ def _sync_ai_evaluation(*, lookup, assignment, student, question=None, question_
 
     return ai, should_rerun
 
+@receiver(post_save, sender=ProgrammingLanguage)
+@receiver(post_delete, sender=ProgrammingLanguage)
+def invalidate_language_registry(sender, instance, **kwargs):
+    """Reload the resolved-language index after languages change"""
+    LanguageRegistry.invalidate()
+    # Again once committed, in case another thread reloaded the old rows meanwhile
+    transaction.on_commit(LanguageRegistry.invalidate)
+
+
 # Signal for Assignment creation
 @receiver(post_save, sender=Assignment)
 def notify_on_assignment_creation(sender, instance, created, **kwargs):
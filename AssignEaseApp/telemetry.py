@@ -0,0 +1,75 @@
+"""
+Aggregate execution telemetry recorded on TestCaseResult.
+
+Every graded test case stores its wall time (queued -> result), backend
+round trip, queue wait, program run time, memory, bytes sent/received and
+whether the result came from the execution cache. execution_stats() groups
+the rows of a time window by language and backend and reports
+p50/p95/p99 of each timing, which is what sizing the sandbox fleet needs.
+Used by GET /api/execution-stats/ and the ``execution_stats`` command.
+"""
+from datetime import timedelta
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import TestCaseResult
+
+TIMINGS = ("wall_time", "backend_time", "queue_wait", "execution_time", "memory_used")
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None if empty)"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))  # ceil
+    return sorted_values[rank - 1]
+
+
+def execution_stats(days: float = 7, assignment_id=None) -> list:
+    """
+    Per (language, backend) execution statistics over the last ``days`` days.
+
+    Returns:
+        List of dicts with language, backend, executions, cache_hits,
+        cache_hit_rate, bytes_in, bytes_out and, per timing, a
+        {"p50", "p95", "p99"} dict (seconds; memory_used in KB)
+    """
+    rows = TestCaseResult.objects.exclude(backend="").annotate(
+        recorded_at=Coalesce("updated_at", "created_at"),
+        language=F("submission__assignment__language"),
+    ).filter(recorded_at__gte=timezone.now() - timedelta(days=days))
+    if assignment_id:
+        rows = rows.filter(submission__assignment_id=assignment_id)
+
+    groups = {}
+    for row in rows.values_list("language", "backend", "cache_hit", "bytes_in", "bytes_out", *TIMINGS).iterator():
+        language, backend, cache_hit, bytes_in, bytes_out = row[:5]
+        group = groups.setdefault(((language or "").lower(), backend), {
+            "executions": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0,
+            "values": {timing: [] for timing in TIMINGS},
+        })
+        group["executions"] += 1
+        group["cache_hits"] += bool(cache_hit)
+        group["bytes_in"] += bytes_in or 0
+        group["bytes_out"] += bytes_out or 0
+        for timing, value in zip(TIMINGS, row[5:]):
+            if value is not None:
+                group["values"][timing].append(value)
+
+    stats = []
+    for (language, backend), group in sorted(groups.items()):
+        entry = {
+            "language": language,
+            "backend": backend,
+            "executions": group["executions"],
+            "cache_hits": group["cache_hits"],
+            "cache_hit_rate": group["cache_hits"] / group["executions"],
+            "bytes_in": group["bytes_in"],
+            "bytes_out": group["bytes_out"],
+        }
+        for timing, values in group["values"].items():
+            values.sort()
+            entry[timing] = {f"p{pct}": percentile(values, pct) for pct in PERCENTILES}
+        stats.append(entry)
+    return stats
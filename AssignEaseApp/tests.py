@@ -1,3 +1,1373 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import piston_batch, result_compare, schema_snapshots
+from .blob_storage import BlobStore
+from .checkers import (
+    cap_output, check_exact, check_float, check_tokens, check_unordered,
+    check_whitespace, outputs_match,
+)
+from .circuit_breaker import CircuitBreaker
+from .database_service import DatabaseExecutionError, DatabaseService
+from .execution_backends import ExecutionBackendError, LocalSandboxBackend
+from .execution_cache import ExecutionCache
+from .execution_load import ExecutionLoad
+from .execution_pool import ExecutionPool
+from .execution_router import ExecutionRouter
+from .grading_service import GradingService
+from .grading_worker import enqueue_grading, recover_stale_jobs, run_grading_job
+from .http_client import AsyncHttpClient
+from .judge0_service import Judge0Service
+from .language_registry import LanguageRegistry
+from .models import (
+    Assignment, AssignmentQuestion, Class, DatabaseQuestion, GradingJob, Profile, ProgrammingLanguage, Submission,
+    TestCase as GradedTestCase, TestCaseResult,
+)
+from .piston_service import PistonService
+from .rate_limit import ExecutionRateLimiter
+from .reference_solution import check_reference_solution
+from .schema_pool import SchemaConnectionPool
+from .schema_snapshots import SchemaSnapshotCache, snapshot_key
+from .serializers import TestCaseSerializer
+from .telemetry import execution_stats, percentile
+
+
+class CheckerTests(SimpleTestCase):
+    def test_exact_ignores_surrounding_whitespace_only(self):
+        self.assertTrue(check_exact("  3 4\n\n", "3 4"))
+        self.assertFalse(check_exact("3  4", "3 4"))
+        self.assertTrue(check_exact("", "  \n"))
+
+    def test_whitespace_collapses_runs_and_trailing_blank_lines(self):
+        self.assertTrue(check_whitespace("a   b \t\nc\n\n\n", "a b\nc"))
+        self.assertFalse(check_whitespace("a b c", "a b\nc"))
+
+    def test_tokens_ignores_line_breaks(self):
+        self.assertTrue(check_tokens("1\n2   3\n", "1 2 3"))
+        self.assertFalse(check_tokens("1 2", "1 2 3"))
+
+    def test_float_tolerance_is_absolute_or_relative(self):
+        self.assertTrue(check_float("0.3333334", "0.3333333"))
+        self.assertFalse(check_float("0.34", "0.33"))
+        self.assertTrue(check_float("1000001", "1000000", tolerance=1e-6))
+        self.assertTrue(check_float("0.31", "0.3", tolerance=0.1))
+        self.assertTrue(check_float("nan x", "nan x"))
+        self.assertFalse(check_float("1.0", "1.0 2.0"))
+
+    def test_unordered_compares_line_multisets(self):
+        self.assertTrue(check_unordered("b\na\n\na\n", "a\na\nb"))
+        self.assertFalse(check_unordered("a\nb", "a\na\nb"))
+        self.assertFalse(check_unordered("a\na\nb", "a\nb"))
+
+    def test_outputs_match_uses_the_test_case_checker(self):
+        testcase = SimpleNamespace(checker="unordered", expected_output_text="x\ny", float_tolerance=None)
+        self.assertTrue(outputs_match(testcase, "y\nx"))
+        testcase.checker = ""
+        self.assertFalse(outputs_match(testcase, "y\nx"))
+
+    @override_settings(TESTCASE_MAX_OUTPUT_CHARS=5)
+    def test_cap_output(self):
+        self.assertEqual(cap_output("abcdefgh"), ("abcde", True))
+        self.assertEqual(cap_output(None), ("", False))
+
+
+class ResultCompareTests(SimpleTestCase):
+    ROWS = [{"id": 1, "name": "a"}, {"id": 2, "name": None}, {"id": 2, "name": None}]
+
+    def test_multiset_hash_ignores_row_and_column_order(self):
+        reordered = [{"name": None, "id": 2}, {"name": "a", "id": 1}, {"name": None, "id": 2}]
+        self.assertEqual(
+            result_compare.result_hash(result_compare.canonical(self.ROWS)),
+            result_compare.result_hash(result_compare.canonical(reordered)),
+        )
+
+    def test_multiset_hash_counts_duplicates(self):
+        fewer = self.ROWS[:2] + [{"id": 1, "name": "a"}]
+        self.assertNotEqual(
+            result_compare.result_hash(result_compare.canonical(self.ROWS)),
+            result_compare.result_hash(result_compare.canonical(fewer)),
+        )
+
+    def test_null_differs_from_the_string_none(self):
+        self.assertNotEqual(
+            result_compare.result_hash(result_compare.canonical([{"a": None}])),
+            result_compare.result_hash(result_compare.canonical([{"a": "None"}])),
+        )
+
+    def test_values_are_compared_as_stripped_strings(self):
+        self.assertEqual(
+            result_compare.result_hash(result_compare.canonical([{"a": 1}])),
+            result_compare.result_hash(result_compare.canonical([{"a": " 1 "}])),
+        )
+
+    def test_order_sensitive_hash_depends_on_row_order(self):
+        canon = result_compare.canonical(self.ROWS)
+        reversed_canon = result_compare.canonical(list(reversed(self.ROWS)))
+        self.assertNotEqual(
+            result_compare.result_hash(canon, order_sensitive=True),
+            result_compare.result_hash(reversed_canon, order_sensitive=True),
+        )
+        self.assertNotEqual(
+            result_compare.result_hash(canon, order_sensitive=True),
+            result_compare.result_hash(canon, order_sensitive=False),
+        )
+
+    def test_is_current_checks_version_and_mode(self):
+        digest = result_compare.result_hash(result_compare.canonical(self.ROWS), order_sensitive=True)
+        self.assertTrue(result_compare.is_current(digest, order_sensitive=True))
+        self.assertFalse(result_compare.is_current(digest, order_sensitive=False))
+        self.assertFalse(result_compare.is_current("0" * 64))
+
+    def test_diff_explains_the_mismatch(self):
+        expected = result_compare.canonical(self.ROWS)
+        self.assertIn("Row count mismatch", result_compare.diff(expected, result_compare.canonical(self.ROWS[:2])))
+        self.assertIn(
+            "wrong order",
+            result_compare.diff(expected, result_compare.canonical(list(reversed(self.ROWS))), order_sensitive=True),
+        )
+        self.assertEqual(
+            result_compare.diff(expected, result_compare.canonical([{"id": 1}, {"id": 2}, {"id": 3}])),
+            "Missing columns: name",
+        )
+
+
+@override_settings(
+    EXECUTION_RATE_LIMIT_ENABLED=True,
+    EXECUTION_RATE_LIMIT_CACHE='default',
+    EXECUTION_USER_RATE=0.001,
+    EXECUTION_USER_BURST=5,
+    EXECUTION_GLOBAL_RATE=0.001,
+    EXECUTION_GLOBAL_BURST=8,
+    EXECUTION_MAX_QUEUED=3,
+)
+class ExecutionRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        ExecutionRateLimiter._cache().clear()
+
+    def test_user_burst_then_retry_delay(self):
+        user = SimpleNamespace(pk=1)
+        self.assertIsNone(ExecutionRateLimiter.check(user, 5))
+        wait = ExecutionRateLimiter.check(user, 1)
+        self.assertGreater(wait, 0)
+
+    def test_users_have_separate_buckets(self):
+        self.assertIsNone(ExecutionRateLimiter.check(SimpleNamespace(pk=1), 5))
+        self.assertIsNone(ExecutionRateLimiter.check(SimpleNamespace(pk=2), 3))
+
+    def test_user_tokens_are_refunded_when_the_global_bucket_is_empty(self):
+        self.assertIsNone(ExecutionRateLimiter.check(SimpleNamespace(pk=1), 5))
+        self.assertIsNotNone(ExecutionRateLimiter.check(SimpleNamespace(pk=2), 5))
+        # pk=2 was refused by the global bucket, so its own bucket is still full
+        tokens, _ = ExecutionRateLimiter._cache().get("ratelimit:exec:user:2")
+        self.assertAlmostEqual(tokens, 5, places=2)
+
+    def test_sheds_load_while_executions_are_outstanding(self):
+        with ExecutionLoad.track(3):
+            self.assertEqual(ExecutionRateLimiter.check(SimpleNamespace(pk=1), 1), 1.0)
+        self.assertIsNone(ExecutionRateLimiter.check(SimpleNamespace(pk=1), 1))
+
+    @override_settings(EXECUTION_RATE_LIMIT_ENABLED=False)
+    def test_disabled(self):
+        for _ in range(3):
+            self.assertIsNone(ExecutionRateLimiter.check(SimpleNamespace(pk=1), 100))
+
+
+@override_settings(
+    CIRCUIT_BREAKER_ENABLED=True,
+    CIRCUIT_BREAKER_WINDOW=60,
+    CIRCUIT_BREAKER_MIN_CALLS=4,
+    CIRCUIT_BREAKER_FAILURE_RATE=0.5,
+    CIRCUIT_BREAKER_OPEN_SECONDS=30,
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS={'test': 5},
+)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('AssignEaseApp.circuit_breaker.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test')
+
+    def call(self, failed, duration=0.1):
+        ticket = self.breaker.allow()
+        self.assertIsNotNone(ticket)
+        self.breaker.record(ticket, failed, duration)
+
+    def trip(self):
+        for failed in (True, True, False, True):
+            self.call(failed)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_stays_closed_below_min_calls_or_failure_rate(self):
+        for failed in (True, True, True):
+            self.call(failed)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker = CircuitBreaker('test')
+        for failed in (True, False, False, False, False):
+            self.call(failed)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(4):
+            self.call(False, duration=6)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_open_refuses_until_a_single_probe_is_due(self):
+        self.trip()
+        self.assertIsNone(self.breaker.allow())
+        self.now += 31
+        probe = self.breaker.allow()
+        self.assertIsNotNone(probe)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertIsNone(self.breaker.allow())
+
+    def test_probe_success_closes_and_failure_reopens(self):
+        self.trip()
+        self.now += 31
+        self.breaker.record(self.breaker.allow(), True, 0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 31
+        self.breaker.record(self.breaker.allow(), False, 0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.snapshot()["calls"], 0)
+
+    def test_only_the_probe_decides_in_half_open(self):
+        stale = self.breaker.allow()  # let through while closed, finishes late
+        self.trip()
+        self.now += 31
+        probe = self.breaker.allow()
+        self.breaker.record(stale, False, 0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.record(stale, True, 0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.record(probe, False, 0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        # The probe's ticket is spent once the state changed
+        self.breaker.record(probe, True, 0.1)
+        self.assertEqual(self.breaker.snapshot()["calls"], 0)
+
+    @override_settings(CIRCUIT_BREAKER_ENABLED=False)
+    def test_disabled_breaker_always_allows(self):
+        for _ in range(10):
+            self.call(True)
+        self.assertIsNotNone(self.breaker.allow())
+
+
+class Judge0BatchTests(SimpleTestCase):
+    def test_batch_tokens_mark_rejected_submissions(self):
+        created = [{"token": "a"}, {"error": "bad language"}, "oops"]
+        self.assertEqual(Judge0Service._batch_tokens(created, 4), ["a", None, None, None])
+        self.assertEqual(Judge0Service._batch_tokens([], 2), [None, None])
+
+    def test_collect_finished_keeps_queued_tokens_pending(self):
+        results = {}
+        pending = Judge0Service._collect_finished(
+            ["a", "b", "c", "d"],
+            [
+                {"token": "a", "status": {"id": 1}},
+                {"token": "b", "status": {"id": 3}},
+                {"token": "c", "status": {"id": 2}},
+                {"token": "d", "status": {"id": 6}},
+            ],
+            results,
+        )
+        self.assertEqual(pending, ["a", "c"])
+        self.assertEqual(sorted(results), ["b", "d"])
+        self.assertEqual(results["d"]["status"]["id"], 6)
+
+    def test_null_status_is_treated_as_finished(self):
+        results = {}
+        pending = Judge0Service._collect_finished(["a", "b"], [{"token": "a", "status": None}, None], results)
+        self.assertEqual(pending, [])
+        testcase = SimpleNamespace(checker="", expected_output_text="1", float_tolerance=None)
+        interpreted = Judge0Service._interpret_result(dict(results["a"], stdout="1"), testcase)
+        self.assertFalse(interpreted["passed"])
+        self.assertEqual(interpreted["error_message"], "Unknown")
+
+
+def _frame(index, exit_code, stdout, stderr=""):
+    out, err = stdout.encode('utf-8'), stderr.encode('utf-8')
+    return f"\n@@ASSIGNEASE {index} {exit_code} {len(out)} {len(err)}@@\n{stdout}{stderr}"
+
+
+class PistonBatchParseTests(SimpleTestCase):
+    def test_splits_cases_by_byte_length(self):
+        stdout = _frame(0, 0, "héllo\n@@ASSIGNEASE 9 0 0 0@@\n") + _frame(1, -1, "", "Traceback\n")
+        self.assertEqual(piston_batch.parse_stdout(stdout, 2), [
+            {"stdout": "héllo\n@@ASSIGNEASE 9 0 0 0@@\n", "stderr": "", "exit_code": 0},
+            {"stdout": "", "stderr": "Traceback\n", "exit_code": -1},
+        ])
+
+    def test_rejects_truncated_or_malformed_output(self):
+        with self.assertRaises(ValueError):
+            piston_batch.parse_stdout(_frame(0, 0, "abc")[:-1], 1)
+        with self.assertRaises(ValueError):
+            piston_batch.parse_stdout(_frame(1, 0, "abc"), 1)
+        with self.assertRaises(ValueError):
+            piston_batch.parse_stdout(_frame(0, 0, "abc"), 2)
+        with self.assertRaises(ValueError):
+            piston_batch.parse_stdout("plain output", 1)
+
+    def test_partial_keeps_the_complete_leading_cases(self):
+        stdout = _frame(0, 0, "one\n") + _frame(1, 0, "two\n")[:-2]
+        self.assertEqual(piston_batch.parse_stdout(stdout, 3, partial=True), [
+            {"stdout": "one\n", "stderr": "", "exit_code": 0},
+        ])
+        self.assertEqual(piston_batch.parse_stdout("killed", 3, partial=True), [])
+
+    def test_no_cases(self):
+        self.assertEqual(piston_batch.parse_stdout("", 0), [])
+
+    def test_encode_stdin_prefixes_byte_lengths(self):
+        self.assertEqual(piston_batch.encode_stdin(["é", None], 2), "2 2\n2\né0\n")
+
+
+class GradingTestMixin:
+    """Coding question with five test cases; execution is replaced by ``fake_run``"""
+
+    def setUp(self):
+        patcher = mock.patch('AssignEaseApp.signals.run_ai_background')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'x')
+        student = User.objects.create_user('student', 'student@example.com', 'x')
+        klass = Class.objects.create(class_name='C1', teacher=teacher)
+        self.assignment = Assignment.objects.create(
+            class_assigned=klass, teacher=teacher, title='A1', description='', due_date=date(2030, 1, 1),
+            language='python', language_version='3.10.0',
+        )
+        self.question = AssignmentQuestion.objects.create(assignment=self.assignment, title='Q1', total_marks=10)
+        self.testcases = [
+            GradedTestCase.objects.create(question=self.question, input=str(i), expected_output=str(i * 2))
+            for i in range(5)
+        ]
+        self.submission = Submission.objects.create(
+            student=student, assignment=self.assignment, question=self.question,
+            code='print(int(input()) * 2)', status='submitted',
+        )
+
+        self.executed = []
+        self.compile_error = False
+        self.failing = set()
+        patcher = mock.patch.object(GradingService, 'run_testcases', side_effect=self.fake_run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_run(self, source_code, language, version, testcases, judge0_language_id=None):
+        results = []
+        for tc in testcases:
+            self.executed.append(tc.id)
+            passed = not self.compile_error and tc.id not in self.failing
+            results.append({
+                "testcase": tc,
+                "stdout": tc.expected_output if passed else "",
+                "stderr": "" if passed else "error",
+                "passed": passed,
+                "compile_error": self.compile_error,
+                "backend": "piston",
+                "wall_time": 0.5,
+                "bytes_in": 10,
+            })
+        return results
+
+    def statuses(self):
+        return list(
+            TestCaseResult.objects.filter(submission=self.submission).order_by('testcase_id').values_list('status', flat=True)
+        )
+
+
+class GradingPolicyTests(GradingTestMixin, TestCase):
+    def test_policy_falls_back_to_the_assignment(self):
+        self.assignment.grading_policy = 'stop_after_failures'
+        self.assignment.max_consecutive_failures = 4
+        self.assignment.save()
+        self.assertEqual(GradingService.grading_policy(self.question), ('stop_after_failures', 4))
+
+        self.question.grading_policy = 'run_all'
+        self.question.max_consecutive_failures = 0
+        self.assertEqual(GradingService.grading_policy(self.question), ('run_all', 1))
+
+    def test_run_all(self):
+        self.failing = {self.testcases[0].id, self.testcases[1].id}
+        summary = GradingService.evaluate_submission(self.submission)
+        self.assertEqual(len(self.executed), 5)
+        self.assertEqual(summary["passed_testcases"], 3)
+        self.assertEqual(summary["skipped_testcases"], 0)
+        self.assertAlmostEqual(summary["auto_marks"], 6.0)
+
+    def test_stop_on_compile_error_probes_the_first_case(self):
+        self.question.grading_policy = 'stop_on_compile_error'
+        self.question.save()
+        self.compile_error = True
+        summary = GradingService.evaluate_submission(self.submission)
+        self.assertEqual(self.executed, [self.testcases[0].id])
+        self.assertEqual(summary["skipped_testcases"], 4)
+        self.assertEqual(self.statuses(), ['failed'] + ['skipped'] * 4)
+
+    def test_stop_on_compile_error_runs_everything_when_it_compiles(self):
+        self.question.grading_policy = 'stop_on_compile_error'
+        self.question.save()
+        summary = GradingService.evaluate_submission(self.submission)
+        self.assertEqual(len(self.executed), 5)
+        self.assertEqual(summary["passed_testcases"], 5)
+
+    @override_settings(EXECUTION_MAX_PER_SUBMISSION=2)
+    def test_stop_after_failures_runs_whole_waves(self):
+        self.question.grading_policy = 'stop_after_failures'
+        self.question.max_consecutive_failures = 2
+        self.question.save()
+        self.failing = {tc.id for tc in self.testcases[1:3]}
+        summary = GradingService.evaluate_submission(self.submission)
+        # Rounds of two: case 3 ran alongside the case that hit the limit and is discarded
+        self.assertEqual(self.executed, [tc.id for tc in self.testcases[:4]])
+        self.assertEqual(summary["skipped_testcases"], 2)
+        self.assertEqual(summary["passed_testcases"], 1)
+        self.assertEqual(self.statuses(), ['passed', 'failed', 'failed', 'skipped', 'skipped'])
+
+    @override_settings(EXECUTION_MAX_PER_SUBMISSION=2)
+    def test_stop_after_failures_round_covers_the_remaining_budget(self):
+        self.question.grading_policy = 'stop_after_failures'
+        self.question.max_consecutive_failures = 4
+        self.question.save()
+        rounds = []
+        GradingService.run_testcases.side_effect = lambda **job: rounds.append(len(job["testcases"])) or self.fake_run(**job)
+        self.failing = {tc.id for tc in self.testcases}
+        summary = GradingService.evaluate_submission(self.submission)
+        self.assertEqual(rounds, [4])
+        self.assertEqual(summary["skipped_testcases"], 1)
+
+
+class GradingReuseTests(GradingTestMixin, TestCase):
+    def test_grading_hash_covers_code_and_test_case(self):
+        tc = self.testcases[0]
+        digest = GradingService.grading_hash('code', 'Python', '3.10.0', tc)
+        self.assertEqual(digest, GradingService.grading_hash('code', 'python', '3.10.0', tc))
+        self.assertNotEqual(digest, GradingService.grading_hash('code2', 'python', '3.10.0', tc))
+        tc.checker = 'tokens'
+        self.assertNotEqual(digest, GradingService.grading_hash('code', 'python', '3.10.0', tc))
+
+    def test_unchanged_results_are_reused(self):
+        GradingService.evaluate_submission(self.submission)
+        self.executed.clear()
+        summary = GradingService.evaluate_submission(self.submission, reuse_results=True)
+        self.assertEqual(self.executed, [])
+        self.assertEqual(summary["reused_testcases"], 5)
+        self.assertEqual(summary["passed_testcases"], 5)
+
+    def test_edited_test_case_is_run_again(self):
+        GradingService.evaluate_submission(self.submission)
+        self.executed.clear()
+        edited = self.testcases[3]
+        edited.expected_output = '7'
+        edited.save()
+        self.failing = {edited.id}
+        summary = GradingService.evaluate_submission(self.submission, reuse_results=True)
+        self.assertEqual(self.executed, [edited.id])
+        self.assertEqual(summary["reused_testcases"], 4)
+        self.assertEqual(summary["passed_testcases"], 4)
+
+    def test_without_reuse_everything_runs(self):
+        GradingService.evaluate_submission(self.submission)
+        self.executed.clear()
+        GradingService.evaluate_submission(self.submission)
+        self.assertEqual(len(self.executed), 5)
+
+
+class AsyncLanguageResolutionTests(GradingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        ProgrammingLanguage.objects.create(display_name='Kotlin', piston_name='kotlin', judge0_language_id=78)
+        LanguageRegistry.invalidate()
+        self.addCleanup(LanguageRegistry.invalidate)
+
+    @staticmethod
+    def backend_results(source_code, language_id, testcases):
+        return [{"status": "passed", "passed": True, "actual_output": tc.expected_output} for tc in testcases]
+
+    @override_settings(GRADING_BACKEND='auto')
+    async def test_cold_registry_is_loaded_off_the_event_loop(self):
+        with mock.patch.object(ExecutionRouter, 'order', side_effect=lambda candidates: list(reversed(candidates))), \
+                mock.patch.object(Judge0Service, 'aevaluate_testcases', side_effect=self.backend_results) as judge0:
+            results = await GradingService.arun_testcases('code', 'Kotlin', '1.8', self.testcases)
+        self.assertEqual(judge0.call_args.args[1], 78)
+        self.assertTrue(all(r["passed"] for r in results))
+
+    @override_settings(GRADING_BACKEND='judge0')
+    async def test_judge0_language_id_is_resolved_before_awaiting(self):
+        with mock.patch.object(Judge0Service, 'aevaluate_testcases', side_effect=self.backend_results) as judge0:
+            await GradingService.arun_testcases('code', 'kotlin', '1.8', self.testcases)
+        self.assertEqual(judge0.call_args.args[1], 78)
+
+
+def _decode_batch_stdin(stdin):
+    header, _, rest = stdin.encode('utf-8').partition(b"\n")
+    inputs, pos = [], 0
+    for _ in range(int(header.split()[0])):
+        newline = rest.index(b"\n", pos)
+        length = int(rest[pos:newline])
+        inputs.append(rest[newline + 1:newline + 1 + length].decode('utf-8'))
+        pos = newline + 1 + length
+    return inputs
+
+
+@override_settings(
+    EXECUTION_CACHE_ENABLED=True,
+    EXECUTION_CACHE_ALIAS='default',
+    PISTON_BATCH_EXECUTION=True,
+    PISTON_MAX_RUN_TIMEOUT_MS=3000,
+    PISTON_BATCH_MAX_CASES=32,
+)
+class PistonBatchExecutionTests(SimpleTestCase):
+    """The fake server echoes each input doubled; it finishes ``per_execution`` cases per batch"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.calls = []
+        self.per_execution = None
+        patcher = mock.patch.object(PistonService, '_execute', side_effect=self.fake_execute)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_execute(self, payload, timeout=30):
+        if len(payload["files"]) == 1:
+            self.calls.append(("run", payload.get("run_timeout")))
+            return {"run": {"stdout": payload["stdin"] * 2, "stderr": "", "code": 0}}
+        inputs = _decode_batch_stdin(payload["stdin"])
+        self.calls.append(("batch", len(inputs)))
+        done = inputs if self.per_execution is None else inputs[:self.per_execution]
+        return {"run": {"stdout": "".join(_frame(i, 0, stdin * 2) for i, stdin in enumerate(done)), "code": 0}}
+
+    def test_default_time_limit_batches_every_case_in_one_execution(self):
+        results = PistonService.run_batch("print(input()*2)", "python", "3.10.0", list("abcde"), timeout=2)
+        self.assertEqual(self.calls, [("batch", 5)])
+        self.assertEqual([r["stdout"] for r in results], ["aa", "bb", "cc", "dd", "ee"])
+
+    def test_cases_cut_off_by_the_server_run_in_the_next_execution(self):
+        self.per_execution = 2
+        results = PistonService.run_batch("code", "python", "3.10.0", list("abcde"), timeout=2)
+        self.assertEqual(self.calls, [("batch", 5), ("batch", 3), ("run", 2000)])
+        self.assertEqual([r["stdout"] for r in results], ["aa", "bb", "cc", "dd", "ee"])
+
+    def test_no_readable_result_falls_back_to_a_run_per_case(self):
+        self.per_execution = 0
+        PistonService.run_batch("code", "python", "3.10.0", list("abc"), timeout=2)
+        self.assertEqual(self.calls, [("batch", 3), ("run", 2000), ("run", 2000), ("run", 2000)])
+
+    def test_time_limit_longer_than_the_server_allows_is_not_batched(self):
+        PistonService.run_batch("code", "python", "3.10.0", list("ab"), timeout=5)
+        self.assertEqual(self.calls, [("run", 3000), ("run", 3000)])
+
+    def test_run_code_and_run_batch_share_cache_entries(self):
+        PistonService.run_batch("code", "python", "3.10.0", list("ab"), timeout=2)
+        self.calls.clear()
+        result = PistonService.run_code("code", "python", "3.10.0", "a", timeout=2)
+        self.assertTrue(result["cache_hit"])
+        self.assertEqual(self.calls, [])
+        PistonService.run_batch("code", "python", "3.10.0", list("abc"), timeout=2)
+        self.assertEqual(self.calls, [("run", 2000)])
+
+
+@skipUnless(shutil.which('prlimit') and shutil.which('gcc'), "needs prlimit and gcc")
+class LocalSandboxBackendTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        overrides = override_settings(
+            LOCAL_SANDBOX_ROOT=root,
+            LOCAL_SANDBOX_ALLOW_UNISOLATED=True,
+            LOCAL_SANDBOX_WRAPPER=[],
+            LOCAL_SANDBOX_UID=None,
+            LOCAL_SANDBOX_WARM_PROCESSES=1,
+            LOCAL_SANDBOX_MAX_PROCESSES=4096,
+            LOCAL_SANDBOX_START_TIMEOUT=0.5,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def backend(self):
+        backend = LocalSandboxBackend()
+        self.addCleanup(self.stop_warm, backend)
+        return backend
+
+    @staticmethod
+    def stop_warm(backend):
+        while not backend._warm.empty():
+            proc = backend._warm.get_nowait()
+            proc.kill()
+            proc.wait()
+            proc.stdin.close()
+
+    def test_rlimits_are_applied_without_preexec_fn(self):
+        backend = self.backend()
+        code = "import resource\nprint(resource.getrlimit(resource.RLIMIT_NPROC)[0], resource.getrlimit(resource.RLIMIT_CORE)[0])"
+        response = backend.execute({"language": "python", "files": [{"content": code}], "run_timeout": 3000})
+        self.assertEqual(response["run"]["stdout"].split(), ["4096", "0"])
+
+    def test_cached_binary_is_read_only_to_the_sandbox(self):
+        backend = self.backend()
+        response = backend.execute({"language": "c", "files": [{"content": "int main(){return 3;}"}]})
+        self.assertEqual(response["run"]["code"], 3)
+        (build_dir,) = backend._builds.values()
+        binary = os.stat(os.path.join(build_dir, 'binary'))
+        self.assertEqual(binary.st_uid, os.getuid())
+        self.assertEqual(binary.st_mode & 0o777, 0o755)
+        self.assertEqual(os.stat(build_dir).st_mode & 0o777, 0o711)
+
+    def test_process_start_failures_are_backend_errors(self):
+        backend = self.backend()
+        with mock.patch('AssignEaseApp.execution_backends.subprocess.Popen', side_effect=OSError(11, "EAGAIN")):
+            with self.assertRaises(ExecutionBackendError):
+                backend.execute({"language": "c", "files": [{"content": "int main(){return 0;}"}]})
+        with mock.patch.dict(LocalSandboxBackend.COMPILERS, {'c': (['no-such-compiler', '-o'], '.c')}):
+            with self.assertRaises(ExecutionBackendError):
+                backend.execute({"language": "c", "files": [{"content": "int main(){return 1;}"}]})
+        self.assertEqual(backend._builds, {})
+
+    def test_dead_interpreters_time_out_instead_of_spinning(self):
+        backend = self.backend()
+        self.stop_warm(backend)
+        dead = mock.Mock(**{'poll.return_value': 1})
+        with mock.patch.object(backend, '_spawn_python', side_effect=lambda: backend._warm.put(dead)) as spawn:
+            started = time.monotonic()
+            with self.assertRaises(ExecutionBackendError):
+                backend._take_python()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertLess(spawn.call_count, 20)
+
+
+class ExecutionPoolTests(SimpleTestCase):
+    def setUp(self):
+        # A fresh pool per test, sized by the test's settings
+        saved = ExecutionPool._executor
+        ExecutionPool._executor = None
+
+        def restore():
+            if ExecutionPool._executor is not None:
+                ExecutionPool._executor.shutdown(wait=True)
+            ExecutionPool._executor = saved
+        self.addCleanup(restore)
+
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def job(self, item):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return item * 2
+
+    @override_settings(EXECUTION_MAX_IN_FLIGHT=16, EXECUTION_MAX_PER_SUBMISSION=3)
+    def test_map_keeps_order_under_the_per_submission_limit(self):
+        self.assertEqual(ExecutionPool.map(self.job, range(12)), [i * 2 for i in range(12)])
+        self.assertEqual(self.peak, 3)
+        self.assertEqual(ExecutionPool.in_flight(), 0)
+
+    @override_settings(EXECUTION_MAX_IN_FLIGHT=2, EXECUTION_MAX_PER_SUBMISSION=4)
+    def test_global_limit_holds_across_submissions(self):
+        threads = [threading.Thread(target=ExecutionPool.map, args=(self.job, range(6))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.peak, 2)
+
+    @override_settings(EXECUTION_MAX_IN_FLIGHT=1, EXECUTION_MAX_PER_SUBMISSION=4)
+    def test_nested_calls_run_inline_on_a_pool_thread(self):
+        # With a single slot, waiting on further pool jobs from the pool would deadlock
+        def batch():
+            names = ExecutionPool.map(lambda _: threading.current_thread().name, range(3))
+            return names + [ExecutionPool.call(lambda: threading.current_thread().name)]
+
+        names = ExecutionPool.call(batch)
+        self.assertEqual(len(set(names)), 1)
+        self.assertTrue(names[0].startswith('assignease-exec'))
+
+    @override_settings(EXECUTION_MAX_IN_FLIGHT=4, EXECUTION_MAX_PER_SUBMISSION=2)
+    def test_exceptions_propagate(self):
+        def fail(item):
+            if item == 2:
+                raise ValueError(item)
+            return item
+
+        with self.assertRaises(ValueError):
+            ExecutionPool.map(fail, range(5))
+        self.assertEqual(ExecutionPool.map(fail, [0, 1]), [0, 1])
+
+
+class ExecutionTelemetryTests(GradingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        Profile.objects.create(user=self.assignment.teacher, role='teacher')
+        self.client = APIClient()
+        self.client.force_authenticate(self.assignment.teacher)
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, pct) for pct in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([3], 99), 3)
+        self.assertIsNone(percentile([], 50))
+
+    def test_grading_records_telemetry_per_language_and_backend(self):
+        GradingService.evaluate_submission(self.submission)
+        (group,) = execution_stats(days=1)
+        self.assertEqual((group["language"], group["backend"], group["executions"]), ('python', 'piston', 5))
+        self.assertEqual(group["bytes_in"], 50)
+        self.assertEqual(group["wall_time"], {"p50": 0.5, "p95": 0.5, "p99": 0.5})
+        self.assertEqual(execution_stats(days=1, assignment_id=self.assignment.id + 1), [])
+
+    def test_stats_view_rejects_bad_parameters(self):
+        url = '/api/execution-stats/'
+        self.assertEqual(self.client.get(url, {'days': '2', 'assignment': self.assignment.id}).status_code, 200)
+        for params in ({'days': 'inf'}, {'days': 'nan'}, {'days': '-1'}, {'days': 'x'}, {'days': '1e9'}, {'assignment': 'abc'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+class HealthViewTests(TestCase):
+    def test_details_are_only_shown_to_staff_and_teachers(self):
+        client = APIClient()
+        response = client.get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {"status"})
+
+        student = User.objects.create_user('student', 'student@example.com', 'x')
+        Profile.objects.create(user=student, role='student')
+        client.force_authenticate(student)
+        self.assertEqual(set(client.get('/api/health/').data), {"status"})
+
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'x')
+        Profile.objects.create(user=teacher, role='teacher')
+        client.force_authenticate(teacher)
+        self.assertIn("piston", client.get('/api/health/').data["backends"])
+
+        client.force_authenticate(User.objects.create_user('admin', 'admin@example.com', 'x', is_staff=True))
+        self.assertIn("schema_pool", client.get('/api/health/').data)
+
+
+class GradingJobTests(GradingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Jobs run on worker threads, which close their connection when done
+        for name in ('connection', 'close_old_connections'):
+            patcher = mock.patch(f'AssignEaseApp.grading_worker.{name}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.executor = mock.Mock()
+        patcher = mock.patch('AssignEaseApp.grading_worker._get_executor', return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueue_submits_the_job_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = enqueue_grading(self.submission, requested_by=self.assignment.teacher)
+            self.executor.submit.assert_not_called()
+        self.executor.submit.assert_called_once_with(run_grading_job, job.id, False)
+        self.assertEqual(job.status, 'queued')
+
+    @override_settings(GRADING_PROGRESS_CHUNK=2)
+    def test_job_reports_progress_per_chunk(self):
+        job = GradingJob.objects.create(submission=self.submission)
+        progress = []
+        original_save = GradingJob.save
+
+        def save(instance, *args, **kwargs):
+            progress.append((instance.status, instance.completed_testcases))
+            original_save(instance, *args, **kwargs)
+
+        with mock.patch.object(GradingJob, 'save', save):
+            run_grading_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.completed_testcases, job.passed_testcases), ('done', 5, 5))
+        self.assertEqual(progress, [('running', 2), ('running', 4), ('running', 5), ('done', 5)])
+
+    def test_failed_grading_marks_the_job(self):
+        job = GradingJob.objects.create(submission=self.submission)
+        GradingService.run_testcases.side_effect = RuntimeError("sandbox down")
+        run_grading_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('error', 'sandbox down'))
+        self.assertIsNotNone(job.completed_at)
+
+    def test_a_job_is_only_run_once(self):
+        job = GradingJob.objects.create(submission=self.submission, status='done')
+        run_grading_job(job.id)
+        self.assertEqual(self.executed, [])
+
+    @override_settings(GRADING_JOB_STALE_SECONDS=60, GRADING_JOB_MAX_ATTEMPTS=1)
+    def test_stale_jobs_are_requeued_then_failed(self):
+        fresh = GradingJob.objects.create(submission=self.submission, status='running')
+        lost = GradingJob.objects.create(submission=self.submission, status='running')
+        GradingJob.objects.filter(id=lost.id).update(updated_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(recover_stale_jobs(), {"requeued": 1, "failed": 0})
+        self.executor.submit.assert_called_once_with(run_grading_job, lost.id, True)
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.attempts), ('queued', 1))
+
+        GradingJob.objects.filter(id=lost.id).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(recover_stale_jobs(), {"requeued": 0, "failed": 1})
+        lost.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((lost.status, fresh.status), ('error', 'running'))
+
+
+@override_settings(EXECUTION_CACHE_ENABLED=True, EXECUTION_CACHE_ALIAS='default')
+class ExecutionCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.responses = []
+        patcher = mock.patch.object(PistonService, '_execute', side_effect=lambda payload, timeout=30: self.responses.pop(0))
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_key_covers_every_input(self):
+        key = ExecutionCache.make_key("code", "Python", "3.10", "1", {"timeout": 2})
+        self.assertEqual(key, ExecutionCache.make_key("code", "python", "3.10", "1", {"timeout": 2}))
+        for other in (("code2", "python", "3.10", "1", {"timeout": 2}), ("code", "python", "3.11", "1", {"timeout": 2}),
+                      ("code", "python", "3.10", "2", {"timeout": 2}), ("code", "python", "3.10", "1", {"timeout": 3})):
+            self.assertNotEqual(key, ExecutionCache.make_key(*other))
+
+    def test_only_deterministic_outcomes_are_cacheable(self):
+        self.assertTrue(ExecutionCache.cacheable({"exit_code": 0}))
+        self.assertTrue(ExecutionCache.cacheable({"exit_code": 1}))
+        self.assertTrue(ExecutionCache.cacheable({"exit_code": 1, "compile_error": True}))
+        self.assertFalse(ExecutionCache.cacheable({"exit_code": 124}))
+        self.assertFalse(ExecutionCache.cacheable({"exit_code": 137}))
+        self.assertFalse(ExecutionCache.cacheable({"exit_code": None, "signal": "SIGKILL"}))
+        self.assertFalse(ExecutionCache.cacheable({"exit_code": -1, "error": "unreachable"}))
+
+    def test_repeated_run_is_answered_from_the_cache(self):
+        self.responses.append({"run": {"stdout": "2\n", "stderr": "", "code": 0}})
+        first = PistonService.run_code("print(2)", "python", "3.10.0", "")
+        second = PistonService.run_code("print(2)", "python", "3.10.0", "")
+        self.assertEqual(self.execute.call_count, 1)
+        self.assertFalse(first["cache_hit"])
+        self.assertEqual((second["stdout"], second["cache_hit"], second["backend_time"]), ("2\n", True, 0.0))
+
+    def test_killed_runs_are_executed_again(self):
+        self.responses.append({"run": {"stdout": "", "stderr": "", "code": None, "signal": "SIGKILL"}})
+        self.responses.append({"run": {"stdout": "ok", "stderr": "", "code": 0}})
+        PistonService.run_code("slow()", "python", "3.10.0", "")
+        self.assertEqual(PistonService.run_code("slow()", "python", "3.10.0", "")["stdout"], "ok")
+        self.assertEqual(self.execute.call_count, 2)
+
+    @override_settings(EXECUTION_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.responses.extend([{"run": {"stdout": "1", "stderr": "", "code": 0}}] * 2)
+        PistonService.run_code("print(1)", "python", "3.10.0", "")
+        PistonService.run_code("print(1)", "python", "3.10.0", "")
+        self.assertEqual(self.execute.call_count, 2)
+
+
+@override_settings(EXECUTION_RATE_LIMIT_ENABLED=False, EXECUTION_MAX_PER_SUBMISSION=4)
+class RunTestCasesStreamTests(GradingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        GradedTestCase.objects.filter(id__in=[tc.id for tc in self.testcases[:4]]).update(visibility='public')
+        self.client = APIClient()
+        self.client.force_authenticate(self.submission.student)
+
+    @staticmethod
+    def run_testcase(source_code, language, version, tc):
+        # The first case finishes last
+        time.sleep(0.2 if tc.input == '0' else 0.01)
+        return {"testcase": tc, "stdout": tc.expected_output, "stderr": "", "passed": tc.input != '3'}
+
+    def events(self, response):
+        async def read():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        body = async_to_sync(read)().decode('utf-8')
+        events = []
+        for block in filter(None, body.split("\n\n")):
+            name, data = block.split("\n")
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+        return events
+
+    def test_streams_each_result_as_it_finishes_then_a_summary(self):
+        with mock.patch.object(GradingService, 'run_testcase', side_effect=self.run_testcase):
+            response = self.client.post('/api/run-testcases/stream/', {
+                "question_id": self.question.id, "source_code": "code",
+                "language_name": "python", "language_version": "3.10.0",
+            }, format='json', HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            events = self.events(response)
+
+        self.assertEqual([name for name, _ in events], ["result"] * 4 + ["summary"])
+        results = [data for name, data in events if name == "result"]
+        self.assertEqual(results[-1]["testcase_id"], self.testcases[0].id)
+        self.assertEqual(sorted(r["testcase_id"] for r in results), [tc.id for tc in self.testcases[:4]])
+        self.assertEqual(events[-1][1], {"total": 4, "passed": 3})
+
+    def test_missing_fields(self):
+        response = self.client.post('/api/run-testcases/stream/', {"question_id": self.question.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(EXECUTION_RATE_LIMIT_ENABLED=False)
+class AsyncViewTests(GradingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        GradedTestCase.objects.filter(id__in=[tc.id for tc in self.testcases[:2]]).update(visibility='public')
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.submission.student)}"}
+
+    async def fake_arun(self, source_code, language, version, testcases, judge0_language_id=None):
+        return self.fake_run(source_code, language, version, testcases, judge0_language_id)
+
+    def test_run_testcases_runs_public_cases(self):
+        self.failing = {self.testcases[1].id}
+        with mock.patch.object(GradingService, 'arun_testcases', side_effect=self.fake_arun):
+            response = self.client.post('/api/async/run-testcases/', {
+                "question_id": self.question.id, "source_code": "code",
+                "language_name": "python", "language_version": "3.10.0",
+            }, content_type='application/json', **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([r["testcase_id"] for r in body["results"]], [tc.id for tc in self.testcases[:2]])
+        self.assertEqual((body["total"], body["passed"]), (2, 1))
+
+    def test_requires_authentication_and_fields(self):
+        response = self.client.post('/api/async/run-testcases/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.post('/api/async/run-testcases/', {"question_id": self.question.id},
+                                    content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_evaluate_submission(self):
+        summary = {"auto_marks": 10, "passed_testcases": 5, "total_testcases": 5}
+        with mock.patch.object(GradingService, 'aevaluate_submission', new=mock.AsyncMock(return_value=summary)):
+            response = self.client.post('/api/async/evaluate-submission/', {"submission_id": self.submission.id},
+                                        content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), summary)
+
+        response = self.client.post('/api/async/evaluate-submission/', {"submission_id": 999999},
+                                    content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_evaluate_submission_in_background(self):
+        with mock.patch('AssignEaseApp.async_views.enqueue_grading', return_value=GradingJob.objects.create(
+            submission=self.submission,
+        )) as enqueue:
+            response = self.client.post('/api/async/evaluate-submission/', {
+                "submission_id": self.submission.id, "async": True,
+            }, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(enqueue.call_args.args[0].id, self.submission.id)
+
+
+class AsyncHttpClientTests(SimpleTestCase):
+    async def test_scope_shares_one_client_per_host_and_closes_them(self):
+        async with AsyncHttpClient.scope():
+            async with AsyncHttpClient.client_for("https://piston.example/api/v2/execute") as first:
+                pass
+            async with AsyncHttpClient.client_for("https://piston.example/api/v2/runtimes") as second:
+                pass
+            async with AsyncHttpClient.client_for("https://judge0.example/submissions") as other:
+                pass
+            self.assertIs(first, second)
+            self.assertIsNot(first, other)
+            self.assertFalse(first.is_closed)
+
+        self.assertTrue(first.is_closed)
+        self.assertTrue(other.is_closed)
+
+    async def test_client_outside_a_scope_is_closed_after_use(self):
+        async with AsyncHttpClient.client_for("https://piston.example/") as client:
+            self.assertFalse(client.is_closed)
+        self.assertTrue(client.is_closed)
+
+
+class TestDataBlobTests(GradingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, TESTCASE_BLOB_THRESHOLD=100,
+                                      TESTCASE_BLOB_PREVIEW_CHARS=10)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        BlobStore._cache.clear()
+        self.addCleanup(BlobStore._cache.clear)
+
+    def test_large_data_is_stored_once_and_loaded_lazily(self):
+        data = "1 2 3\n" * 50
+        first = GradedTestCase.objects.create(question=self.question, input=data, expected_output="6")
+        second = GradedTestCase.objects.create(question=self.question, input=data, expected_output="6")
+
+        self.assertEqual(first.input_blob, second.input_blob)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'testcase-blobs', first.input_blob[:2])),
+                         [first.input_blob])
+
+        BlobStore._cache.clear()
+        row = GradedTestCase.objects.get(id=first.id)
+        self.assertTrue(row.data_truncated)
+        self.assertEqual(row.input, data[:10])
+        self.assertEqual(row.input_size, len(data))
+        self.assertEqual(row.input_text, data)
+        self.assertEqual(row.expected_output_text, "6")
+
+    def test_saving_again_keeps_the_blob_and_small_data_replaces_it(self):
+        tc = GradedTestCase.objects.create(question=self.question, input="x" * 200, expected_output="1")
+        row = GradedTestCase.objects.get(id=tc.id)
+        row.marks = 2
+        row.save()
+        row.refresh_from_db()
+        self.assertEqual(row.input_text, "x" * 200)
+
+        row.input = "small"
+        row.save(update_fields=['input'])
+        row = GradedTestCase.objects.get(id=tc.id)
+        self.assertFalse(row.data_truncated)
+        self.assertEqual(row.input_text, "small")
+
+    def test_serializer_rejects_an_edited_preview(self):
+        tc = GradedTestCase.objects.create(question=self.question, input="x" * 200, expected_output="1")
+        row = GradedTestCase.objects.get(id=tc.id)
+
+        serializer = TestCaseSerializer(row, data={"input": row.input + "y"}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("input", serializer.errors)
+
+        for value in (row.input, "z" * 200):
+            serializer = TestCaseSerializer(row, data={"input": value}, partial=True)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertTrue(TestCaseSerializer(row).data["data_truncated"])
+
+    def test_offload_command_moves_existing_rows(self):
+        GradedTestCase.objects.filter(id=self.testcases[0].id).update(input="y" * 200)
+        out = StringIO()
+        call_command('offload_testcase_data', stdout=out)
+
+        self.assertIn("TestCase: 1 row(s) moved to blob storage", out.getvalue())
+        row = GradedTestCase.objects.get(id=self.testcases[0].id)
+        self.assertEqual((row.input, row.input_text), ("y" * 10, "y" * 200))
+
+
+class ReferenceSolutionTests(GradingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # testcases[1] has a wrong expected output, testcases[2] has none
+        GradedTestCase.objects.filter(id=self.testcases[1].id).update(expected_output="3")
+        GradedTestCase.objects.filter(id=self.testcases[2].id).update(expected_output="")
+        self.crashing = set()
+        patcher = mock.patch.object(GradingService, 'run_testcases', side_effect=self.reference_run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reference_run(self, source_code, language, version, testcases, judge0_language_id=None):
+        results = []
+        for tc in testcases:
+            stdout = "" if tc.id in self.crashing else str(int(tc.input) * 2)
+            results.append({
+                "testcase": tc, "stdout": stdout, "stderr": "Traceback" if tc.id in self.crashing else "",
+                "passed": stdout == tc.expected_output, "compile_error": False, "backend_error": False,
+            })
+        return results
+
+    def check(self, mode):
+        testcases = GradedTestCase.objects.filter(question=self.question).order_by('id')
+        return check_reference_solution(testcases, "code", "python", "3.10.0", mode=mode)
+
+    def expected_outputs(self):
+        return list(GradedTestCase.objects.filter(question=self.question).order_by('id').values_list('expected_output', flat=True))
+
+    def test_verify_reports_without_writing(self):
+        report = self.check("verify")
+
+        self.assertFalse(report["applied"])
+        self.assertEqual(report["counts"], {"match": 3, "mismatch": 2})
+        cases = report["testcases"]
+        self.assertIn("+2", cases[1]["diff"])
+        self.assertEqual(cases[2]["reference_output"], "4")
+        self.assertEqual(self.expected_outputs(), ["0", "3", "", "6", "8"])
+
+    def test_fill_and_overwrite(self):
+        report = self.check("fill")
+        self.assertTrue(report["applied"])
+        self.assertEqual(report["counts"], {"match": 3, "mismatch": 1, "filled": 1})
+        self.assertEqual(self.expected_outputs(), ["0", "3", "4", "6", "8"])
+
+        report = self.check("overwrite")
+        self.assertEqual(report["counts"], {"match": 4, "updated": 1})
+        self.assertEqual(self.expected_outputs(), ["0", "2", "4", "6", "8"])
+
+    def test_nothing_is_written_when_a_case_fails(self):
+        self.crashing = {self.testcases[4].id}
+        report = self.check("overwrite")
+
+        self.assertFalse(report["applied"])
+        self.assertEqual(report["counts"], {"match": 2, "mismatch": 2, "error": 1})
+        self.assertEqual(self.expected_outputs(), ["0", "3", "", "6", "8"])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.check("replace")
+
+    @override_settings(EXECUTION_RATE_LIMIT_ENABLED=False)
+    def test_endpoint_is_limited_to_the_assignment_teacher(self):
+        client = APIClient()
+        url = f'/api/assignmentquestions/{self.question.id}/reference-solution/'
+
+        client.force_authenticate(self.submission.student)
+        response = client.post(url, {"source_code": "code", "mode": "fill"}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(self.assignment.teacher)
+        response = client.post(url, {"source_code": "code", "mode": "fill"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["counts"]["filled"], 1)
+        response = client.post(url, {"source_code": "code", "mode": "replace"}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+SCHEMA_SQL = "PRAGMA foreign_keys = ON; CREATE TABLE dept (id INTEGER PRIMARY KEY, name TEXT); " \
+             "CREATE TABLE emp (id INTEGER PRIMARY KEY, dept_id INTEGER REFERENCES dept(id))"
+SAMPLE_SQL = "INSERT INTO dept VALUES (1, 'R&D'); INSERT INTO emp VALUES (1, 1)"
+
+
+@skipUnless(schema_snapshots.SUPPORTED, "needs sqlite3 serialize/deserialize")
+class SchemaSnapshotCacheTests(SimpleTestCase):
+    def setUp(self):
+        SchemaSnapshotCache._images.clear()
+        SchemaSnapshotCache._hits = SchemaSnapshotCache._misses = 0
+        self.addCleanup(SchemaSnapshotCache._images.clear)
+        self.builds = 0
+
+    def build(self, conn, schema_sql, sample_data_sql):
+        self.builds += 1
+        DatabaseService._run_schema_script(conn, schema_sql, sample_data_sql)
+
+    def restored(self, schema_sql=SCHEMA_SQL, sample_data_sql=SAMPLE_SQL):
+        conn = sqlite3.connect(':memory:')
+        self.addCleanup(conn.close)
+        SchemaSnapshotCache.restore(conn, schema_sql, sample_data_sql, self.build)
+        return conn
+
+    def test_schema_is_built_once_and_clones_are_isolated(self):
+        first = self.restored()
+        second = self.restored()
+        first.execute("DELETE FROM emp")
+
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(second.execute("SELECT COUNT(*) FROM emp").fetchone(), (1,))
+        self.assertEqual(SchemaSnapshotCache.stats()["hits"], 1)
+        # PRAGMA statements are replayed on every clone
+        self.assertEqual(second.execute("PRAGMA foreign_keys").fetchone(), (1,))
+        with self.assertRaises(sqlite3.IntegrityError):
+            second.execute("INSERT INTO emp VALUES (2, 99)")
+
+    def test_editing_the_schema_changes_the_key(self):
+        self.assertNotEqual(snapshot_key(SCHEMA_SQL, SAMPLE_SQL), snapshot_key(SCHEMA_SQL, SAMPLE_SQL + ";"))
+        self.assertNotEqual(snapshot_key("a", "b"), snapshot_key("ab", ""))
+
+        self.restored()
+        conn = self.restored(sample_data_sql="INSERT INTO dept VALUES (2, 'Ops')")
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(conn.execute("SELECT name FROM dept").fetchall(), [("Ops",)])
+
+    def test_failed_builds_are_not_cached(self):
+        with self.assertRaises(DatabaseExecutionError):
+            with DatabaseService.get_db_connection('sqlite') as conn:
+                DatabaseService.setup_schema(conn, "CREATE TABLE broken (", "")
+        self.assertEqual(SchemaSnapshotCache.stats()["snapshots"], 0)
+
+    @override_settings(DATABASE_SNAPSHOT_CACHE_SIZE=1)
+    def test_least_recently_used_image_is_evicted(self):
+        self.restored()
+        self.restored(sample_data_sql="")
+        self.restored()
+        self.assertEqual(self.builds, 3)
+        self.assertEqual(SchemaSnapshotCache.stats()["snapshots"], 1)
+
+    @override_settings(DATABASE_SNAPSHOT_MAX_BYTES=1)
+    def test_oversized_images_are_not_kept(self):
+        self.restored()
+        self.restored()
+        self.assertEqual(self.builds, 2)
+
+
+@skipUnless(schema_snapshots.SUPPORTED, "needs sqlite3 serialize/deserialize")
+class SchemaConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        SchemaConnectionPool._reset_after_fork()
+        self.addCleanup(SchemaConnectionPool._reset_after_fork)
+        SchemaSnapshotCache._images.clear()
+        self.addCleanup(SchemaSnapshotCache._images.clear)
+
+    def lease(self, sample_data_sql=SAMPLE_SQL):
+        return DatabaseService.seeded_connection('sqlite', SCHEMA_SQL, sample_data_sql, read_only=True)
+
+    def test_connections_are_reused_and_rolled_back(self):
+        with self.lease() as conn:
+            first = conn
+            rows, _ = DatabaseService.execute_query(conn, "SELECT name FROM dept", 'sqlite')
+        with self.lease() as conn:
+            self.assertIs(conn, first)
+            # A temp table cannot be created during a lease, and nothing survives it
+            with self.assertRaises(sqlite3.DatabaseError):
+                conn.execute("CREATE TEMP TABLE scratch (x)")
+
+        self.assertEqual(rows, [{"name": "R&D"}])
+        self.assertEqual(SchemaConnectionPool.stats()["idle_connections"], 1)
+        self.assertEqual(SchemaConnectionPool.stats()["leased_connections"], 0)
+
+    def test_only_reads_and_schema_pragmas_are_authorized(self):
+        with self.lease() as conn:
+            for query in ("PRAGMA table_info(emp)", "SELECT name FROM pragma_table_info('dept')",
+                          "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3) SELECT i FROM n"):
+                rows, _ = DatabaseService.execute_query(conn, query, 'sqlite')
+                self.assertTrue(rows, query)
+
+            for query in ("PRAGMA foreign_keys = OFF", "ATTACH DATABASE ':memory:' AS other",
+                          "PRAGMA writable_schema = ON", "REPLACE INTO dept VALUES (1, 'x')"):
+                with self.assertRaisesRegex(DatabaseExecutionError, "read-only"):
+                    DatabaseService.execute_query(conn, query, 'sqlite')
+
+    @override_settings(DATABASE_POOL_SIZE=1)
+    def test_extra_connections_are_closed_on_return(self):
+        with self.lease() as first, self.lease() as second:
+            self.assertIsNot(first, second)
+            self.assertEqual(SchemaConnectionPool.stats()["leased_connections"], 2)
+        self.assertEqual(SchemaConnectionPool.stats()["idle_connections"], 1)
+
+    def test_idle_and_oversized_schemas_are_evicted(self):
+        with override_settings(DATABASE_POOL_MAX_BYTES=1):
+            with self.lease():
+                pass
+            self.assertEqual(SchemaConnectionPool.stats()["schemas"], 0)
+
+        with override_settings(DATABASE_POOL_IDLE_SECONDS=0.01):
+            with self.lease():
+                pass
+            time.sleep(0.02)
+            with self.lease(sample_data_sql=""):
+                self.assertEqual(SchemaConnectionPool.stats()["schemas"], 0)
+        self.assertEqual(SchemaConnectionPool.stats()["schemas"], 1)
+
+    def test_failed_build_releases_the_lease(self):
+        with self.assertRaises(DatabaseExecutionError):
+            with DatabaseService.seeded_connection('sqlite', "CREATE TABLE broken (", "", read_only=True):
+                pass
+        self.assertEqual(SchemaConnectionPool.stats()["leased_connections"], 0)
+
+
+class DatabaseQuestionExpectedResultTests(GradingTestMixin, TestCase):
+    EXPECTED = [{"id": 1, "name": "R&D"}, {"id": 2, "name": "Ops"}]
+
+    def setUp(self):
+        super().setUp()
+        self.db_question = DatabaseQuestion.objects.create(
+            assignment=self.assignment, question_text='List departments',
+            expected_query='SELECT id, name FROM dept', expected_result=self.EXPECTED,
+        )
+
+    def validate(self, query, question=None):
+        question = question or DatabaseQuestion.objects.get(id=self.db_question.id)
+        return DatabaseService.execute_and_validate(
+            'sqlite', SCHEMA_SQL, "INSERT INTO dept VALUES (1, 'R&D'); INSERT INTO dept VALUES (2, 'Ops')",
+            query, question.expected_result, **question.expected_comparison(),
+        )
+
+    def test_save_stores_the_canonical_result_and_hash(self):
+        question = DatabaseQuestion.objects.get(id=self.db_question.id)
+        self.assertEqual(
+            (question.expected_result_normalized, question.expected_result_hash),
+            DatabaseService.prepare_expected(self.EXPECTED),
+        )
+        self.assertTrue(result_compare.is_current(question.expected_result_hash))
+
+        question.order_sensitive = True
+        question.save(update_fields=['order_sensitive'])
+        question.refresh_from_db()
+        self.assertTrue(result_compare.is_current(question.expected_result_hash, order_sensitive=True))
+
+        question.expected_result = self.EXPECTED[:1]
+        question.save(update_fields=['expected_result'])
+        question.refresh_from_db()
+        self.assertEqual(question.expected_result_hash, DatabaseService.prepare_expected(self.EXPECTED[:1], True)[1])
+
+    def test_grading_reuses_the_precomputed_result(self):
+        with mock.patch.object(DatabaseService, 'prepare_expected', wraps=DatabaseService.prepare_expected) as prepare:
+            correct = self.validate("SELECT name, id FROM dept ORDER BY id DESC")
+            wrong = self.validate("SELECT id, name FROM dept WHERE id = 1")
+
+        prepare.assert_not_called()
+        self.assertTrue(correct["is_correct"])
+        self.assertFalse(wrong["is_correct"])
+        self.assertIn("Row count mismatch", wrong["feedback"])
+
+    def test_a_stale_hash_is_recomputed(self):
+        DatabaseQuestion.objects.filter(id=self.db_question.id).update(expected_result_hash="0" * 64)
+        self.assertTrue(self.validate("SELECT id, name FROM dept")["is_correct"])
+
+
+class QueryBudgetTests(SimpleTestCase):
+    ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT MAX(i) FROM n"
+
+    def setUp(self):
+        SchemaSnapshotCache._images.clear()
+        self.addCleanup(SchemaSnapshotCache._images.clear)
+
+    def run_query(self, query):
+        with DatabaseService.seeded_connection('sqlite', SCHEMA_SQL, SAMPLE_SQL) as conn:
+            try:
+                return DatabaseService.execute_query(conn, query, 'sqlite')
+            finally:
+                # The progress handler is detached again
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM dept").fetchone()[0], 1)
+
+    @override_settings(DATABASE_QUERY_TIMEOUT=0.05, DATABASE_QUERY_MAX_INSTRUCTIONS=0)
+    def test_long_running_query_is_interrupted(self):
+        started = time.monotonic()
+        with self.assertRaisesRegex(DatabaseExecutionError, "time limit of 0.05 seconds"):
+            self.run_query(self.ENDLESS)
+        self.assertLess(time.monotonic() - started, 1)
+
+    @override_settings(DATABASE_QUERY_TIMEOUT=0, DATABASE_QUERY_MAX_INSTRUCTIONS=100_000)
+    def test_instruction_budget(self):
+        with self.assertRaisesRegex(DatabaseExecutionError, "budget of 100,000 SQLite instructions"):
+            self.run_query(self.ENDLESS)
+        rows, _ = self.run_query("SELECT name FROM dept")
+        self.assertEqual(rows, [{"name": "R&D"}])
+
+    @override_settings(DATABASE_SCHEMA_TIMEOUT=0, DATABASE_SCHEMA_MAX_INSTRUCTIONS=100_000,
+                       DATABASE_QUERY_MAX_INSTRUCTIONS=1)
+    def test_schema_scripts_have_their_own_budget(self):
+        # Far over the query budget, well inside the schema budget
+        with DatabaseService.seeded_connection('sqlite', SCHEMA_SQL, SAMPLE_SQL) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM emp").fetchone()[0], 1)
+
+        seed = "INSERT INTO dept WITH RECURSIVE n(i) AS (SELECT 10 UNION ALL SELECT i + 1 FROM n) SELECT i, 'x' FROM n"
+        with self.assertRaisesRegex(DatabaseExecutionError, "Schema script exceeded the execution budget"):
+            with DatabaseService.seeded_connection('sqlite', SCHEMA_SQL, seed):
+                pass
+
+    def test_row_limit(self):
+        query = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n LIMIT 1001) SELECT i FROM n"
+        with self.assertRaisesRegex(DatabaseExecutionError, "too many rows"):
+            self.run_query(query)
@@ -5,6 +5,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .oauth_views import GoogleOAuthView, GitHubOAuthView
 from .otp_views import SendOTPView, VerifyOTPView, ResetPasswordView
 from . import views
+from . import async_views
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'profiles', ProfileViewSet)
@@ -54,7 +55,13 @@ urlpatterns = [
     
     # TestCase endpoints
     path("run-testcases/", RunTestCasesView.as_view(), name="run-testcases"),
+    path("run-testcases/stream/", views.RunTestCasesStreamView.as_view(), name="run-testcases-stream"),
     path("evaluate-submission/", EvaluateSubmissionView.as_view(), name="evaluate-submission"),
+    path("grading-jobs/<uuid:job_id>/", views.GradingJobStatusView.as_view(), name="grading-job-status"),
+    path("regrade/", views.RegradeSubmissionsView.as_view(), name="regrade-submissions"),
+    path("execution-cache/stats/", views.ExecutionCacheStatsView.as_view(), name="execution-cache-stats"),
+    path("execution-stats/", views.ExecutionStatsView.as_view(), name="execution-stats"),
+    path("health/", views.HealthView.as_view(), name="health"),
     path('ai-evaluations/', views.AIEvaluationListView.as_view(), name='ai-evaluation-list'),
     path('ai-evaluations/<int:pk>/', views.AIEvaluationDetailView.as_view(), name='ai-evaluation-detail'),
     
@@ -65,4 +72,7 @@ urlpatterns = [
     path('test-database-query-with-schema/', TestDatabaseQueryWithSchemaView.as_view(), name='test-database-query-with-schema'),
     path('database-submissions/student/<int:student_id>/assignment/<int:assignment_id>/', get_database_submissions_by_student, name='database-submissions-by-student'),
     path('generate-database-assignment-ai/', GenerateDatabaseAssignmentWithAIView.as_view(), name='generate-database-assignment-ai'),
+    path('async/run-testcases/', async_views.AsyncRunTestCasesView.as_view(), name='async-run-testcases'),
+    path('async/evaluate-submission/', async_views.AsyncEvaluateSubmissionView.as_view(), name='async-evaluate-submission'),
+    path('async/generate-database-assignment-ai/', async_views.AsyncGenerateDatabaseAssignmentWithAIView.as_view(), name='async-generate-database-assignment-ai'),
 ]
@@ -1,7 +1,7 @@
 from rest_framework import viewsets, generics
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import User, Profile, Class, Contact, BugReport, ClassStudent, ProgrammingLanguage, Assignment, AssignmentQuestion, CodingQuestion, CodingTestCase, NonCodingQuestion, Submission, TeacherFeedback, NonCodingSubmission, TestCase, AIEvaluation, DatabaseSchema, DatabaseQuestion, DatabaseSubmission
-from .serializers import RegistrationSerializer, UserSerializer, ContactSerializer, BugReportSerializer, ProfileSerializer, ClassSerializer, ClassStudentSerializer, ProgrammingLanguageSerializer, AssignmentSerializer, AssignmentQuestionSerializer, CodingQuestionSerializer, CodingTestCaseSerializer, NonCodingQuestionSerializer, SubmissionSerializer, TeacherFeedbackSerializer, ClassStudentDetailSerializer, CustomTokenObtainPairSerializer, AssignmentAttachmentSerializer, NonCodingSubmissionSerializer, TestCaseSerializer, TestCaseResultSerializer, AIEvaluationSerializer, DatabaseSchemaSerializer, DatabaseQuestionSerializer, DatabaseSubmissionSerializer
+from .models import User, Profile, Class, Contact, BugReport, ClassStudent, ProgrammingLanguage, Assignment, AssignmentQuestion, CodingQuestion, CodingTestCase, NonCodingQuestion, Submission, TeacherFeedback, NonCodingSubmission, TestCase, GradingJob, AIEvaluation, DatabaseSchema, DatabaseQuestion, DatabaseSubmission
+from .serializers import RegistrationSerializer, UserSerializer, ContactSerializer, BugReportSerializer, ProfileSerializer, ClassSerializer, ClassStudentSerializer, ProgrammingLanguageSerializer, AssignmentSerializer, AssignmentQuestionSerializer, CodingQuestionSerializer, CodingTestCaseSerializer, NonCodingQuestionSerializer, SubmissionSerializer, TeacherFeedbackSerializer, ClassStudentDetailSerializer, CustomTokenObtainPairSerializer, AssignmentAttachmentSerializer, NonCodingSubmissionSerializer, TestCaseSerializer, TestCaseResultSerializer, GradingJobSerializer, AIEvaluationSerializer, DatabaseSchemaSerializer, DatabaseQuestionSerializer, DatabaseSubmissionSerializer
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
@@ -11,11 +11,29 @@ from rest_framework.response import Response
 from .models import Assignment, ClassStudent
 from rest_framework.views import APIView
 from django.db.models import Exists, OuterRef, Q
+from django.db import transaction
+from django.http import StreamingHttpResponse
+import asyncio
+import json
+import math
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from .models import AssignmentAttachment
-from .piston_service import PistonService
+from .grading_service import GradingService, GradingError
+from .grading_worker import enqueue_grading, recover_stale_jobs, submissions_to_regrade
+from .execution_cache import ExecutionCache
+from .execution_load import ExecutionLoad
+from .execution_pool import ExecutionPool
+from .execution_router import ExecutionRouter
+from .rate_limit import ExecutionRateLimiter
+from .circuit_breaker import breaker_states, get_breaker
+from .telemetry import execution_stats
+from .language_registry import LanguageRegistry
+from .reference_solution import MODES as REFERENCE_MODES, check_reference_solution
 from .models import AssignmentQuestion, TestCase, TestCaseResult
+from .schema_pool import SchemaConnectionPool
+from .schema_snapshots import SchemaSnapshotCache
 from .database_service import DatabaseService
 
 def teacher_owned_filter(user, prefix=""):
@@ -23,6 +41,19 @@ def teacher_owned_filter(user, prefix=""):
     return Q(**{f"{base}teacher": user}) | Q(**{f"{base}class_assigned__teacher": user})
 
 
+def execution_throttled(user, executions):
+    """429 response if ``user`` may not start ``executions`` sandbox runs now, else None"""
+    retry_after = ExecutionRateLimiter.check(user, executions)
+    if retry_after is None:
+        return None
+    retry_after = max(1, math.ceil(retry_after))
+    return Response(
+        {"error": "Too many code executions, please retry later", "retry_after": retry_after},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 def teacher_owns_assignment(user, assignment):
     if not assignment:
         return False
@@ -480,6 +511,18 @@ class AssignmentQuestionViewSet(viewsets.ModelViewSet):
     serializer_class = AssignmentQuestionSerializer
     permission_classes = [IsAuthenticated]
 
+    @action(detail=True, methods=['post'], url_path='reference-solution')
+    def reference_solution(self, request, pk=None):
+        """
+        POST /api/assignmentquestions/<id>/reference-solution/
+        Body: {"source_code": "...", "mode": "verify" | "fill" | "overwrite", "language_version": optional}
+        """
+        question = self.get_object()
+        language, version, judge0_language_id = GradingService.resolve_language(question.assignment)
+        return reference_solution_response(
+            request, question.assignment, question.testcases.order_by('id'), language, version, judge0_language_id
+        )
+
 class SubmissionViewSet(viewsets.ModelViewSet):
     queryset = Submission.objects.all()
     serializer_class = SubmissionSerializer
@@ -749,6 +792,49 @@ class NonCodingSubmissionViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+def reference_solution_response(request, assignment, testcases, language, version, judge0_language_id=None):
+    """Run a teacher's reference solution over ``testcases`` (see reference_solution.py)"""
+    if not teacher_owns_assignment(request.user, assignment):
+        return Response({"error": "Only the assignment's teacher can run a reference solution"}, status=status.HTTP_403_FORBIDDEN)
+
+    source_code = request.data.get("source_code")
+    mode = request.data.get("mode", "verify")
+    version = request.data.get("language_version") or version
+
+    if not source_code:
+        return Response({"error": "source_code is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if mode not in REFERENCE_MODES:
+        return Response({"error": f"mode must be one of {', '.join(REFERENCE_MODES)}"}, status=status.HTTP_400_BAD_REQUEST)
+    if not language or not version:
+        return Response({"error": "No language/version configured; pass language_version"}, status=status.HTTP_400_BAD_REQUEST)
+
+    testcases = list(testcases)
+    if not testcases:
+        return Response({"error": "Question has no test cases"}, status=status.HTTP_400_BAD_REQUEST)
+
+    throttled = execution_throttled(request.user, len(testcases))
+    if throttled:
+        return throttled
+
+    report = check_reference_solution(testcases, source_code, language, version, judge0_language_id, mode=mode)
+    return Response(report, status=status.HTTP_200_OK)
+
+
+def test_data_response(request, testcase):
+    """Full (blob-backed) input and expected output of a test case; hidden ones only for teachers"""
+    profile = getattr(request.user, 'profile', None)
+    if testcase.visibility != 'public' and (not profile or profile.role != 'teacher'):
+        return Response({"error": "Hidden test case data is only available to teachers"}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({
+        "id": testcase.id,
+        "input": testcase.input_text,
+        "expected_output": testcase.expected_output_text,
+        "input_size": testcase.input_size,
+        "expected_output_size": testcase.expected_output_size,
+    }, status=status.HTTP_200_OK)
+
+
 # New viewset for TestCase
 class TestCaseViewSet(viewsets.ModelViewSet):
     queryset = TestCase.objects.all()
@@ -771,6 +857,11 @@ class TestCaseViewSet(viewsets.ModelViewSet):
         # Return testcases only for assignments assigned to student's classes
         return TestCase.objects.filter(question__assignment__class_assigned__in=ClassStudent.objects.filter(student=user).values_list('class_assigned', flat=True))
 
+    @action(detail=True, methods=['get'], url_path='data')
+    def data(self, request, pk=None):
+        """GET /api/testcases/<id>/data/ - full input and expected output"""
+        return test_data_response(request, self.get_object())
+
 
 class CodingQuestionViewSet(viewsets.ModelViewSet):
     """ViewSet for managing coding questions"""
@@ -794,6 +885,21 @@ class CodingQuestionViewSet(viewsets.ModelViewSet):
         # Students: return coding questions for assignments in their classes
         return CodingQuestion.objects.filter(assignment__class_assigned__in=ClassStudent.objects.filter(student=user).values_list('class_assigned', flat=True))
 
+    @action(detail=True, methods=['post'], url_path='reference-solution')
+    def reference_solution(self, request, pk=None):
+        """
+        POST /api/questions/<id>/reference-solution/
+        Body: {"source_code": "...", "mode": "verify" | "fill" | "overwrite", "language_version": optional}
+        """
+        question = self.get_object()
+        resolved = LanguageRegistry.resolve(question.language)
+        language = resolved.piston_language if resolved else question.language
+        version = resolved.piston_version if resolved else ""
+        judge0_language_id = resolved.judge0_language_id if resolved else None
+        return reference_solution_response(
+            request, question.assignment, question.testcases.order_by('id'), language, version, judge0_language_id
+        )
+
 
 class CodingTestCaseViewSet(viewsets.ModelViewSet):
     """ViewSet for managing coding test cases"""
@@ -817,6 +923,11 @@ class CodingTestCaseViewSet(viewsets.ModelViewSet):
         # Students: no access to create/modify test cases; allow read-only for assignments in their classes
         return CodingTestCase.objects.filter(question__assignment__class_assigned__in=ClassStudent.objects.filter(student=user).values_list('class_assigned', flat=True))
 
+    @action(detail=True, methods=['get'], url_path='data')
+    def data(self, request, pk=None):
+        """GET /api/codingtestcases/<id>/data/ - full input and expected output"""
+        return test_data_response(request, self.get_object())
+
 
 class NonCodingQuestionViewSet(viewsets.ModelViewSet):
     """ViewSet for managing non-coding questions"""
@@ -871,28 +982,22 @@ class RunTestCasesView(APIView):
                 "passed": 0
             })
 
-        results = []
-
-        for tc in testcases:
-            response = PistonService.run_code(
-                source_code=source_code,
-                language=language_name,
-                version=version,
-                stdin=tc.input
-            )
-
-            stdout = response.get("stdout", "").strip()
-            stderr = response.get("stderr", "")
+        throttled = execution_throttled(request.user, testcases.count())
+        if throttled:
+            return throttled
 
-            passed = (stdout == tc.expected_output.strip()) and stderr == ""
+        results = []
 
+        for r in GradingService.run_testcases(source_code, language_name, version, testcases):
+            tc = r["testcase"]
             results.append({
                 "testcase_id": tc.id,
                 "input": tc.input,
                 "expected_output": tc.expected_output,
-                "actual_output": stdout,
-                "error_message": stderr,
-                "passed": passed
+                "data_truncated": tc.data_truncated,
+                "actual_output": r["stdout"],
+                "error_message": r["stderr"],
+                "passed": r["passed"]
             })
 
         return Response({
@@ -901,11 +1006,92 @@ class RunTestCasesView(APIView):
             "passed": sum(r["passed"] for r in results)
         })
 
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients send Accept: text/event-stream; error responses are rendered as JSON"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8')
+
+class RunTestCasesStreamView(APIView):
+    """
+    Streaming variant of run-testcases
+    POST /api/run-testcases/stream/
+    Body: same as /api/run-testcases/
+
+    Responds with Server-Sent Events: one "result" event per public test
+    case as soon as its execution finishes (in completion order), then a
+    "summary" event with the totals. Served incrementally under ASGI
+    (AssignEaseApi/asgi.py); a WSGI server delivers the events at the end.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        question_id = request.data.get('question_id')
+        source_code = request.data.get('source_code')
+        language_name = request.data.get('language_name')
+        version = request.data.get('language_version')
+
+        if not all([question_id, source_code, language_name, version]):
+            return Response(
+                {"error": "question_id, source_code, language_name, language_version are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            question = AssignmentQuestion.objects.get(id=question_id)
+        except AssignmentQuestion.DoesNotExist:
+            return Response({"error": "Question not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        testcases = list(TestCase.objects.filter(question=question, visibility='public'))
+
+        throttled = execution_throttled(request.user, len(testcases))
+        if throttled:
+            return throttled
+
+        async def events():
+            slots = asyncio.Semaphore(ExecutionPool.max_per_submission())
+
+            async def run(tc):
+                async with slots:
+                    return await asyncio.wrap_future(ExecutionPool.submit(
+                        GradingService.run_testcase, source_code, language_name, version, tc
+                    ))
+
+            passed = 0
+            for pending in asyncio.as_completed([run(tc) for tc in testcases]):
+                r = await pending
+                tc = r["testcase"]
+                passed += bool(r["passed"])
+                data = {
+                    "testcase_id": tc.id,
+                    "input": tc.input,
+                    "expected_output": tc.expected_output,
+                    "data_truncated": tc.data_truncated,
+                    "actual_output": r["stdout"],
+                    "error_message": r["stderr"],
+                    "passed": r["passed"]
+                }
+                yield f"event: result\ndata: {json.dumps(data)}\n\n"
+
+            summary = {"total": len(testcases), "passed": passed}
+            yield f"event: summary\ndata: {json.dumps(summary)}\n\n"
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # stop nginx from buffering the stream
+        return response
+
 class EvaluateSubmissionView(APIView):
     """
     Evaluate all test cases for a submission after student submits
     POST /api/evaluate-submission/
-    Body: {"submission_id": 1}
+    Body: {"submission_id": 1, "async": false}
+
+    With "async": true the submission is queued for background grading and
+    the response (202) carries a job id to poll at /api/grading-jobs/<id>/.
     """
     permission_classes = [IsAuthenticated]
 
@@ -933,77 +1119,171 @@ class EvaluateSubmissionView(APIView):
                 "total_testcases": 0
             })
 
-        # Resolve language and version for Piston:
-        assignment = submission.assignment
-        piston_language = None
-        piston_version = assignment.language_version or ""
-
-        if assignment.language:
-            # Try to find a ProgrammingLanguage matching common fields
-            pl = ProgrammingLanguage.objects.filter(
-                Q(piston_name__iexact=assignment.language) |
-                Q(display_name__iexact=assignment.language) |
-                Q(language_name__iexact=assignment.language)
-            ).first()
-            if pl:
-                piston_language = pl.piston_name or pl.language_name or pl.display_name
-                # prefer explicit version from assignment, otherwise PL's version
-                if not piston_version:
-                    piston_version = pl.piston_version or ""
-            else:
-                # fallback to raw assignment.language (user might have stored piston name there)
-                piston_language = assignment.language
+        throttled = execution_throttled(request.user, testcases.count())
+        if throttled:
+            return throttled
+
+        if str(request.data.get("async", "")).lower() in ("true", "1"):
+            job = enqueue_grading(submission, requested_by=request.user)
+            return Response(GradingJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-        if not piston_language:
-            return Response({"error": "No language configured for assignment"},
+        try:
+            summary = GradingService.evaluate_submission(submission)
+        except GradingError as e:
+            return Response({"error": str(e)},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        passed_count = 0
-        total_count = testcases.count()
+        return Response(summary)
 
-        for tc in testcases:
-            # Use the same param names as other runs (source_code)
-            result = PistonService.run_code(
-                source_code=submission.code,
-                language=piston_language,
-                version=piston_version,
-                stdin=tc.input
-            )
+class GradingJobStatusView(APIView):
+    """
+    Progress of a background grading job
+    GET /api/grading-jobs/<job_id>/
+    """
+    permission_classes = [IsAuthenticated]
 
-            stdout = (result.get("stdout") or "").strip()
-            stderr = result.get("stderr") or ""
+    def get(self, request, job_id):
+        try:
+            job = GradingJob.objects.select_related('submission__assignment').get(id=job_id)
+        except GradingJob.DoesNotExist:
+            return Response({"error": "Grading job not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            passed = (stdout == (tc.expected_output or "").strip()) and stderr == ""
+        user = request.user
+        submission = job.submission
+        if submission.student_id != user.id and not teacher_owns_assignment(user, submission.assignment):
+            return Response({"error": "You do not have permission to view this resource"}, status=status.HTTP_403_FORBIDDEN)
 
-            # Save result
-            TestCaseResult.objects.update_or_create(
-                submission=submission,
-                testcase=tc,
-                defaults={
-                    "status": "passed" if passed else "failed",
-                    "actual_output": stdout,
-                    "error_message": stderr,
-                }
-            )
+        if job.status in ("queued", "running") and recover_stale_jobs(GradingJob.objects.filter(id=job.id)) != {"requeued": 0, "failed": 0}:
+            job.refresh_from_db()
 
-            if passed:
-                passed_count += 1
+        return Response(GradingJobSerializer(job).data, status=status.HTTP_200_OK)
 
-        total_marks = question.total_marks
-        auto_marks = (passed_count / total_count) * total_marks if total_count else 0
+class RegradeSubmissionsView(APIView):
+    """
+    Regrade every coding submission of a question, assignment or class
+    POST /api/regrade/
+    Body: {"question_id": 1} or {"assignment_id": 1} or {"class_id": 1}
 
-        submission.total_testcases = total_count
-        submission.passed_testcases = passed_count
-        submission.auto_marks = auto_marks
-        submission.save()
+    Each submission gets a background grading job (202); poll them at
+    /api/grading-jobs/<id>/. Results whose code and test case are unchanged
+    are kept, so only edited test cases are run again.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        question_id = request.data.get("question_id")
+        assignment_id = request.data.get("assignment_id")
+        class_id = request.data.get("class_id")
+
+        if not (question_id or assignment_id or class_id):
+            return Response({"error": "question_id, assignment_id or class_id is required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        try:
+            if question_id:
+                question = AssignmentQuestion.objects.select_related('assignment__class_assigned').get(id=question_id)
+                allowed = teacher_owns_assignment(user, question.assignment)
+            elif assignment_id:
+                assignment = Assignment.objects.select_related('class_assigned').get(id=assignment_id)
+                allowed = teacher_owns_assignment(user, assignment)
+            else:
+                allowed = Class.objects.get(id=class_id).teacher_id == user.id
+        except (AssignmentQuestion.DoesNotExist, Assignment.DoesNotExist, Class.DoesNotExist):
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not allowed:
+            return Response({"error": "Only the teacher of this class can regrade submissions"},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        submissions = submissions_to_regrade(
+            question_id=question_id, assignment_id=assignment_id, class_id=class_id
+        )
+        with transaction.atomic():
+            jobs = [enqueue_grading(submission, requested_by=user, reuse_results=True) for submission in submissions]
 
         return Response({
-            "submission_id": submission.id,
-            "total_testcases": total_count,
-            "passed_testcases": passed_count,
-            "auto_marks": auto_marks,
-            "percentage": (passed_count / total_count * 100) if total_count else 0
-        })
+            "submissions": len(jobs),
+            "jobs": [str(job.id) for job in jobs],
+        }, status=status.HTTP_202_ACCEPTED)
+
+class ExecutionCacheStatsView(APIView):
+    """
+    Hit/miss counters of the execution result cache (this process)
+    GET /api/execution-cache/stats/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = getattr(request.user, 'profile', None)
+        if not profile or profile.role != 'teacher':
+            return Response({"error": "Only teachers can view execution statistics"}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(ExecutionCache.stats(), status=status.HTTP_200_OK)
+
+class ExecutionStatsView(APIView):
+    """
+    p50/p95/p99 execution timings per language and backend
+    GET /api/execution-stats/?days=7&assignment=<id>
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = getattr(request.user, 'profile', None)
+        if not profile or profile.role != 'teacher':
+            return Response({"error": "Only teachers can view execution statistics"}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            days = float(request.query_params.get('days', 7))
+        except ValueError:
+            days = None
+        # inf/nan and windows beyond timedelta's range would fail in the query
+        if days is None or not math.isfinite(days) or not 0 < days <= 3650:
+            return Response({"error": "days must be a number between 0 and 3650"}, status=status.HTTP_400_BAD_REQUEST)
+
+        assignment_id = request.query_params.get('assignment')
+        if assignment_id is not None:
+            try:
+                assignment_id = int(assignment_id)
+            except ValueError:
+                return Response({"error": "assignment must be an assignment id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "days": days,
+            "groups": execution_stats(days=days, assignment_id=assignment_id),
+        }, status=status.HTTP_200_OK)
+
+
+class HealthView(APIView):
+    """
+    Circuit breaker state of the external backends (this process)
+    GET /api/health/
+
+    Anyone gets the overall status; the per-backend details are for staff and teachers.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        for name in ('piston', 'judge0', 'ollama'):
+            get_breaker(name)
+        backends = breaker_states()
+        degraded = any(b["state"] != "closed" for b in backends.values())
+        health = "degraded" if degraded else "ok"
+
+        profile = getattr(request.user, 'profile', None)
+        if not request.user.is_staff and not (profile and profile.role == 'teacher'):
+            return Response({"status": health}, status=status.HTTP_200_OK)
+
+        return Response({
+            "status": health,
+            "backends": backends,
+            "executions_in_flight": ExecutionLoad.in_flight(),
+            "execution_pool_jobs": ExecutionPool.in_flight(),
+            "routing": ExecutionRouter.snapshot(),
+            "execution_cache": ExecutionCache.stats(),
+            "schema_snapshots": SchemaSnapshotCache.stats(),
+            "schema_pool": SchemaConnectionPool.stats(),
+        }, status=status.HTTP_200_OK)
 
 # New viewset to CRUD TestCaseResult
 class TestCaseResultViewSet(viewsets.ModelViewSet):
@@ -1206,7 +1486,8 @@ class DatabaseSubmissionViewSet(viewsets.ModelViewSet):
                         sample_data_sql=schema.sample_data_sql,
                         student_query=submitted_query,
                         verification_query=question.verification_query,
-                        expected_result=question.expected_result
+                        expected_result=question.expected_result,
+                        **question.expected_comparison()
                     )
                 else:
                     with DatabaseService.get_db_connection(schema.db_type) as conn:
@@ -1237,7 +1518,8 @@ class DatabaseSubmissionViewSet(viewsets.ModelViewSet):
                     sample_data_sql=schema.sample_data_sql,
                     student_query=submitted_query,
                     expected_result=question.expected_result,
-                    allow_write_operations=False
+                    allow_write_operations=False,
+                    **question.expected_comparison()
                 )
             
             # Calculate marks
@@ -1309,8 +1591,9 @@ class TestDatabaseQueryView(APIView):
                 )
             
             # Execute query without validation (just show results)
-            with DatabaseService.get_db_connection(schema.db_type) as conn:
-                DatabaseService.setup_schema(conn, schema.schema_sql, schema.sample_data_sql)
+            with DatabaseService.seeded_connection(
+                schema.db_type, schema.schema_sql, schema.sample_data_sql, read_only=True
+            ) as conn:
                 result, exec_time = DatabaseService.execute_query(conn, query, schema.db_type)
             
             return Response({
@@ -1398,8 +1681,9 @@ class TestDatabaseQueryWithSchemaView(APIView):
         
         try:
             # Execute query against the provided schema
-            with DatabaseService.get_db_connection(db_type) as conn:
-                DatabaseService.setup_schema(conn, schema_sql, sample_data_sql)
+            with DatabaseService.seeded_connection(
+                db_type, schema_sql, sample_data_sql, read_only=not allow_write
+            ) as conn:
                 result, exec_time = DatabaseService.execute_query(conn, query, db_type, allow_write)
             
             return Response({